@@ -1,22 +1,44 @@
 import os
+import logging
+import uuid
 from typing import Optional
 from flow import Flow, EditFlow
+from utils.checkpoint import CheckpointLog
+from utils.history import History
 from nodes.main_agent import MainDecisionAgent
 from nodes.file_ops import ReadFileNode, DeleteFileNode, EditFileNode, ApplyChangesNode
-from nodes.search_ops import GrepSearchNode, ListDirectoryNode
+from nodes.search_ops import GrepSearchNode, FindSymbolNode, ListDirectoryNode
+from nodes.batch_ops import BatchToolNode
 from nodes.format_response import FormatResponseNode
 from utils.logging_utils import setup_logging, get_logger
+from utils.llm_cache import enable_llm_cache, get_llm_cache
+from utils.file_cache import get_file_cache
+from utils.tracing import trace_session, add_sink, remove_sink, MemorySpanSink, JsonlSpanSink, format_breakdown
 
 logger = get_logger(__name__)
 
-def create_main_flow() -> Flow:
-    """Create the main flow with all node connections."""
+def create_main_flow(
+    decision_mode: str = "yaml",
+    prefetch: bool = True,
+    checkpoint: Optional[CheckpointLog] = None
+) -> Flow:
+    """Create the main flow with all node connections.
+    
+    Args:
+        decision_mode: How the decision agent asks the LLM for its answer
+            ("yaml", "json" or "tools", see MainDecisionAgent)
+        prefetch: Whether the decision agent warms the caches for likely
+            next reads while the LLM is deciding
+        checkpoint: Log to checkpoint the session to after every step
+    """
     # Create nodes
-    main_agent = MainDecisionAgent()
+    main_agent = MainDecisionAgent(decision_mode=decision_mode, prefetch=prefetch)
     read_file = ReadFileNode()
     delete_file = DeleteFileNode()
     grep_search = GrepSearchNode()
+    find_symbol = FindSymbolNode()
     list_dir = ListDirectoryNode()
+    batch_tools = BatchToolNode()
     format_response = FormatResponseNode()
     
     # Create edit flow
@@ -26,18 +48,29 @@ def create_main_flow() -> Flow:
     main_agent - "read_file" >> read_file
     main_agent - "delete_file" >> delete_file
     main_agent - "grep_search" >> grep_search
+    main_agent - "find_symbol" >> find_symbol
     main_agent - "list_dir" >> list_dir
     main_agent - "edit_file" >> edit_flow
+    main_agent - "batch" >> batch_tools
     main_agent - "finish" >> format_response
     
     # All tool nodes return to main agent
     read_file - "decide_next" >> main_agent
     delete_file - "decide_next" >> main_agent
     grep_search - "decide_next" >> main_agent
+    find_symbol - "decide_next" >> main_agent
     list_dir - "decide_next" >> main_agent
     edit_flow - "decide_next" >> main_agent
+    batch_tools - "decide_next" >> main_agent
     
-    return Flow(start=main_agent)
+    return Flow(start=main_agent, checkpoint=checkpoint)
+
+def close_main_flow(flow: Flow) -> None:
+    """Stops the background threads of a flow built by create_main_flow()."""
+    main_agent = flow.start
+    if main_agent.prefetcher is not None:
+        main_agent.prefetcher.close()
+    main_agent.successors["batch"].close()
 
 def create_edit_flow() -> EditFlow:
     """Create the edit file subflow."""
@@ -50,11 +83,41 @@ def create_edit_flow() -> EditFlow:
     
     return EditFlow(start=edit_node)
 
+def check_checkpoint(checkpoint_path: Optional[str], resume: bool, overwrite: bool = False) -> None:
+    """Refuses checkpoint settings that would lose a session or invent one.
+    
+    Args:
+        checkpoint_path: JSONL file the session is checkpointed to, if any
+        resume: Whether the session in checkpoint_path is to be continued
+        overwrite: Whether an existing checkpoint may be started over
+        
+    Raises:
+        ValueError: If resuming without a usable checkpoint, or starting over
+            an existing one without overwrite
+    """
+    if checkpoint_path is None:
+        if resume:
+            raise ValueError("Resuming needs a checkpoint path")
+        return
+    if resume:
+        if not CheckpointLog(checkpoint_path).has_session():
+            raise ValueError(f"No session to resume in checkpoint {checkpoint_path}")
+    elif not overwrite and os.path.exists(checkpoint_path) and os.path.getsize(checkpoint_path) > 0:
+        raise ValueError(
+            f"Checkpoint {checkpoint_path} already exists; resume it (--resume) or overwrite it (--force)"
+        )
+
 def run_coding_agent(
     query: str,
     working_dir: str,
     log_level: int = logging.INFO,
-    log_file: Optional[str] = None
+    log_file: Optional[str] = None,
+    use_cache: bool = False,
+    decision_mode: str = "yaml",
+    prefetch: bool = True,
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    overwrite_checkpoint: bool = False
 ) -> str:
     """Run the coding agent on a query.
     
@@ -63,30 +126,63 @@ def run_coding_agent(
         working_dir: The working directory for file operations
         log_level: Logging level
         log_file: Optional log file path
+        use_cache: Whether to answer repeated LLM prompts from the on-disk
+            response cache
+        decision_mode: "yaml", "json" (JSON mode) or "tools" (function calling)
+        prefetch: Whether to read likely next files ahead while the LLM decides
+        checkpoint_path: JSONL file the session is checkpointed to after
+            every step
+        resume: Continue the session stored in checkpoint_path instead of
+            starting over (query and working_dir are then taken from the
+            checkpoint)
+        overwrite_checkpoint: Start over an existing checkpoint_path instead
+            of refusing to
         
     Returns:
         The agent's response
+        
+    Raises:
+        ValueError: On a checkpoint setting refused by check_checkpoint()
     """
+    check_checkpoint(checkpoint_path, resume, overwrite_checkpoint)
+    
     # Setup logging
     setup_logging(level=log_level, log_file=log_file)
     logger.info(f"Starting coding agent with query: {query}")
     logger.info(f"Working directory: {working_dir}")
     
+    if use_cache and get_llm_cache() is None:
+        enable_llm_cache()
+    
     try:
         # Create shared memory
         shared = {
             "user_query": query,
             "working_dir": os.path.abspath(working_dir),
-            "history": []
+            "history": History()
         }
         
-        # Create and run flow
-        flow = create_main_flow()
-        flow.run(shared)
+        # Create and run flow; spans of this run are tagged with a session id
+        checkpoint = CheckpointLog(checkpoint_path) if checkpoint_path else None
+        flow = create_main_flow(decision_mode, prefetch, checkpoint)
+        session_id = uuid.uuid4().hex
+        logger.info(f"Session id: {session_id}")
+        try:
+            with trace_session(session_id):
+                flow.run(shared, resume=resume)
+        finally:
+            close_main_flow(flow)
+            if checkpoint is not None:
+                checkpoint.close()
         
         # Return response
         response = shared.get("response", "No response generated")
         logger.info("Coding agent completed successfully")
+        logger.info(f"File cache stats: {get_file_cache().stats()}")
+        if flow.start.prefetcher is not None:
+            logger.info(f"Prefetch stats: {flow.start.prefetcher.stats()}")
+        if use_cache:
+            logger.info(f"LLM cache stats: {get_llm_cache().stats()}")
         return response
         
     except Exception as e:
@@ -95,24 +191,59 @@ def run_coding_agent(
 
 if __name__ == "__main__":
     import argparse
-    import logging
     
     # Parse arguments
     parser = argparse.ArgumentParser(description="Run the coding agent")
-    parser.add_argument("query", help="The user's request")
+    parser.add_argument("query", nargs="?", help="The user's request")
     parser.add_argument("--working-dir", "-d", default=".", help="Working directory")
     parser.add_argument("--log-file", "-l", help="Log file path")
     parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--cache", action="store_true", help="Cache LLM responses on disk")
+    parser.add_argument("--decision-mode", choices=["yaml", "json", "tools"], default="yaml",
+                        help="How the LLM returns decisions (json/tools need model support)")
+    parser.add_argument("--no-prefetch", action="store_true", help="Don't read likely next files ahead")
+    parser.add_argument("--checkpoint", help="Checkpoint the session to this JSONL file after every step")
+    parser.add_argument("--resume", action="store_true", help="Continue the session saved in --checkpoint")
+    parser.add_argument("--force", action="store_true", help="Overwrite an existing --checkpoint file")
+    parser.add_argument("--timings", action="store_true", help="Print a per-node latency and token breakdown")
+    parser.add_argument("--trace-file", help="Append timing spans to this JSONL file")
     
     args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    if args.query is None and not args.resume:
+        parser.error("the query is required unless resuming")
+    try:
+        check_checkpoint(args.checkpoint, args.resume, args.force)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # Collect spans
+    timings = add_sink(MemorySpanSink()) if args.timings else None
+    trace_file = add_sink(JsonlSpanSink(args.trace_file)) if args.trace_file else None
     
     # Run agent
-    response = run_coding_agent(
-        query=args.query,
-        working_dir=args.working_dir,
-        log_level=logging.DEBUG if args.debug else logging.INFO,
-        log_file=args.log_file
-    )
+    try:
+        response = run_coding_agent(
+            query=args.query,
+            working_dir=args.working_dir,
+            log_level=logging.DEBUG if args.debug else logging.INFO,
+            log_file=args.log_file,
+            use_cache=args.cache,
+            decision_mode=args.decision_mode,
+            prefetch=not args.no_prefetch,
+            checkpoint_path=args.checkpoint,
+            resume=args.resume,
+            overwrite_checkpoint=args.force
+        )
+    finally:
+        if trace_file:
+            remove_sink(trace_file)
+            trace_file.close()
     
     print("\nResponse:")
     print(response)
+    
+    if timings:
+        print("\nTimings:")
+        print(format_breakdown(timings.spans))
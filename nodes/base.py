@@ -1,26 +1,54 @@
 from typing import Any, Dict, Optional
-from utils.logging_utils import get_logger
+from utils.logging_utils import get_logger, CappedRepr
+from utils.tracing import traced
+from utils.retry import RetryPolicy
+import asyncio
+import contextvars
+import logging
 import time
 
+class ConditionalTransition:
+    """Helper for the `node - "action" >> next_node` syntax."""
+    def __init__(self, source: Any, action: str):
+        self.source = source
+        self.action = action
+        
+    def __rshift__(self, target: Any) -> Any:
+        self.source.successors[self.action] = target
+        return target
+
 class Node:
-    def __init__(self, max_retries: int = 1, wait: int = 0):
+    def __init__(self, max_retries: int = 1, wait: int = 0, retry_policy: Optional[RetryPolicy] = None):
         """Initialize a node.
         
         Args:
             max_retries (int): Maximum number of retries for exec()
             wait (int): Time to wait between retries in seconds
+            retry_policy (RetryPolicy, optional): Backoff and retry
+                classification; overrides max_retries and wait
         """
-        self.max_retries = max_retries
+        self.retry_policy = retry_policy or RetryPolicy.fixed(max_retries, wait)
+        self.max_retries = self.retry_policy.max_retries
         self.wait = wait
         self.cur_retry = 0
         self.params = {}
+        self.successors: Dict[str, Any] = {}
         self.logger = get_logger(self.__class__.__name__)
 
     def set_params(self, params: Dict[str, Any]) -> None:
         """Set parameters for this node."""
-        self.logger.debug(f"Setting params: {params}")
+        self.logger.debug("Setting params: %s", CappedRepr(params))
         self.params = params
 
+    def __rshift__(self, other: Any) -> Any:
+        """Add a default transition (>>) to other."""
+        self.successors["default"] = other
+        return other
+        
+    def __sub__(self, action: str) -> ConditionalTransition:
+        """Start a named transition: node - "action" >> other."""
+        return ConditionalTransition(self, action)
+
     def prep(self, shared: Dict[str, Any]) -> Any:
         """Read and preprocess data from shared store.
         
@@ -53,7 +81,7 @@ class Node:
         Returns:
             Fallback data to be passed to post()
         """
-        self.logger.error(f"All retries failed. Last error: {str(exc)}")
+        self.logger.error("All retries failed. Last error: %s", exc)
         raise exc
 
     def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> Optional[str]:
@@ -78,39 +106,143 @@ class Node:
         Returns:
             Action string for flow control
         """
-        self.logger.info(f"Starting node execution")
-        
-        # Run prep
-        self.logger.debug("Running prep()")
-        prep_res = self.prep(shared)
-        self.logger.debug(f"prep() returned: {prep_res}")
-        
-        # Run exec with retries
-        exec_res = None
-        last_exc = None
-        
-        for self.cur_retry in range(self.max_retries):
-            try:
-                self.logger.debug(f"Running exec() (attempt {self.cur_retry + 1}/{self.max_retries})")
-                exec_res = self.exec(prep_res)
-                self.logger.debug(f"exec() succeeded: {exec_res}")
-                break
-            except Exception as e:
-                last_exc = e
-                self.logger.warning(f"exec() failed (attempt {self.cur_retry + 1}): {str(e)}")
-                if self.cur_retry < self.max_retries - 1:
-                    if self.wait > 0:
-                        self.logger.debug(f"Waiting {self.wait} seconds before retry")
-                        time.sleep(self.wait)
-                    continue
-                self.logger.debug("Trying fallback")
-                exec_res = self.exec_fallback(prep_res, e)
-                break
-        
-        # Run post
-        self.logger.debug("Running post()")
-        action = self.post(shared, prep_res, exec_res)
-        action = action if action is not None else "default"
-        self.logger.info(f"Node execution completed with action: {action}")
+        with traced("node", self.__class__.__name__) as span:
+            # Checked once per run: debug records carry large payloads
+            debug = self.logger.isEnabledFor(logging.DEBUG)
+            self.logger.info("Starting node execution")
+            
+            # Run prep
+            start = time.perf_counter()
+            prep_res = self.prep(shared)
+            span.phases["prep"] = time.perf_counter() - start
+            if debug:
+                self.logger.debug("prep() returned: %s", CappedRepr(prep_res))
+            
+            # Run exec with retries, as the retry policy allows
+            exec_res = None
+            start = time.perf_counter()
+            self.cur_retry = 0
+            
+            while True:
+                span.retries = self.cur_retry
+                try:
+                    if debug:
+                        self.logger.debug("Running exec() (attempt %d/%d)", self.cur_retry + 1, self.max_retries)
+                    exec_res = self.exec(prep_res)
+                    if debug:
+                        self.logger.debug("exec() succeeded: %s", CappedRepr(exec_res))
+                    break
+                except Exception as e:
+                    self.logger.warning("exec() failed (attempt %d): %s", self.cur_retry + 1, e)
+                    delay = self.retry_policy.next_delay(self.cur_retry, e, time.perf_counter() - start)
+                    if delay is not None:
+                        if delay > 0:
+                            self.logger.debug("Waiting %.2f seconds before retry", delay)
+                            time.sleep(delay)
+                        self.cur_retry += 1
+                        continue
+                    self.logger.debug("Trying fallback")
+                    exec_res = self.exec_fallback(prep_res, e)
+                    break
+            span.phases["exec"] = time.perf_counter() - start
+            
+            # Run post
+            start = time.perf_counter()
+            action = self.post(shared, prep_res, exec_res)
+            span.phases["post"] = time.perf_counter() - start
+            action = action if action is not None else "default"
+            span.action = action
+            self.logger.info("Node execution completed with action: %s", action)
+            
+            return action
+
+class AsyncNode(Node):
+    """Node whose prep/exec/post are coroutines.
+    
+    Subclasses override prep_async(), exec_async(), exec_fallback_async() and
+    post_async(). Retries wait with asyncio.sleep(), so a waiting node never
+    blocks the event loop.
+    """
+    async def prep_async(self, shared: Dict[str, Any]) -> Any:
+        """Async version of prep()."""
+        return None
+
+    async def exec_async(self, prep_res: Any) -> Any:
+        """Async version of exec()."""
+        return None
+
+    async def exec_fallback_async(self, prep_res: Any, exc: Exception) -> Any:
+        """Async version of exec_fallback()."""
+        self.logger.error("All retries failed. Last error: %s", exc)
+        raise exc
+
+    async def post_async(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> Optional[str]:
+        """Async version of post()."""
+        return None
+
+    def run(self, shared: Dict[str, Any]) -> str:
+        raise RuntimeError(f"{self.__class__.__name__} is async; use run_async() or an AsyncFlow")
+
+    async def run_async(self, shared: Dict[str, Any]) -> str:
+        """Run this node's full cycle on the event loop.
         
-        return action 
\ No newline at end of file
+        Args:
+            shared: The shared memory store
+            
+        Returns:
+            Action string for flow control
+        """
+        with traced("node", self.__class__.__name__) as span:
+            self.logger.info("Starting node execution")
+            start = time.perf_counter()
+            prep_res = await self.prep_async(shared)
+            span.phases["prep"] = time.perf_counter() - start
+            
+            exec_res = None
+            start = time.perf_counter()
+            self.cur_retry = 0
+            while True:
+                span.retries = self.cur_retry
+                try:
+                    exec_res = await self.exec_async(prep_res)
+                    break
+                except Exception as e:
+                    self.logger.warning("exec_async() failed (attempt %d): %s", self.cur_retry + 1, e)
+                    delay = self.retry_policy.next_delay(self.cur_retry, e, time.perf_counter() - start)
+                    if delay is not None:
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        self.cur_retry += 1
+                        continue
+                    exec_res = await self.exec_fallback_async(prep_res, e)
+                    break
+            span.phases["exec"] = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            action = await self.post_async(shared, prep_res, exec_res)
+            span.phases["post"] = time.perf_counter() - start
+            action = action if action is not None else "default"
+            span.action = action
+            self.logger.info("Node execution completed with action: %s", action)
+            return action
+
+class SyncNodeAdapter(AsyncNode):
+    """Runs a synchronous node (or flow) in a thread executor.
+    
+    The wrapped node's whole prep/exec/post cycle, including its blocking
+    retries, runs on a worker thread, so the event loop stays free.
+    """
+    def __init__(self, node: Any, executor: Optional[Any] = None):
+        super().__init__()
+        self.node = node
+        self.executor = executor
+        self.successors = node.successors
+
+    def set_params(self, params: Dict[str, Any]) -> None:
+        self.node.set_params(params)
+
+    async def run_async(self, shared: Dict[str, Any]) -> str:
+        loop = asyncio.get_running_loop()
+        # Carry the current trace span and session over to the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, context.run, self.node.run, shared)
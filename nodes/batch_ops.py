@@ -0,0 +1,69 @@
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from .base import Node
+from .file_ops import ReadFileNode
+from .search_ops import GrepSearchNode, FindSymbolNode, ListDirectoryNode
+
+# Tools that don't modify the workspace and can therefore run concurrently
+READ_ONLY_TOOLS = ("read_file", "grep_search", "find_symbol", "list_dir")
+
+class BatchToolNode(Node):
+    """Runs several independent read-only tool calls concurrently.
+
+    MainDecisionAgent records a "batch" decision as one history entry per
+    call, each still missing its result. This node runs all of them on a
+    thread pool and fills in every result in a single step.
+    """
+    def __init__(self, max_workers: int = 8, tools: Optional[Dict[str, Node]] = None):
+        """Initialize a batch node.
+
+        Args:
+            max_workers: Maximum number of tool calls running at once
+            tools: Tool nodes to delegate to, keyed by tool name
+        """
+        super().__init__()
+        self.tools = tools or {
+            "read_file": ReadFileNode(),
+            "grep_search": GrepSearchNode(),
+            "find_symbol": FindSymbolNode(),
+            "list_dir": ListDirectoryNode()
+        }
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-tool")
+
+    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
+        """Collect the trailing history entries that are still waiting for a result."""
+        history = shared["history"]
+        start = len(history)
+        while start > 0 and "result" not in history[start - 1]:
+            start -= 1
+        entries = history[start:]
+        assert entries, "No pending tool calls"
+        for entry in entries:
+            assert entry["tool"] in READ_ONLY_TOOLS, f"Tool {entry['tool']} cannot be batched"
+        return {"entries": entries, "working_dir": shared["working_dir"]}
+
+    def _run_call(self, entry: Dict[str, Any], working_dir: str) -> Dict[str, Any]:
+        """Run one tool call and return its history result."""
+        node = self.tools[entry["tool"]]
+        try:
+            return node.make_result(node.exec(node.prep_call(entry["params"], working_dir)))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def exec(self, context: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Run all calls concurrently, keeping the results in call order."""
+        futures = [
+            self.executor.submit(self._run_call, entry, context["working_dir"])
+            for entry in context["entries"]
+        ]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Shuts down the thread pool once the flow is done with this node."""
+        self.executor.shutdown(wait=False)
+
+    def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
+        """Store every result in its history entry and return to main agent."""
+        for entry, result in zip(prep_res["entries"], exec_res):
+            entry["result"] = result
+        return "decide_next"
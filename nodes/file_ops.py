@@ -1,31 +1,76 @@
 from typing import Any, Dict, Optional
 import os
+import yaml
 from .base import Node
-from utils.file_ops import read_file, delete_file, replace_file
-from utils.call_llm import call_llm
+from utils.file_ops import read_file, delete_file, apply_edits
+from utils.line_index import count_lines
+from utils.anchor_edit import plan_edits
+from utils.call_llm import call_llm_yaml, llm_retry_policy
 
 class ReadFileNode(Node):
-    def prep(self, shared: Dict[str, Any]) -> str:
-        """Get file path from last history entry."""
+    def __init__(self, max_lines: int = 2000, **kwargs):
+        """Initialize a read file node.
+        
+        Args:
+            max_lines: Lines returned per read; larger files and ranges are
+                paged and the agent can ask for further ranges
+        """
+        super().__init__(**kwargs)
+        self.max_lines = max_lines
+        
+    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
+        """Get file path and optional line range from last history entry."""
         history_entry = shared["history"][-1]
         assert history_entry["tool"] == "read_file"
+        return self.prep_call(history_entry["params"], shared["working_dir"])
         
+    def prep_call(self, params: Dict[str, Any], working_dir: str) -> Dict[str, Any]:
+        """Turn tool params into exec() input."""
         # Get relative path and make it absolute
-        rel_path = history_entry["params"]["target_file"]
-        return os.path.join(shared["working_dir"], rel_path)
-        
-    def exec(self, file_path: str) -> tuple:
-        """Read the file content."""
-        return read_file(file_path)
+        return {
+            "file_path": os.path.join(working_dir, params["target_file"]),
+            "start_line": params.get("start_line"),
+            "end_line": params.get("end_line")
+        }
         
-    def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
-        """Store result in history and return to main agent."""
-        content, success = exec_res
-        shared["history"][-1]["result"] = {
+    def exec(self, context: Dict[str, Any]) -> tuple:
+        """Read the file content, or one page of it for large files."""
+        file_path = context["file_path"]
+        start_line, end_line = context["start_line"], context["end_line"]
+        try:
+            total_lines = count_lines(file_path)
+        except OSError:
+            # Let read_file report the error
+            content, success = read_file(file_path, start_line, end_line)
+            return content, success, None
+        
+        if start_line is None and end_line is None and total_lines <= self.max_lines:
+            content, success = read_file(file_path)
+            return content, success, None
+        
+        # Ranges are paged like whole files: at most max_lines from start_line
+        start_line = start_line or 1
+        last_line = start_line + self.max_lines - 1
+        end_line = min(end_line or last_line, last_line, total_lines)
+        content, success = read_file(file_path, start_line, end_line)
+        page = {"start_line": start_line, "end_line": end_line, "total_lines": total_lines}
+        return content, success, page
+        
+    def make_result(self, exec_res: Any) -> Dict[str, Any]:
+        """Turn exec() output into a history result."""
+        content, success, page = exec_res
+        result = {
             "success": success,
             "content": content if success else None,
             "error": None if success else content
         }
+        if success and page is not None:
+            result.update(page)
+        return result
+        
+    def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
+        """Store result in history and return to main agent."""
+        shared["history"][-1]["result"] = self.make_result(exec_res)
         return "decide_next"
 
 class DeleteFileNode(Node):
@@ -50,7 +95,28 @@ class DeleteFileNode(Node):
         }
         return "decide_next"
 
+def _parse_edits(yaml_str: str) -> list:
+    """Parses the edit plan returned by the LLM into its list of edits."""
+    result = yaml.safe_load(yaml_str)
+    
+    assert isinstance(result, dict) and "edits" in result, "No edits specified"
+    assert isinstance(result["edits"], list), "Edits must be a list"
+    
+    return result["edits"]
+
 class EditFileNode(Node):
+    def __init__(self, anchor_match: bool = True, **kwargs):
+        """Initialize the node; LLM errors are retried per llm_retry_policy() unless overridden.
+        
+        Args:
+            anchor_match: Place code_edit in the file locally (see
+                utils.anchor_edit) and only ask the LLM for line numbers when
+                that is ambiguous
+        """
+        kwargs.setdefault("retry_policy", llm_retry_policy())
+        super().__init__(**kwargs)
+        self.anchor_match = anchor_match
+        
     def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
         """Get file info and edit instructions."""
         history_entry = shared["history"][-1]
@@ -73,6 +139,13 @@ class EditFileNode(Node):
         
     def exec(self, context: Dict[str, Any]) -> list:
         """Analyze and plan the edits."""
+        if self.anchor_match:
+            edits, success = plan_edits(context["current_content"], context["code_edit"])
+            if success:
+                self.logger.info("Planned %d edit(s) by anchor matching", len(edits))
+                return edits
+            self.logger.info("Anchor matching failed (%s), asking the LLM", edits)
+        
         prompt = f"""
 Analyze the following file content and edit instructions.
 Return a list of specific edits to make.
@@ -96,14 +169,8 @@ edits:
   ...
 ```
 """
-        response = call_llm(prompt)
-        yaml_str = response.split("```yaml")[1].split("```")[0].strip()
-        result = yaml.safe_load(yaml_str)
-        
-        assert "edits" in result, "No edits specified"
-        assert isinstance(result["edits"], list), "Edits must be a list"
-        
-        return result["edits"]
+        # Only edit plans that parse are cached, so a retry asks again
+        return call_llm_yaml(prompt, validate=_parse_edits)
         
     def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
         """Store edit plan and proceed to apply changes."""
@@ -111,34 +178,18 @@ edits:
         return "apply_changes"
 
 class ApplyChangesNode(Node):
-    def prep(self, shared: Dict[str, Any]) -> list:
-        """Get edit operations and sort them in descending order."""
-        edits = shared["edit_operations"]
-        edits.sort(key=lambda x: x["start_line"], reverse=True)
-        return edits
-        
-    def exec(self, edits: list) -> list:
-        """Apply each edit operation."""
+    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the target file and its planned edit operations."""
         history_entry = shared["history"][-1]
-        file_path = os.path.join(
-            shared["working_dir"],
-            history_entry["params"]["target_file"]
-        )
-        
-        results = []
-        for edit in edits:
-            message, success = replace_file(
-                file_path,
-                edit["start_line"],
-                edit["end_line"],
-                edit["replacement"]
-            )
-            results.append({"success": success, "message": message})
-            
-            if not success:
-                break
-                
-        return results
+        return {
+            "file_path": os.path.join(shared["working_dir"], history_entry["params"]["target_file"]),
+            "edits": shared["edit_operations"]
+        }
+        
+    def exec(self, context: Dict[str, Any]) -> list:
+        """Apply all edit operations in one pass and one atomic write."""
+        message, success = apply_edits(context["file_path"], context["edits"])
+        return [{"success": success, "message": message}]
         
     def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
         """Store results and clean up."""
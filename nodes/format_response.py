@@ -1,14 +1,19 @@
 from typing import Any, Dict, Optional
 from .base import Node
-from utils.call_llm import call_llm
-import json
+from utils.call_llm import call_llm, llm_retry_policy
+from utils.history import ensure_history
 
 class FormatResponseNode(Node):
+    def __init__(self, **kwargs):
+        """Initialize the node; LLM errors are retried per llm_retry_policy() unless overridden."""
+        kwargs.setdefault("retry_policy", llm_retry_policy())
+        super().__init__(**kwargs)
+        
     def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
         """Prepare context for response generation."""
         return {
             "query": shared["user_query"],
-            "history": shared["history"],
+            "history": ensure_history(shared),
             "working_dir": shared["working_dir"]
         }
         
@@ -21,7 +26,7 @@ USER QUERY:
 {context['query']}
 
 ACTION HISTORY:
-{json.dumps(context['history'], indent=2)}
+{context['history'].dumps(indent=2)}
 
 Guidelines:
 1. Summarize what was done
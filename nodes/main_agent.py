@@ -1,49 +1,31 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from .base import Node
-from utils.call_llm import call_llm
-import yaml
+from utils.call_llm import call_llm_yaml, call_llm_json, llm_retry_policy
+from utils.decision_parser import parse_decision, parse_tool_call, tool_definitions
+from utils.history import ensure_history
+from utils.history_window import HistoryWindow, DEFAULT_KEEP_LAST, DEFAULT_MAX_TOKENS
+from utils.prefetch import Prefetcher
+from .batch_ops import READ_ONLY_TOOLS
 import json
 from datetime import datetime
 
-class MainDecisionAgent(Node):
-    def __init__(self):
-        super().__init__(max_retries=2)  # Allow 2 retries for LLM calls
-        
-    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
-        """Prepare context for decision making.
-        
-        Returns dict with:
-            - user_query: Current user request
-            - history: Relevant action history
-            - working_dir: Current working directory
-        """
-        return {
-            "query": shared["user_query"],
-            "history": shared.get("history", []),
-            "working_dir": shared["working_dir"]
-        }
-        
-    def exec(self, context: Dict[str, Any]) -> Dict[str, Any]:
-        """Decide which tool to use based on context.
-        
-        Returns dict with:
-            - tool: Selected tool name
-            - reason: Explanation for tool selection
-            - params: Parameters for the tool
-        """
-        # Construct prompt
-        prompt = f"""
-Given the following context, decide which tool to use next:
-
-USER QUERY: {context['query']}
+DECISION_MODES = ("yaml", "json", "tools")
 
-PREVIOUS ACTIONS:
-{json.dumps(context['history'], indent=2)}
+# The prompt is laid out for prefix caching: the system message and the
+# query stay the same for a whole session, and the history follows as one
+# message per step whose text rarely changes once written (see
+# HistoryWindow). Only the tail after the first changed step is new to the
+# provider's (or local server's) prompt cache.
+SYSTEM_PROMPT = """Given the user's query and the previous actions, decide which tool to use next.
 
 AVAILABLE TOOLS:
 1. read_file
-   - target_file: Path to file (relative to {context['working_dir']})
+   - target_file: Path to file (relative to {working_dir})
+   - start_line: (optional) First line to read, 1-indexed
+   - end_line: (optional) Last line to read, inclusive
    - explanation: Why read this file
+   - Large files and long ranges are returned one page at a time; the result reports
+     start_line, end_line and total_lines so you can read further ranges
 
 2. edit_file
    - target_file: Path to file
@@ -63,12 +45,35 @@ AVAILABLE TOOLS:
 
 5. list_dir
    - relative_workspace_path: Path to list
+   - max_depth: (optional) Deepest level to expand, default 4
+   - max_entries: (optional) Maximum entries to show, default 400
+   - exclude: (optional) List of gitignore-style globs to leave out
    - explanation: Why list directory
+   - .gitignore rules are applied automatically
 
-6. finish
+6. find_symbol
+   - name: Identifier to look up, optionally qualified (e.g. "Flow.run")
+   - kind: (optional) class, function, method, variable, type or macro
+   - include_references: (optional) boolean, default true
+   - explanation: Why look it up
+   - Returns the definitions (with their line) and the lines that use the
+     name; prefer it over grep_search to locate code by name
+
+7. batch
+   - calls: List of independent read-only tool calls to run in parallel,
+     each with "tool" (read_file, grep_search, find_symbol or list_dir)
+     and "params"
+   - Use this instead of several separate turns when you already know
+     multiple files to read or searches to run
+
+8. finish
    - Return final response to user
 
-Decide the next action and return in YAML format:
+{format_instructions}"""
+
+NEXT_ACTION_PROMPT = "Decide which tool to use next."
+
+YAML_FORMAT = """Decide the next action and return in YAML format:
 ```yaml
 thinking: |
     <your step-by-step reasoning>
@@ -77,25 +82,118 @@ reason: <one-line explanation>
 params:
     <parameter_name>: <parameter_value>
     ...
-```
-"""
-        # Get LLM response
-        response = call_llm(prompt)
+```"""
+
+JSON_FORMAT = """Decide the next action and return it as a single JSON object:
+{"thinking": "<your step-by-step reasoning>", "tool": "<tool_name>", "reason": "<one-line explanation>", "params": {"<parameter_name>": <parameter_value>, ...}}"""
+
+TOOLS_FORMAT = """Decide the next action and call the matching function, with a one-line
+"reason" and the tool's parameters as arguments."""
+
+def _parse_answer(text: str) -> Dict[str, Any]:
+    """Parses a YAML or JSON answer into a validated decision."""
+    return parse_decision(text, READ_ONLY_TOOLS)
+
+def _parse_call(text: str) -> Dict[str, Any]:
+    """Parses a function call returned by call_llm_json into a validated decision."""
+    call = json.loads(text)
+    return parse_tool_call(call["name"], call["arguments"], READ_ONLY_TOOLS)
+
+class MainDecisionAgent(Node):
+    def __init__(
+        self,
+        history_keep_last: int = DEFAULT_KEEP_LAST,
+        history_max_tokens: int = DEFAULT_MAX_TOKENS,
+        decision_mode: str = "yaml",
+        prefetch: bool = True
+    ):
+        """Initialize the decision agent.
         
-        # Extract YAML part
-        yaml_str = response.split("```yaml")[1].split("```")[0].strip()
-        decision = yaml.safe_load(yaml_str)
+        Args:
+            history_keep_last: Number of recent steps shown verbatim in the prompt
+            history_max_tokens: Token budget for the history part of the prompt
+            decision_mode: How the LLM answers: "yaml" (streamed fenced YAML,
+                works with any model), "json" (JSON mode) or "tools" (function
+                calling); the last two need a model that supports them
+            prefetch: Whether to warm the caches for likely next reads while
+                the LLM is deciding (see utils.prefetch)
+        """
+        if decision_mode not in DECISION_MODES:
+            raise ValueError(f"Unknown decision mode: {decision_mode}")
+        super().__init__(retry_policy=llm_retry_policy(max_retries=3))
+        self.history_keep_last = history_keep_last
+        self.history_max_tokens = history_max_tokens
+        self.decision_mode = decision_mode
+        self.history_window = HistoryWindow(history_keep_last, history_max_tokens)
+        self._system_prompts: Dict[str, str] = {}
+        self.prefetcher = Prefetcher() if prefetch else None
         
-        # Validate decision
-        assert "tool" in decision, "Tool name missing"
-        assert "reason" in decision, "Reason missing"
-        assert "params" in decision, "Parameters missing"
-        assert isinstance(decision["params"], dict), "Parameters must be a dict"
+    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
+        """Prepare context for decision making.
         
-        if decision["tool"] not in ["read_file", "edit_file", "delete_file", "grep_search", "list_dir", "finish"]:
-            raise ValueError(f"Invalid tool: {decision['tool']}")
-            
-        return decision
+        Returns dict with:
+            - user_query: Current user request
+            - history: JSON text of each step of the action history,
+              compacted to the token budget
+            - working_dir: Current working directory
+        """
+        history = ensure_history(shared)
+        # Runs in the background until the decision is made
+        if self.prefetcher is not None:
+            self.prefetcher.start(history, shared["working_dir"])
+        return {
+            "query": shared["user_query"],
+            "history": self.history_window.render(history),
+            "working_dir": shared["working_dir"]
+        }
+        
+    def exec(self, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Decide which tool to use based on context.
+        
+        Returns dict with:
+            - tool: Selected tool name
+            - reason: Explanation for tool selection
+            - params: Parameters for the tool
+        """
+        prompt = self._messages(context)
+        # Parse and validate against the tool schemas; a DecisionError triggers a
+        # re-ask, and only answers that pass are cached
+        if self.decision_mode == "tools":
+            return call_llm_json(prompt, tools=tool_definitions(), validate=_parse_call)
+        if self.decision_mode == "json":
+            return call_llm_json(prompt, validate=_parse_answer)
+        # Stream the LLM response, stopping as soon as the YAML block is complete
+        return call_llm_yaml(prompt, require_fence=False, validate=_parse_answer)
+        
+    def exec_fallback(self, context: Dict[str, Any], exc: Exception) -> Dict[str, Any]:
+        """Stops the prefetch started in prep() before the failure propagates."""
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        return super().exec_fallback(context, exc)
+        
+    def _messages(self, context: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Builds the chat messages, stable parts first."""
+        working_dir = context["working_dir"]
+        system = self._system_prompts.get(working_dir)
+        if system is None:
+            system = SYSTEM_PROMPT.format(working_dir=working_dir, format_instructions=self._format_instructions())
+            self._system_prompts[working_dir] = system
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": f"USER QUERY: {context['query']}"}
+        ]
+        for step in context["history"]:
+            messages.append({"role": "user", "content": f"PREVIOUS ACTION:\n{step}"})
+        messages.append({"role": "user", "content": NEXT_ACTION_PROMPT})
+        return messages
+        
+    def _format_instructions(self) -> str:
+        """Returns the answer format part of the prompt for the decision mode."""
+        if self.decision_mode == "tools":
+            return TOOLS_FORMAT
+        if self.decision_mode == "json":
+            return JSON_FORMAT
+        return YAML_FORMAT
         
     def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
         """Update history and return next action.
@@ -108,9 +206,23 @@ params:
         Returns:
             Action string (tool name)
         """
+        if self.prefetcher is not None:
+            self.prefetcher.finish(exec_res, shared["working_dir"])
+            
         # Initialize history if needed
-        if "history" not in shared:
-            shared["history"] = []
+        ensure_history(shared)
+            
+        # A batch adds one pending entry per call; BatchToolNode fills in the results
+        if exec_res["tool"] == "batch":
+            timestamp = datetime.now().isoformat()
+            for call in exec_res["params"]["calls"]:
+                shared["history"].append({
+                    "tool": call["tool"],
+                    "reason": exec_res["reason"],
+                    "params": call["params"],
+                    "timestamp": timestamp
+                })
+            return "batch"
             
         # Add new action to history
         shared["history"].append({
@@ -1,17 +1,34 @@
 from typing import Any, Dict, Optional
 from .base import Node
-from utils.search_ops import grep_search
+from utils.search_ops import grep_search, DEFAULT_MAX_MATCHES
+from utils.symbol_index import find_symbol, DEFAULT_MAX_RESULTS
 from utils.dir_ops import list_dir
+from utils.workspace import get_workspace
 import os
 
 class GrepSearchNode(Node):
+    def __init__(self, workers: int = 1, max_matches: int = DEFAULT_MAX_MATCHES, **kwargs):
+        """Initialize a grep search node.
+        
+        Args:
+            workers (int): Worker processes for scans of large file sets; the
+                default of 1 scans in the calling thread, so processes are opt-in
+            max_matches (int): Maximum number of matches to return
+        """
+        super().__init__(**kwargs)
+        self.workers = workers
+        self.max_matches = max_matches
+        
     def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
         """Get search parameters from last history entry."""
         history_entry = shared["history"][-1]
         assert history_entry["tool"] == "grep_search"
+        return self.prep_call(history_entry["params"], shared["working_dir"])
         
-        params = history_entry["params"].copy()
-        params["working_dir"] = shared["working_dir"]
+    def prep_call(self, params: Dict[str, Any], working_dir: str) -> Dict[str, Any]:
+        """Turn tool params into exec() input."""
+        params = params.copy()
+        params["working_dir"] = working_dir
         return params
         
     def exec(self, params: Dict[str, Any]) -> tuple:
@@ -21,38 +38,118 @@ class GrepSearchNode(Node):
             case_sensitive=params.get("case_sensitive", False),
             include_pattern=params.get("include_pattern"),
             exclude_pattern=params.get("exclude_pattern"),
-            working_dir=params["working_dir"]
+            working_dir=params["working_dir"],
+            max_matches=self.max_matches,
+            workers=self.workers
         )
         
-    def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
-        """Store results and return to main agent."""
+    def make_result(self, exec_res: Any) -> Dict[str, Any]:
+        """Turn exec() output into a history result."""
         matches, success = exec_res
-        shared["history"][-1]["result"] = {
+        return {
             "success": success,
             "matches": matches if success else [],
             "match_count": len(matches) if success else 0
         }
+        
+    def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
+        """Store results and return to main agent."""
+        shared["history"][-1]["result"] = self.make_result(exec_res)
         return "decide_next"
 
-class ListDirectoryNode(Node):
-    def prep(self, shared: Dict[str, Any]) -> str:
-        """Get directory path from last history entry."""
+class FindSymbolNode(Node):
+    def __init__(self, max_results: int = DEFAULT_MAX_RESULTS, **kwargs):
+        """Initialize a find symbol node.
+        
+        Args:
+            max_results (int): Maximum number of definitions and of references to return
+        """
+        super().__init__(**kwargs)
+        self.max_results = max_results
+        
+    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the symbol name from last history entry."""
         history_entry = shared["history"][-1]
-        assert history_entry["tool"] == "list_dir"
+        assert history_entry["tool"] == "find_symbol"
+        return self.prep_call(history_entry["params"], shared["working_dir"])
+        
+    def prep_call(self, params: Dict[str, Any], working_dir: str) -> Dict[str, Any]:
+        """Turn tool params into exec() input."""
+        params = params.copy()
+        params["working_dir"] = working_dir
+        return params
         
-        rel_path = history_entry["params"]["relative_workspace_path"]
-        return os.path.join(shared["working_dir"], rel_path)
+    def exec(self, params: Dict[str, Any]) -> tuple:
+        """Look the symbol up in the symbol index."""
+        return find_symbol(
+            name=params["name"],
+            kind=params.get("kind"),
+            include_references=params.get("include_references", True),
+            working_dir=params["working_dir"],
+            max_results=self.max_results
+        )
         
-    def exec(self, dir_path: str) -> tuple:
-        """List directory contents."""
-        return list_dir(dir_path)
+    def make_result(self, exec_res: Any) -> Dict[str, Any]:
+        """Turn exec() output into a history result."""
+        result, success = exec_res
+        if not success:
+            return {"success": False, "error": result}
+        return {"success": True, **result}
         
     def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
         """Store results and return to main agent."""
+        shared["history"][-1]["result"] = self.make_result(exec_res)
+        return "decide_next"
+
+class ListDirectoryNode(Node):
+    def __init__(self, max_depth: Optional[int] = 4, max_entries: Optional[int] = 400, **kwargs):
+        """Initialize a list directory node.
+        
+        Args:
+            max_depth: Default deepest level to expand (the agent may override it)
+            max_entries: Default maximum number of entries to show
+        """
+        super().__init__(**kwargs)
+        self.max_depth = max_depth
+        self.max_entries = max_entries
+        
+    def prep(self, shared: Dict[str, Any]) -> Dict[str, Any]:
+        """Get directory path and listing limits from last history entry."""
+        history_entry = shared["history"][-1]
+        assert history_entry["tool"] == "list_dir"
+        return self.prep_call(history_entry["params"], shared["working_dir"])
+        
+    def prep_call(self, params: Dict[str, Any], working_dir: str) -> Dict[str, Any]:
+        """Turn tool params into exec() input."""
+        exclude = params.get("exclude")
+        return {
+            "dir_path": os.path.join(working_dir, params["relative_workspace_path"]),
+            "max_depth": params.get("max_depth", self.max_depth),
+            "max_entries": params.get("max_entries", self.max_entries),
+            "exclude": [exclude] if isinstance(exclude, str) else exclude,
+            "working_dir": working_dir
+        }
+        
+    def exec(self, params: Dict[str, Any]) -> tuple:
+        """List directory contents from the workspace snapshot."""
+        return list_dir(
+            params["dir_path"],
+            max_depth=params["max_depth"],
+            max_entries=params["max_entries"],
+            exclude=params["exclude"],
+            workspace=get_workspace(params["working_dir"])
+        )
+        
+    def make_result(self, exec_res: Any) -> Dict[str, Any]:
+        """Turn exec() output into a history result."""
         success, tree_str = exec_res
-        shared["history"][-1]["result"] = {
+        return {
             "success": success,
             "tree": tree_str if success else None,
             "error": tree_str if not success else None
         }
+        
+    def post(self, shared: Dict[str, Any], prep_res: Any, exec_res: Any) -> str:
+        """Store results and return to main agent."""
+        shared["history"][-1]["result"] = self.make_result(exec_res)
         return "decide_next" 
\ No newline at end of file
@@ -0,0 +1,291 @@
+import os
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from flow import Flow
+from main import close_main_flow, create_main_flow
+from utils.logging_utils import setup_logging, get_logger
+from utils.llm_cache import enable_llm_cache
+from utils.tracing import trace_session, add_sink, JsonlSpanSink
+from utils.history import History
+
+logger = get_logger(__name__)
+
+class AgentSession:
+    """One client conversation: its own flow, shared store and query queue."""
+    def __init__(self, working_dir: str, max_results: int = 32):
+        self.id = uuid.uuid4().hex
+        self.shared: Dict[str, Any] = {
+            "user_query": None,
+            "working_dir": os.path.abspath(working_dir),
+            "history": History()
+        }
+        self.pending: Deque[Tuple[str, str]] = deque()  # (query_id, query)
+        self.results: Deque[Dict[str, Any]] = deque(maxlen=max_results)  # newest last
+        self.flow: Optional[Flow] = None  # built on the first query
+        self.running = False
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def close_flow(self) -> None:
+        """Stops the flow's prefetch and batch threads, if the flow was built."""
+        if self.flow is not None:
+            close_main_flow(self.flow)
+        self.flow = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "session_id": self.id,
+                "working_dir": self.shared["working_dir"],
+                "running": self.running,
+                "pending": len(self.pending),
+                "results": list(self.results)
+            }
+
+class AgentServer:
+    """Runs many agent sessions concurrently in one process.
+
+    Each session gets its own flow graph, because nodes hold run state
+    (retry counters, edit parameters, the history window memo and the
+    prefetcher). Only the process-wide caches are shared: the pooled LLM
+    client, the LLM response cache, the file cache and the search and symbol
+    indexes. Queries of one session run one at a time in arrival order; up to
+    ``workers`` sessions run at once.
+
+    Backpressure: a session accepts at most ``max_pending`` queued queries,
+    and the server at most ``max_queued`` across all sessions. A session
+    keeps only its last ``max_results`` results.
+    """
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 4,
+        max_queued: int = 64,
+        max_sessions: int = 256,
+        max_results: int = 32
+    ):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-session")
+        self.max_pending = max_pending
+        self.max_queued = max_queued
+        self.max_sessions = max_sessions
+        self.max_results = max_results
+        self.sessions: Dict[str, AgentSession] = {}
+        self.queued = 0
+        self.lock = threading.Lock()
+
+    def create_session(self, working_dir: str) -> Optional[AgentSession]:
+        """Create a session, or return None if the session limit is reached."""
+        if not os.path.isdir(working_dir):
+            raise ValueError(f"Working directory does not exist: {working_dir}")
+        with self.lock:
+            if len(self.sessions) >= self.max_sessions:
+                return None
+            session = AgentSession(working_dir, self.max_results)
+            self.sessions[session.id] = session
+        logger.info(f"Created session {session.id} for {session.shared['working_dir']}")
+        return session
+
+    def close_session(self, session_id: str) -> bool:
+        """Forget a session; its flow is released once its running query ends."""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        with session.lock:
+            session.closed = True
+            idle = not session.running
+        if idle:
+            session.close_flow()
+        return True
+
+    def submit(self, session: AgentSession, query: str) -> Tuple[Optional[str], str]:
+        """Queue a query for a session.
+
+        Returns:
+            tuple: (query id or None if rejected, reason when rejected)
+        """
+        with self.lock:
+            if self.queued >= self.max_queued:
+                return None, "server busy"
+            with session.lock:
+                if len(session.pending) >= self.max_pending:
+                    return None, "too many pending queries for this session"
+                query_id = uuid.uuid4().hex
+                session.pending.append((query_id, query))
+                self.queued += 1
+                start = not session.running
+                session.running = True
+        if start:
+            self.executor.submit(self._drain, session)
+        return query_id, ""
+
+    def _drain(self, session: AgentSession) -> None:
+        """Run a session's queued queries in order until its queue is empty."""
+        while True:
+            with session.lock:
+                # A closed session drops what is still queued
+                taken = len(session.pending) if session.closed else 0
+                if session.closed:
+                    session.pending.clear()
+                done = not session.pending
+                if done:
+                    session.running = False
+                else:
+                    query_id, query = session.pending.popleft()
+                    taken += 1
+            with self.lock:
+                self.queued -= taken
+            if done:
+                if session.closed:
+                    session.close_flow()
+                return
+
+            result = {"query_id": query_id, "query": query, "started": datetime.now().isoformat()}
+            try:
+                session.shared["user_query"] = query
+                session.shared.pop("response", None)
+                if session.flow is None:
+                    session.flow = create_main_flow()
+                with trace_session(session.id):
+                    session.flow.run(session.shared)
+                result.update(success=True, response=session.shared.get("response", "No response generated"))
+            except Exception as e:
+                logger.error(f"Session {session.id} query {query_id} failed", exc_info=True)
+                result.update(success=False, error=str(e))
+            result["finished"] = datetime.now().isoformat()
+            with session.lock:
+                session.results.append(result)
+
+def make_handler(server: AgentServer):
+    """Build the HTTP request handler bound to an AgentServer."""
+    class AgentRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self) -> Dict[str, Any]:
+            length = int(self.headers.get("Content-Length", 0))
+            return json.loads(self.rfile.read(length) or b"{}")
+
+        def _session(self, parts: List[str]) -> Optional[AgentSession]:
+            session = server.sessions.get(parts[1]) if len(parts) > 1 else None
+            if session is None:
+                self._send(404, {"error": "unknown session"})
+            return session
+
+        def do_POST(self):
+            parts = self.path.strip("/").split("/")
+            try:
+                body = self._read_json()
+            except ValueError:
+                return self._send(400, {"error": "invalid JSON body"})
+
+            # POST /sessions {"working_dir": ...}
+            if parts == ["sessions"]:
+                try:
+                    session = server.create_session(body.get("working_dir", "."))
+                except ValueError as e:
+                    return self._send(400, {"error": str(e)})
+                if session is None:
+                    return self._send(503, {"error": "too many sessions"}, {"Retry-After": "5"})
+                return self._send(201, {"session_id": session.id})
+
+            # POST /sessions/<id>/queries {"query": ...}
+            if len(parts) == 3 and parts[0] == "sessions" and parts[2] == "queries":
+                session = self._session(parts)
+                if session is None:
+                    return
+                if not body.get("query"):
+                    return self._send(400, {"error": "missing query"})
+                query_id, reason = server.submit(session, body["query"])
+                if query_id is None:
+                    return self._send(429, {"error": reason}, {"Retry-After": "1"})
+                return self._send(202, {"session_id": session.id, "query_id": query_id})
+
+            self._send(404, {"error": "not found"})
+
+        def do_GET(self):
+            # GET /sessions/<id>
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "sessions":
+                session = self._session(parts)
+                if session is not None:
+                    self._send(200, session.to_dict())
+                return
+            self._send(404, {"error": "not found"})
+
+        def do_DELETE(self):
+            # DELETE /sessions/<id>
+            parts = self.path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "sessions" and server.close_session(parts[1]):
+                return self._send(200, {"session_id": parts[1], "closed": True})
+            self._send(404, {"error": "unknown session"})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            logger.debug(format % args)
+
+    return AgentRequestHandler
+
+def run_server(host: str = "127.0.0.1", port: int = 8765, **server_kwargs: Any) -> None:
+    """Serve the agent over HTTP until interrupted.
+
+    Args:
+        host: Interface to bind
+        port: Port to listen on
+        **server_kwargs: Passed to AgentServer (workers, max_pending, ...)
+    """
+    agent_server = AgentServer(**server_kwargs)
+    httpd = ThreadingHTTPServer((host, port), make_handler(agent_server))
+    logger.info(f"Agent server listening on http://{host}:{port}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        agent_server.executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    import argparse
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(description="Serve the coding agent over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind")
+    parser.add_argument("--port", "-p", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--workers", "-w", type=int, default=4, help="Sessions running at once")
+    parser.add_argument("--max-pending", type=int, default=4, help="Queued queries allowed per session")
+    parser.add_argument("--max-queued", type=int, default=64, help="Queued queries allowed in total")
+    parser.add_argument("--log-file", "-l", help="Log file path")
+    parser.add_argument("--debug", action="store_true", help="Enable debug logging")
+    parser.add_argument("--cache", action="store_true", help="Cache LLM responses on disk")
+    parser.add_argument("--trace-file", help="Append timing spans (tagged with session ids) to this JSONL file")
+
+    args = parser.parse_args()
+    setup_logging(level=logging.DEBUG if args.debug else logging.INFO, log_file=args.log_file)
+    if args.cache:
+        enable_llm_cache()
+    if args.trace_file:
+        add_sink(JsonlSpanSink(args.trace_file))
+
+    run_server(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_pending=args.max_pending,
+        max_queued=args.max_queued
+    )
@@ -0,0 +1,98 @@
+import pytest
+
+from utils.anchor_edit import is_marker, plan_edits
+from utils.file_ops import apply_edits
+
+def apply(tmp_path, content, code_edit):
+    """Plans code_edit locally and returns the new content, or None if it fell back."""
+    edits, success = plan_edits(content, code_edit)
+    if not success:
+        return None
+    path = tmp_path / "target.py"
+    path.write_text(content)
+    message, applied = apply_edits(str(path), edits)
+    assert applied, message
+    return path.read_text()
+
+PARSE_TESTS = 'def test_parse_int(): assert parse("1") == 1\n'
+
+@pytest.mark.parametrize("code_edit", [
+    'def test_parse_float(): assert parse("1.5") == 1.5\n',
+    '# ... existing code ...\ndef test_parse_float(): assert parse("1.5") == 1.5\n',
+    '# ... existing code ...\ndef test_parse_float(): assert parse("1.5") == 1.5\n# ... existing code ...\n',
+])
+def test_similar_sibling_never_overwrites(tmp_path, code_edit):
+    result = apply(tmp_path, PARSE_TESTS, code_edit)
+    assert result is None or ('test_parse_int' in result and 'test_parse_float' in result)
+
+def test_similar_sibling_function_is_not_a_rewrite(tmp_path):
+    content = "def alpha_one():\n    return 1\n\ndef alpha_two():\n    return 2\n"
+    result = apply(tmp_path, content, "# ... existing code ...\ndef alpha_tri():\n    return 3\n")
+    assert result is None or "def alpha_two():\n    return 2\n" in result
+
+def test_sibling_after_exact_context_is_inserted(tmp_path):
+    content = "def alpha_one():\n    return 1\n\ndef alpha_two():\n    return 2\n\ndef main():\n    pass\n"
+    code_edit = ("# ... existing code ...\ndef alpha_two():\n    return 2\n\n"
+                 "def alpha_tri():\n    return 3\n# ... existing code ...\n")
+    assert apply(tmp_path, content, code_edit) == (
+        "def alpha_one():\n    return 1\n\ndef alpha_two():\n    return 2\n\n"
+        "def alpha_tri():\n    return 3\ndef main():\n    pass\n"
+    )
+
+def test_change_between_context_lines(tmp_path):
+    content = "import os\n\ndef load(path):\n    with open(path) as f:\n        return f.read()\n"
+    code_edit = ("# ... existing code ...\ndef load(path):\n    if not os.path.exists(path):\n"
+                 "        return None\n    with open(path) as f:\n# ... existing code ...\n")
+    assert apply(tmp_path, content, code_edit) == (
+        "import os\n\ndef load(path):\n    if not os.path.exists(path):\n        return None\n"
+        "    with open(path) as f:\n        return f.read()\n"
+    )
+
+def test_whitespace_mismatch_is_reindented(tmp_path):
+    content = "class A:\n    def run(self):\n        x = 1\n        return x\n"
+    code_edit = "def run(self):\n    x = 1\n    x += 1\n    return x\n"
+    assert apply(tmp_path, content, code_edit) == (
+        "class A:\n    def run(self):\n        x = 1\n        x += 1\n        return x\n"
+    )
+
+LOAD = "import os\n\n\ndef load(path, mode):\n    with open(path, mode) as f:\n        return f.read()\n\ndef save(path):\n    pass\n"
+
+@pytest.mark.parametrize("code_edit", [
+    # First line of the chunk changed, only the trailing context matches
+    "# ... existing code ...\ndef load(path, mode, encoding=None):\n    with open(path, mode) as f:\n"
+    "        return f.read()\n# ... existing code ...\n",
+    # Last line of the chunk changed, only the leading context matches
+    "# ... existing code ...\ndef load(path, mode):\n    with open(path, mode) as f:\n"
+    "        return f.read().strip()\n# ... existing code ...\n",
+])
+def test_changed_end_line_without_context_falls_back(tmp_path, code_edit):
+    assert apply(tmp_path, LOAD, code_edit) is None
+
+@pytest.mark.parametrize("code_edit", [
+    "# ... existing code ...\na = 10\nb = compute(a, x)\n# ... existing code ...\n",
+    "# ... existing code ...\nx = 0\na = 10\n# ... existing code ...\n",
+])
+def test_changed_value_next_to_context_falls_back(tmp_path, code_edit):
+    assert apply(tmp_path, "x = 0\na = 1\nb = compute(a, x)\nprint(b)\n", code_edit) is None
+
+def test_new_code_before_context_is_inserted(tmp_path):
+    content = "import os\n\ndef load(path):\n    with open(path) as f:\n        return f.read()\n"
+    code_edit = ("# ... existing code ...\ndef helper():\n    pass\n\ndef load(path):\n"
+                 "    with open(path) as f:\n# ... existing code ...\n")
+    result = apply(tmp_path, content, code_edit)
+    assert result is not None and "def helper():\n    pass\n" in result
+    assert result.count("def load(path):") == 1
+
+def test_brace_only_context_falls_back():
+    content = "".join(f"int fn_{i}(int x)\n{{\n    return x + {i};\n}}\n\n" for i in range(50))
+    code_edit = ("// ... existing code ...\n    return x + 7;\n}\n\nint fn_new(int x)\n{\n"
+                 "    return x;\n}\n// ... existing code ...\n")
+    _, success = plan_edits(content, code_edit)
+    assert not success
+
+def test_markers():
+    assert is_marker("// ... existing code ...")
+    assert is_marker("    # ...")
+    assert is_marker("# ... rest of the file")
+    assert not is_marker("# ...then flush")
+    assert not is_marker("x = ...")
@@ -0,0 +1,59 @@
+import pytest
+
+from utils import call_llm as llm
+from utils.llm_cache import LLMCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(llm, "get_llm_cache", lambda: cache)
+    yield cache
+    cache.close()
+
+
+def _answers(monkeypatch, answers):
+    """Makes the streamed completions return the given texts in turn."""
+    calls = []
+
+    def stream_llm(prompt, model=None, base_url=None, api_key=None, timeout=None):
+        calls.append(base_url)
+        yield answers[len(calls) - 1]
+
+    monkeypatch.setattr(llm, "stream_llm", stream_llm)
+    return calls
+
+
+def _parse(text):
+    if "bad" in text:
+        raise ValueError("invalid answer")
+    return text.upper()
+
+
+def test_invalid_answer_is_not_cached(cache, monkeypatch):
+    calls = _answers(monkeypatch, ["bad", "good", "unused"])
+
+    with pytest.raises(ValueError):
+        llm.call_llm_yaml("q", require_fence=False, validate=_parse)
+    assert llm.call_llm_yaml("q", require_fence=False, validate=_parse) == "GOOD"
+    assert llm.call_llm_yaml("q", require_fence=False, validate=_parse) == "GOOD"
+    assert len(calls) == 2
+
+
+def test_cached_answer_failing_validation_is_dropped(cache, monkeypatch):
+    calls = _answers(monkeypatch, ["bad", "good"])
+
+    assert llm.call_llm_yaml("q", require_fence=False) == "bad"
+    assert llm.call_llm_yaml("q", require_fence=False, validate=_parse) == "GOOD"
+    assert len(calls) == 2
+    assert llm.call_llm_yaml("q", require_fence=False, validate=_parse) == "GOOD"
+    assert cache.stats() == {"hits": 1, "misses": 2, "entries": 1}
+
+
+def test_cache_key_includes_base_url(cache, monkeypatch):
+    calls = _answers(monkeypatch, ["one", "two"])
+
+    assert llm.call_llm_yaml("q", require_fence=False, base_url="http://a/v1") == "one"
+    assert llm.call_llm_yaml("q", require_fence=False, base_url="http://b/v1") == "two"
+    assert llm.call_llm_yaml("q", require_fence=False, base_url="http://a/v1") == "one"
+    assert calls == ["http://a/v1", "http://b/v1"]
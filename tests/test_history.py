@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from utils.history import ContentStore, History, HistoryEntry
+
+
+def _read(content, **extra):
+    return {"tool": "read_file", "reason": "inspect", "params": {"target_file": "a.py"},
+            "result": {"success": True, "content": content, **extra}}
+
+
+def test_key_checks_do_not_rebuild_the_result(monkeypatch):
+    entry = HistoryEntry(ContentStore(), _read("x" * 1000))
+    monkeypatch.setattr(ContentStore, "get", lambda self, blob_id: pytest.fail("result was rebuilt"))
+
+    assert "result" in entry and "tool" in entry
+    assert "timestamp" not in entry and "missing" not in entry
+
+
+@pytest.mark.parametrize("indent,depth", [(None, 0), (2, 0), (2, 1)])
+def test_values_that_look_like_markers_are_not_spliced(indent, depth):
+    history = History()
+    history.append(_read("x" * 1000))
+    history.append(dict(_read("y" * 1000, note="\x00blob:0\x00"), reason="\x00blob:1\x00"))
+    history.append(_read("\x00blob:0\x00"))
+
+    for entry in history:
+        assert json.loads(entry.to_json(indent, depth)) == entry.to_dict()
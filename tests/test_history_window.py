@@ -0,0 +1,94 @@
+from utils.history import History
+from utils.history_window import (
+    DEFAULT_MAX_TOKENS,
+    HistoryWindow,
+    _simulated_history,
+    compact_history,
+    estimate_tokens,
+)
+
+
+def _read(path, start=None, end=None, body="line of code\n" * 50, page=None):
+    params = {"target_file": path}
+    if start is not None:
+        params["start_line"] = start
+    if end is not None:
+        params["end_line"] = end
+    result = {"success": True, "content": body, "error": None}
+    if page is not None:
+        result.update(start_line=page[0], end_line=page[1], total_lines=5000)
+    return {"tool": "read_file", "reason": "inspect", "params": params, "result": result}
+
+
+def _edit(path):
+    return {"tool": "edit_file", "reason": "fix", "params": {"target_file": path},
+            "result": {"success": True, "operations": []}}
+
+
+def _is_superseded(entry):
+    content = entry["result"]["content"]
+    return content.startswith("[") and "superseded" in content
+
+
+def test_prompt_stays_bounded_over_100_steps():
+    history = _simulated_history(100)
+    window = HistoryWindow()
+    for turn in range(1, 101):
+        compacted = compact_history(history[:turn])
+        assert estimate_tokens(compacted) <= DEFAULT_MAX_TOKENS + 100  # Room for the summary entry
+        assert [e for e, _, _ in window.window(history[:turn])] == compacted
+    assert estimate_tokens(history) > 10 * DEFAULT_MAX_TOKENS
+
+
+def test_read_superseded_by_same_or_wider_read_or_edit():
+    history = [
+        _read("a.py", 10, 20),    # covered by the whole-file read below
+        _read("a.py"),            # covered by the edit
+        _edit("a.py"),
+        _read("b.py"),            # covered by the later whole-file read
+        _read("b.py", 1, 40),     # covered by the later whole-file read
+        _read("b.py"),
+        _read("c.py", 1, 10),     # covered by the later identical range
+        _read("c.py", 1, 10),
+    ]
+    compacted = compact_history(history, keep_last=len(history))
+    reads = [e for e in compacted if e["tool"] == "read_file"]
+    assert [_is_superseded(e) for e in reads] == [True, True, True, True, False, True, False]
+
+
+def test_ranged_read_does_not_supersede_other_parts():
+    history = [
+        _read("a.py"),              # whole file, later reads cover only parts
+        _read("a.py", 1, 100),
+        _read("a.py", 50, 60),      # inside the next read
+        _read("a.py", 40, 200),
+        _read("b.py", 1, 10),
+        _read("b.py", 11, 20),
+    ]
+    compacted = compact_history(history, keep_last=len(history))
+    assert [_is_superseded(e) for e in compacted] == [False, False, True, False, False, False]
+
+
+def test_paged_read_supersedes_only_the_lines_it_returned():
+    history = [
+        _read("a.py", 2500, 2600, page=(2500, 2600)),
+        _read("a.py", page=(1, 2000)),                # unranged, but paged
+        _read("a.py", 1, 5000, page=(1, 2000)),       # capped range
+        _read("a.py", 2550, 2560, page=(2550, 2560)),
+        _read("b.py", 10, 20, page=(10, 20)),
+        {"tool": "read_file", "reason": "inspect", "params": {"target_file": "b.py"},
+         "result": {"success": False, "content": None, "error": "File not found"}},
+    ]
+    compacted = compact_history(history, keep_last=len(history))
+    assert [_is_superseded(e) for e in compacted[:5]] == [False, True, False, False, False]
+
+
+def test_history_records_give_the_same_ranges():
+    history = [
+        _read("a.py", 2500, 2600, page=(2500, 2600)),
+        _read("a.py", page=(1, 2000)),
+        _read("a.py", 2400, 2700, page=(2400, 2700)),
+    ]
+    expected = compact_history(history, keep_last=3)
+    assert compact_history(History(history), keep_last=3) == expected
+    assert [_is_superseded(e) for e in expected] == [True, False, False]
@@ -0,0 +1,69 @@
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.search_ops import grep_search
+
+QUERIES = ["alpha", "def beta", r"gamma_\d+", "DELTA", "no such text"]
+
+
+def _make_tree(root, seed):
+    rng = random.Random(seed)
+    words = ["alpha", "def beta():", "gamma_7", "Delta", "filler", "pass"]
+    for d in range(4):
+        sub = os.path.join(root, f"pkg{d}")
+        os.makedirs(sub)
+        for f in range(15):
+            with open(os.path.join(sub, f"mod{f}.py"), "w") as out:
+                for _ in range(rng.randint(5, 40)):
+                    out.write(" ".join(rng.choice(words) for _ in range(3)) + "\n")
+
+
+@pytest.fixture
+def roots(tmp_path):
+    roots = []
+    for i in range(3):
+        root = tmp_path / f"root{i}"
+        root.mkdir()
+        _make_tree(str(root), i)
+        roots.append(str(root))
+    return roots
+
+
+def test_concurrent_searches_match_single_threaded(roots):
+    cases = [
+        (root, query, case_sensitive, use_index)
+        for root in roots
+        for query in QUERIES
+        for case_sensitive in (False, True)
+        for use_index in (False, True)
+    ]
+
+    def search(case):
+        root, query, case_sensitive, use_index = case
+        return grep_search(query, case_sensitive=case_sensitive, working_dir=root,
+                           use_index=use_index, max_matches=10000)
+
+    # The first concurrent pass builds the workspace snapshots and indexes
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        concurrent = [list(pool.map(search, cases * 2)) for _ in range(3)]
+    expected = [search(case) for case in cases]
+    assert any(matches for matches, success in expected)
+    for results in concurrent:
+        assert results == expected * 2
+
+
+def test_parallel_scan_matches_serial_scan(tmp_path):
+    root = str(tmp_path)
+    _make_tree(root, 7)
+    for i in range(300):
+        with open(os.path.join(root, f"extra{i:03d}.txt"), "w") as out:
+            out.write(f"alpha {i}\nfiller\n")
+
+    for max_matches in (5, 100, 10000):
+        serial = grep_search("alpha", working_dir=root, use_index=False, max_matches=max_matches)
+        parallel = grep_search("alpha", working_dir=root, use_index=False, max_matches=max_matches, workers=2)
+        assert parallel == serial
+        assert serial[1] and len(serial[0]) >= min(max_matches, 300)
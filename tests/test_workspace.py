@@ -0,0 +1,118 @@
+import os
+import threading
+
+from utils import workspace as ws
+from utils.search_ops import grep_search
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_polling_sees_in_place_edit_before_full_rescan(tmp_path):
+    root = str(tmp_path)
+    _write(os.path.join(root, "a.py"), "old = 1\n")
+    workspace = ws.Workspace(root, use_inotify=False, full_rescan_interval=3600)
+    version = workspace.version
+
+    _write(os.path.join(root, "a.py"), "new_value = 22\n")
+    os.utime(os.path.join(root, "a.py"), ns=(1, 1))  # Directory mtime unchanged
+    workspace.refresh()
+
+    assert workspace.version != version
+    assert workspace.entries["a.py"].size == len("new_value = 22\n")
+    workspace.close()
+
+
+def test_grep_sees_external_edit_in_polling_mode(tmp_path, monkeypatch):
+    monkeypatch.setattr(ws, "_make_inotify", lambda: None)
+    root = str(tmp_path)
+    _write(os.path.join(root, "a.py"), "nothing here\n")
+    assert grep_search("needle_text", working_dir=root)[0] == []
+
+    _write(os.path.join(root, "a.py"), "needle_text = 1\n")
+    matches, success = grep_search("needle_text", working_dir=root)
+    assert success and [m["file_path"] for m in matches] == ["./a.py"]
+    ws.close_workspace(root)
+
+
+def test_scan_matches_disk(tmp_path):
+    root = str(tmp_path)
+    os.makedirs(os.path.join(root, "pkg", "sub"))
+    _write(os.path.join(root, "pkg", "mod.py"), "x = 1\n")
+    _write(os.path.join(root, "pkg", "sub", "deep.py"), "y = 2\n")
+    os.symlink(os.path.join(root, "pkg"), os.path.join(root, "link"))
+    os.symlink(os.path.join(root, "missing"), os.path.join(root, "broken"))
+
+    workspace = ws.Workspace(root, use_inotify=False)
+    assert workspace.files() == ["broken", os.path.join("pkg", "mod.py"), os.path.join("pkg", "sub", "deep.py")]
+    assert workspace.entries["link"].is_dir and workspace.entries["link"].is_symlink
+    assert workspace.entries["broken"].is_symlink and not workspace.entries["broken"].is_dir
+    workspace.close()
+
+
+def test_workspaces_are_evicted_and_closed(tmp_path, monkeypatch):
+    monkeypatch.setattr(ws, "MAX_WORKSPACES", 2)
+    ws.close_workspaces()
+    roots = []
+    for i in range(3):
+        root = tmp_path / f"root{i}"
+        root.mkdir()
+        roots.append(str(root))
+    first = ws.get_workspace(roots[0])
+    ws.get_workspace(roots[1])
+    ws.get_workspace(roots[0])  # Most recently used now
+    ws.get_workspace(roots[2])
+
+    assert list(ws._workspaces) == [roots[0], roots[2]]
+    assert ws.get_workspace(roots[0]) is first
+    assert ws.close_workspace(roots[0]) and not first.uses_inotify
+    assert not ws.close_workspace(roots[0])
+    ws.close_workspaces()
+
+
+def test_cold_scan_does_not_block_other_roots(tmp_path, monkeypatch):
+    ws.close_workspaces()
+    slow, fast = tmp_path / "slow", tmp_path / "fast"
+    slow.mkdir()
+    fast.mkdir()
+    started, release = threading.Event(), threading.Event()
+    full_scan = ws.Workspace._full_scan
+
+    def blocking_scan(self):
+        if self.root == str(slow):
+            started.set()
+            release.wait(5)
+        full_scan(self)
+
+    monkeypatch.setattr(ws.Workspace, "_full_scan", blocking_scan)
+    thread = threading.Thread(target=ws.get_workspace, args=(str(slow),))
+    thread.start()
+    assert started.wait(5)
+    try:
+        assert ws.get_workspace(str(fast)).root == str(fast)
+    finally:
+        release.set()
+        thread.join()
+    ws.close_workspaces()
+
+
+def test_polling_restats_only_recent_files_between_full_rescans(tmp_path):
+    root = str(tmp_path)
+    for name in ("old.py", "new.py"):
+        _write(os.path.join(root, name), "x = 1\n")
+    os.utime(os.path.join(root, "old.py"), ns=(1, 1))
+    workspace = ws.Workspace(root, use_inotify=False, full_rescan_interval=3600)
+
+    for name in ("old.py", "new.py"):
+        _write(os.path.join(root, name), "value = 22\n")
+        os.utime(os.path.join(root, name), ns=(2, 2))  # Directory mtime unchanged
+    workspace.refresh()
+    assert workspace.entries["new.py"].size == len("value = 22\n")
+    assert workspace.entries["old.py"].size == len("x = 1\n")
+
+    workspace.full_rescan_interval = 0
+    workspace.refresh()
+    assert workspace.entries["old.py"].size == len("value = 22\n")
+    workspace.close()
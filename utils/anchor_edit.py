@@ -0,0 +1,413 @@
+import bisect
+import difflib
+import os
+import re
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+FUZZY_RATIO = 0.85  # Minimum difflib ratio for two lines to match fuzzily
+NEAR_LINES = 20  # Lines next to an anchor searched for a changed version of unanchored new lines
+
+# "// ... existing code ...", "# ... rest of the file", "<!-- ... -->", "…",
+# but not a comment that merely starts with an ellipsis ("# ...then flush")
+_ELLIPSIS = r'(?:\.\.\.|…)'
+_MARKER_WORDS = r'(?:existing|unchanged|rest|remaining|omitted|previous|other|same|more|keep|code|snip)'
+_COMMENTED_MARKER = re.compile(
+    r'^\s*(?:#|//|/\*|<!--|--|;|\*)\s*' + _ELLIPSIS
+    + r'\s*(?:[^.…]*' + _ELLIPSIS + r'|(?:\w+\s+)?' + _MARKER_WORDS + r'\b.*)?\s*(?:\*/|-->)?\s*$',
+    re.IGNORECASE
+)
+_BARE_MARKER = re.compile(r'^\s*(?:\.\.\.|…)\s*[A-Za-z][\w\s]*(?:\.\.\.|…)\s*$')
+
+def is_marker(line: str) -> bool:
+    """Tells whether a code_edit line stands for unchanged existing code."""
+    return bool(_COMMENTED_MARKER.match(line) or _BARE_MARKER.match(line))
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+_local = threading.local()
+
+def _matcher(line: str) -> difflib.SequenceMatcher:
+    # The code_edit line is the second sequence, whose analysis difflib keeps.
+    # Matchers are stateful, hence one cache per thread.
+    cache = getattr(_local, "matchers", None)
+    if cache is None or len(cache) > 256:
+        cache = _local.matchers = {}
+    matcher = cache.get(line)
+    if matcher is None:
+        matcher = cache[line] = difflib.SequenceMatcher(None, "", _normalize(line), autojunk=False)
+    return matcher
+
+def _fuzzy(a: str, b: str) -> bool:
+    matcher = _matcher(a)
+    b = _normalize(b)
+    if matcher.b == b:
+        return True
+    if not b or not matcher.b:
+        return False
+    matcher.set_seq1(b)
+    return (matcher.real_quick_ratio() >= FUZZY_RATIO and matcher.quick_ratio() >= FUZZY_RATIO
+            and matcher.ratio() >= FUZZY_RATIO)
+
+# Line comparisons from strictest to loosest
+LEVELS: List[Tuple[str, Callable[[str, str], bool]]] = [
+    ("exact", lambda a, b: a == b),
+    ("whitespace", lambda a, b: _normalize(a) == _normalize(b)),
+    ("fuzzy", _fuzzy),
+]
+
+def _trivial(line: str) -> bool:
+    # Braces, "end", blank lines: too common to tell places apart
+    return len(_WORD.findall(line)) < 4
+
+_WORD = re.compile(r'\w')
+
+class _Ambiguous(Exception):
+    pass
+
+def _split_chunks(code_edit: str) -> List[Tuple[bool, List[str], bool]]:
+    """Splits code_edit at marker lines.
+
+    Returns:
+        list: (marker before, chunk lines, marker after) for every non-empty chunk
+    """
+    chunks = []
+    current: List[str] = []
+    before = False
+    for line in code_edit.splitlines():
+        if is_marker(line):
+            if any(l.strip() for l in current):
+                chunks.append((before, current, True))
+            current = []
+            before = True
+        else:
+            current.append(line)
+    if any(l.strip() for l in current):
+        chunks.append((before, current, False))
+    # Blank lines next to a marker belong to the elided code
+    return [(b, _trim_blank(lines, b, a), a) for b, lines, a in chunks]
+
+def _trim_blank(lines: List[str], before: bool, after: bool) -> List[str]:
+    start, end = 0, len(lines)
+    while before and start < end and not lines[start].strip():
+        start += 1
+    while after and end > start and not lines[end - 1].strip():
+        end -= 1
+    return lines[start:end]
+
+def _best(matches: Dict[int, Tuple[int, int]]) -> Tuple[Tuple[int, int], List[int]]:
+    """Returns the best (length, strength) and every position reaching it."""
+    if not matches:
+        return (0, 0), []
+    best = max(matches.values())
+    return best, sorted(pos for pos, match in matches.items() if match == best)
+
+def _anchor_chunk(
+    lines: List[str],
+    chunk: List[str],
+    lo: int,
+    same: Callable[[str, str], bool]
+) -> Tuple[Optional[Tuple[int, int, int]], Optional[Tuple[int, int, int]]]:
+    """Finds where a chunk's leading and trailing context sits in the file.
+
+    Longer context wins; among equally long ones (which happens with fuzzy
+    matching) the one with more non-trivial lines equal up to whitespace
+    (its strength) wins. Context without any line equal up to whitespace
+    (for fuzzy matching: any such non-trivial line) is no anchor: a new
+    function next to a similar one would otherwise be taken for a changed
+    version of it.
+
+    Returns:
+        tuple: (head, tail), each (file position, matched lines, strength)
+        or None. The head covers lines[pos:pos + n] = chunk[:n]; the tail
+        covers lines[pos - n:pos] = chunk[-n:].
+
+    Raises:
+        _Ambiguous: If the context matches equally well in several places
+    """
+    n = len(chunk)
+    strict = LEVELS[1][1]
+    # A fuzzy anchor needs a real line in common, not just a brace or blank
+    needed = 1 if same is _fuzzy else 0
+    heads: Dict[int, Tuple[int, int]] = {}  # position -> (matched lines, strength)
+    tails: Dict[int, Tuple[int, int]] = {}
+    for i in range(lo, len(lines)):
+        if same(chunk[0], lines[i]):
+            k = 1
+            while k < n and i + k < len(lines) and same(chunk[k], lines[i + k]):
+                k += 1
+            equal = [d for d in range(k) if strict(chunk[d], lines[i + d])]
+            strength = sum(not _trivial(chunk[d]) for d in equal)
+            if equal and strength >= needed:
+                heads[i] = (k, strength)
+        if same(chunk[-1], lines[i]):
+            m = 1
+            while m < n and i - m >= lo and same(chunk[n - 1 - m], lines[i - m]):
+                m += 1
+            equal = [d for d in range(m) if strict(chunk[n - 1 - d], lines[i - d])]
+            strength = sum(not _trivial(chunk[n - 1 - d]) for d in equal)
+            if equal and strength >= needed:
+                tails[i + 1] = (m, strength)
+
+    (head_len, _), head_positions = _best(heads)
+    if head_len == n:
+        if len(head_positions) > 1:
+            raise _Ambiguous("the edit matches unchanged code in several places")
+        return (head_positions[0], n, heads[head_positions[0]][1]), None
+
+    # Pair heads and tails: in order, without overlap in the chunk; prefer the
+    # pair with the longest and strongest context, then the shortest span.
+    # For a head, only the nearest tail of each (length, strength) can be
+    # best, so tails are grouped and bisected instead of trying every pair.
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for j in sorted(tails):
+        groups.setdefault(tails[j], []).append(j)
+    best, second = None, None
+    for i, (k, head_strength) in heads.items():
+        for (m, tail_strength), positions in groups.items():
+            if k + m > n:
+                continue
+            at = bisect.bisect_left(positions, i + k + m)
+            if at == len(positions):
+                continue
+            j = positions[at]
+            key = (-(k + m), -(head_strength + tail_strength), j - i, i, j)
+            if best is None or key < best:
+                best, second = key, best
+            elif second is None or key < second:
+                second = key
+    if best is not None:
+        if second is not None and second[:3] == best[:3]:
+            raise _Ambiguous("the edit's context matches several places")
+        i, j = best[3:]
+        return (i, *heads[i]), (j, *tails[j])
+
+    if head_len and len(head_positions) > 1:
+        raise _Ambiguous("the edit's leading context matches several places")
+    (tail_len, _), tail_positions = _best(tails)
+    if tail_len and len(tail_positions) > 1:
+        raise _Ambiguous("the edit's trailing context matches several places")
+    if head_len and tail_len:
+        raise _Ambiguous("the edit's leading and trailing context overlap")
+    head = (head_positions[0], *heads[head_positions[0]]) if head_len else None
+    tail = (tail_positions[0], *tails[tail_positions[0]]) if tail_len else None
+    return head, tail
+
+def _reindent(new_lines: List[str], file_line: str, chunk_line: str) -> List[str]:
+    """Shifts new lines by the indentation difference of an anchor line."""
+    file_indent = file_line[:len(file_line) - len(file_line.lstrip())]
+    chunk_indent = chunk_line[:len(chunk_line) - len(chunk_line.lstrip())]
+    if file_indent == chunk_indent:
+        return new_lines
+    if file_indent.startswith(chunk_indent):
+        extra = file_indent[len(chunk_indent):]
+        return [extra + l if l.strip() else l for l in new_lines]
+    if chunk_indent.startswith(file_indent):
+        cut = len(chunk_indent) - len(file_indent)
+        return [l[cut:] if l[:cut].strip() == "" else l for l in new_lines]
+    return new_lines
+
+Anchor = Tuple[int, int, int]  # File position, matched lines, strength
+
+def _rewrite_of(new: str, old: str) -> bool:
+    new, old = _normalize(new), _normalize(old)
+    if new == old:
+        return False
+    # An appended argument or changed value keeps most of the line's start
+    shorter = min(len(new), len(old))
+    prefix = len(os.path.commonprefix([new, old]))
+    return prefix >= 3 * shorter / 4 or _fuzzy(new, old)
+
+def _rewrites(new_lines: List[str], file_lines: List[str]) -> bool:
+    """Tells whether some new line looks like a changed version of a file line.
+
+    Lines without any word character (braces, blank lines) are ignored.
+    """
+    file_lines = [l for l in file_lines if _WORD.search(l)]
+    return any(_rewrite_of(new, old) for new in new_lines if _WORD.search(new) for old in file_lines)
+
+def _locate(lines: List[str], chunk: List[str], lo: int) -> Tuple[Optional[Anchor], Optional[Anchor], bool]:
+    """Anchors a chunk at the strictest level that places both of its ends.
+
+    A level that only finds one end is kept as a fallback, since the other
+    end may be new code, but looser levels are tried first in case they
+    find it too.
+
+    Returns:
+        tuple: (head, tail, whether lines were compared loosely)
+    """
+    partial = None
+    for name, same in LEVELS:
+        head, tail = _anchor_chunk(lines, chunk, lo, same)
+        if head is not None and (tail is not None or head[1] == len(chunk)):
+            return head, tail, name != "exact"
+        if partial is None and (head is not None or tail is not None):
+            partial = (head, tail, name != "exact")
+    return partial if partial is not None else (None, None, False)
+
+def _plan(lines: List[str], chunks) -> Optional[List[Dict]]:
+    """Turns chunks into line edits, or None if some chunk has no anchor."""
+    edits = []
+    lo = 0
+    for index, (marker_before, chunk, marker_after) in enumerate(chunks):
+        n = len(chunk)
+        head, tail, loose = _locate(lines, chunk, lo)
+        if head is None and tail is None:
+            return None
+        if tail is None and head[1] < n and not marker_after and index == len(chunks) - 1:
+            raise _Ambiguous("the edit's end could not be located")
+        if head is None and not marker_before and index == 0:
+            raise _Ambiguous("the edit's start could not be located")
+
+        # Context lines that only matched fuzzily are changed lines too
+        kept_head = head[1] if head is not None else 0
+        kept_tail = tail[1] if tail is not None else 0
+        if loose:
+            for d in range(kept_head):
+                if _normalize(chunk[d]) != _normalize(lines[head[0] + d]):
+                    kept_head = d
+                    break
+            for d in range(kept_tail):
+                if _normalize(chunk[n - 1 - d]) != _normalize(lines[tail[0] - 1 - d]):
+                    kept_tail = d
+                    break
+
+        # Lines [start:end] of the file become chunk[kept_head:n - kept_tail]
+        start = head[0] + kept_head if head is not None else tail[0] - tail[1]
+        end = tail[0] - kept_tail if tail is not None else head[0] + head[1]
+        if loose and not kept_head and not kept_tail and end > start:
+            # Every anchor line differs from the file: a new sibling of similar
+            # code cannot be told apart from a rewrite of it
+            raise _Ambiguous("the edit's context only matches fuzzily")
+        if end > start and any(a is not None and not a[2] for a in (head, tail)):
+            # A brace or blank line alone cannot say which code is replaced
+            raise _Ambiguous("the edit's context is too common to place a change")
+        new = chunk[kept_head:n - kept_tail]
+        # New lines at an end without context are inserted next to the anchor.
+        # If they resemble the code there, they most likely rewrite it (a
+        # changed signature, "a = 10" for "a = 1"), which cannot be placed.
+        if head is None and new and _rewrites(new[-NEAR_LINES:], lines[max(lo, start - NEAR_LINES):start]):
+            raise _Ambiguous("the edit's first lines change code that has no leading context")
+        if tail is None and new and _rewrites(new[:NEAR_LINES], lines[end:end + NEAR_LINES]):
+            raise _Ambiguous("the edit's last lines change code that has no trailing context")
+        if loose and new:
+            anchor = (lines[head[0]], chunk[0]) if head is not None else (lines[tail[0] - 1], chunk[-1])
+            new = _reindent(new, *anchor)
+        lo = tail[0] if tail is not None else end
+
+        if not new and start == end:
+            continue
+        if new:
+            # An insertion when start == end
+            edits.append({"start_line": start + 1, "end_line": end, "replacement": "\n".join(new)})
+        elif start > 0:
+            # A deletion: replace the removed lines and the line before with that line
+            edits.append({"start_line": start, "end_line": end, "replacement": lines[start - 1]})
+        elif end < len(lines):
+            # A deletion at the top of the file: keep the line after instead
+            edits.append({"start_line": 1, "end_line": end + 1, "replacement": lines[end]})
+        else:
+            raise _Ambiguous("the edit would empty the file")
+    return edits
+
+def plan_edits(content: str, code_edit: str) -> Tuple[object, bool]:
+    """Resolves a code_edit snippet against a file without asking the LLM.
+
+    The snippet shows the changed code with some unchanged lines around it
+    and marks skipped code with lines such as ``# ... existing code ...``.
+    Each part between markers is located in the file by its leading and
+    trailing unchanged lines, in order, and the lines between them are
+    replaced by the new ones. Lines are compared exactly first, then with
+    whitespace normalized, then fuzzily (see LEVELS); after a loose match
+    the new lines are re-indented to the file's indentation. Context that
+    only matches fuzzily, or that is only braces and blank lines, never
+    decides which lines get replaced. New lines at an end without context
+    are inserted, unless they resemble the code next to the anchor, in
+    which case they probably rewrite it and the snippet is not placed.
+
+    Args:
+        content (str): Current file content
+        code_edit (str): The edit snippet
+
+    Returns:
+        tuple: (edits for apply_edits(), True), or (reason, False) when the
+        snippet cannot be placed unambiguously and the caller should fall
+        back to the LLM
+    """
+    lines = content.splitlines()
+    chunks = _split_chunks(code_edit)
+    if not chunks:
+        return "code_edit contains no code", False
+    if not lines:
+        if len(chunks) > 1 or chunks[0][0] or chunks[0][2]:
+            return "code_edit refers to existing code, but the file is empty", False
+        return [{"start_line": 1, "end_line": 0, "replacement": "\n".join(chunks[0][1])}], True
+
+    try:
+        edits = _plan(lines, chunks)
+    except _Ambiguous as e:
+        return str(e), False
+    if edits is None:
+        return "the edit's context was not found in the file", False
+    return edits, True
+
+def _benchmark(functions: int = 1000) -> None:
+    """Times anchor matching on a large file at each match level."""
+    import time
+
+    content = "".join(
+        f"def handler_{i}(request):\n    data = request.get('item_{i}')\n    return process(data, {i})\n\n"
+        for i in range(functions)
+    )
+    target = functions // 2
+    snippets = {
+        "exact": f"# ... existing code ...\ndef handler_{target}(request):\n    data = request.get('item_{target}')\n    log(data)\n    return process(data, {target})\n# ... existing code ...",
+        "whitespace": f"# ... existing code ...\ndef handler_{target}(request):\ndata = request.get('item_{target}')\nlog(data)\nreturn process(data, {target})\n# ... existing code ...",
+        "fuzzy": f"# ... existing code ...\ndef handler_{target}(request, user):\n    data = request.get('item_{target}')\n    log(data)\n    return process(data, {target})\n# ... existing code ...",
+    }
+    print(f"File: {len(content.splitlines())} lines")
+    for name, code_edit in snippets.items():
+        start = time.perf_counter()
+        edits, success = plan_edits(content, code_edit)
+        elapsed = time.perf_counter() - start
+        assert success, edits
+        print(f"  {name}: {elapsed * 1000:.1f} ms, {len(edits)} edit(s)")
+
+    # Context made of braces matches thousands of places and must fall back fast
+    content = "".join(f"int fn_{i}(int x)\n{{\n    return x + {i};\n}}\n\n" for i in range(functions * 6))
+    code_edit = "// ... existing code ...\n}\n\nint fn_new(int x)\n{\n    return x;\n}\n// ... existing code ..."
+    start = time.perf_counter()
+    reason, success = plan_edits(content, code_edit)
+    elapsed = time.perf_counter() - start
+    assert not success
+    print(f"C file of {len(content.splitlines())} lines, brace-only context: {elapsed * 1000:.1f} ms ({reason})")
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        _benchmark()
+        sys.exit(0)
+
+    # Example usage
+    content = """import os
+
+def load(path):
+    with open(path) as f:
+        return f.read()
+
+def save(path, data):
+    with open(path, "w") as f:
+        f.write(data)
+"""
+    code_edit = """# ... existing code ...
+def load(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+# ... existing code ...
+"""
+    edits, success = plan_edits(content, code_edit)
+    print(success, edits)
@@ -0,0 +1,20 @@
+import os
+
+def get_cache_dir(*parts: str) -> str:
+    """Returns (and creates) a directory inside the agent's on-disk cache.
+
+    The cache lives in ``~/.cache/pf_agent`` unless the ``PF_AGENT_CACHE_DIR``
+    environment variable points somewhere else.
+
+    Args:
+        *parts (str): Sub-directory components below the cache root
+
+    Returns:
+        str: Absolute path of the cache directory
+    """
+    base = os.environ.get("PF_AGENT_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "pf_agent"
+    )
+    path = os.path.abspath(os.path.join(base, *parts))
+    os.makedirs(path, exist_ok=True)
+    return path
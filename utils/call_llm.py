@@ -1,18 +1,363 @@
+import openai
 from openai import OpenAI
+import json
 import os
+import threading
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from utils.llm_cache import cache_key, get_llm_cache
+from utils.yaml_stream import extract_yaml_block
+from utils.history_window import CHARS_PER_TOKEN
+from utils.tracing import record_llm_call
+from utils.retry import RetryPolicy
+
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_API_KEY = os.environ.get("LLM_API_KEY", "sk-or-v1-86dcaxxxxx")
+LLM_MODEL = os.environ.get("LLM_MODEL", "meta-llama/llama-3.3-8b-instruct:free")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+# Retries inside the OpenAI client. Nodes retry with their own RetryPolicy
+# (see llm_retry_policy), so the client's retries are off by default to
+# avoid multiplying attempts against a rate-limited gateway.
+LLM_CLIENT_MAX_RETRIES = int(os.environ.get("LLM_CLIENT_MAX_RETRIES", "0"))
+
+# One client per (base_url, api_key, timeout). Each client owns an HTTP
+# connection pool, so reusing it keeps TLS connections alive across calls.
+_clients: Dict[Tuple[str, str, float], OpenAI] = {}
+_clients_lock = threading.Lock()
+_call_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+def get_client(
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> OpenAI:
+    """Returns the shared client for an endpoint, creating it on first use.
+
+    Args:
+        base_url (str, optional): API base URL (defaults to LLM_BASE_URL)
+        api_key (str, optional): API key (defaults to LLM_API_KEY)
+        timeout (float, optional): Request timeout in seconds (defaults to LLM_TIMEOUT)
+
+    Returns:
+        OpenAI: A client that is reused by every call with the same settings
+    """
+    key = (base_url or LLM_BASE_URL, api_key or LLM_API_KEY, timeout or LLM_TIMEOUT)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(base_url=key[0], api_key=key[1], timeout=key[2], max_retries=LLM_CLIENT_MAX_RETRIES)
+            _clients[key] = client
+        return client
+
+def close_clients() -> None:
+    """Closes all pooled clients and their connections."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+def is_transient_llm_error(exc: Exception) -> bool:
+    """Tells whether an API error may go away by itself (rate limits, timeouts, 5xx)."""
+    if isinstance(exc, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code in (408, 409, 425, 429, 500, 502, 503, 504)
+
+def is_retryable_llm_error(exc: Exception) -> bool:
+    """Tells whether a node that calls the LLM should try again after an error.
+
+    Transient API errors are retryable; other API errors (bad request,
+    authentication, unknown model, ...) fail the same way every time.
+    Anything else is a problem with the answer itself (unparsable YAML, a
+    failed validation), which a new sample may not have.
+    """
+    if isinstance(exc, openai.APIError):
+        return is_transient_llm_error(exc)
+    return True
+
+def llm_retry_policy(max_retries: int = 3, **kwargs) -> RetryPolicy:
+    """Retry policy for nodes whose exec() calls the LLM.
+
+    Transient API errors back off exponentially with jitter from 1s up to
+    30s and honor Retry-After; a bad answer is re-sampled right away; other
+    API errors are not retried. Retries stop after 120s.
+    """
+    options = dict(base_delay=1.0, multiplier=2.0, max_delay=30.0, jitter=0.5, max_elapsed=120.0,
+                   retry_if=is_retryable_llm_error, wait_if=is_transient_llm_error)
+    options.update(kwargs)
+    return RetryPolicy(max_retries=max_retries, **options)
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+Prompt = Union[str, List[Dict[str, str]]]
+
+def _messages(prompt: Prompt) -> List[Dict[str, str]]:
+    """Turns a prompt into chat messages.
+
+    A string becomes a single user message. A list of messages is sent as
+    is; keeping its leading messages identical between calls lets the
+    provider (or a local server's KV cache) reuse the shared prefix.
+    """
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return prompt
+
+def _prompt_text(prompt: Prompt) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    return "".join(str(m.get("content") or "") for m in prompt)
+
+_MISS = object()
+
+def _cache_get(cache: Any, key: str, validate: Optional[Callable[[str], Any]]) -> Any:
+    """Returns the validated cached response for key, or _MISS.
+
+    A cached response that fails validation is dropped, so the caller asks
+    the LLM again instead of getting the same bad answer on every retry.
+    """
+    parsed = []
+    cached = cache.get(key, None if validate is None else lambda text: parsed.append(validate(text)))
+    if cached is None:
+        return _MISS
+    record_llm_call(cached=True)
+    return parsed[0] if validate is not None else cached
+
+def _validated(cache: Any, key: str, text: str, validate: Optional[Callable[[str], Any]]) -> Any:
+    """Validates a fresh response and caches it only if validation passed."""
+    value = validate(text) if validate is not None else text
+    if cache is not None:
+        cache.put(key, text)
+    return value
 
 # Learn more about calling the LLM: https://the-pocket.github.io/PocketFlow/utility_function/llm.html
-def call_llm(prompt):    
-    client = OpenAI(
-        base_url="https://openrouter.ai/api/v1",
-        api_key="sk-or-v1-86dcaxxxxx",
-    )
-    r = client.chat.completions.create(
-        model="meta-llama/llama-3.3-8b-instruct:free",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return r.choices[0].message.content
-    
+def call_llm(
+    prompt: Prompt,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    validate: Optional[Callable[[str], Any]] = None
+):
+    """Calls the chat completion API with a prompt or a list of chat messages.
+
+    At most LLM_MAX_CONCURRENCY calls are in flight at once across the
+    process; further callers block until a slot frees up. When the response
+    cache is enabled (see utils.llm_cache) and use_cache is True, identical
+    requests are answered from the cache.
+
+    Token usage is added to the current trace span (see utils.tracing).
+
+    Args:
+        validate: Parses or checks the response and returns what call_llm
+            should return; responses it raises on are not cached
+    """
+    model = model or LLM_MODEL
+    cache = get_llm_cache() if use_cache else None
+    key = cache_key(model, prompt, base_url=base_url or LLM_BASE_URL) if cache is not None else ""
+    if cache is not None:
+        cached = _cache_get(cache, key, validate)
+        if cached is not _MISS:
+            return cached
+
+    client = get_client(base_url, api_key, timeout)
+    with _call_slots:
+        r = client.chat.completions.create(
+            model=model,
+            messages=_messages(prompt)
+        )
+    content = r.choices[0].message.content
+    if r.usage is not None:
+        record_llm_call(r.usage.prompt_tokens, r.usage.completion_tokens)
+    else:
+        record_llm_call(_estimate_tokens(_prompt_text(prompt)), _estimate_tokens(content or ""), estimated=True)
+
+    if content is None:
+        return validate(content) if validate is not None else content
+    return _validated(cache, key, content, validate)
+
+def stream_llm(
+    prompt: Prompt,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    timeout: Optional[float] = None
+) -> Iterator[str]:
+    """Streams a chat completion, yielding content deltas as they arrive.
+
+    Closing the generator early closes the HTTP stream, which cancels the
+    rest of the generation. The usage report only comes at the end of a
+    stream, so the tokens of a cancelled stream are recorded as estimates.
+    """
+    client = get_client(base_url, api_key, timeout)
+    usage = None
+    chars = 0
+    with _call_slots:
+        stream = client.chat.completions.create(
+            model=model or LLM_MODEL,
+            messages=_messages(prompt),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chars += len(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()
+            if usage is not None:
+                record_llm_call(usage.prompt_tokens, usage.completion_tokens)
+            else:
+                record_llm_call(_estimate_tokens(_prompt_text(prompt)), chars // CHARS_PER_TOKEN + 1, estimated=True)
+
+def call_llm_yaml(
+    prompt: Prompt,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    require_fence: bool = True,
+    validate: Optional[Callable[[str], Any]] = None
+) -> Any:
+    """Returns the first ```yaml block of a completion, as soon as it is complete.
+
+    The completion is streamed and cancelled once the closing fence arrives,
+    so text after the block is never generated.
+
+    Args:
+        require_fence: If False, a response without a ```yaml block is
+            returned whole instead of raising
+        validate: Parses or checks the YAML text and returns what
+            call_llm_yaml should return; blocks it raises on are not cached
+
+    Raises:
+        ValueError: If the response contains no ```yaml block
+    """
+    model = model or LLM_MODEL
+    cache = get_llm_cache() if use_cache else None
+    params = {"extract": "yaml"} if require_fence else {"extract": "yaml", "require_fence": False}
+    key = cache_key(model, prompt, params, base_url=base_url or LLM_BASE_URL) if cache is not None else ""
+    if cache is not None:
+        cached = _cache_get(cache, key, validate)
+        if cached is not _MISS:
+            return cached
+
+    yaml_str = extract_yaml_block(stream_llm(prompt, model, base_url, api_key, timeout), require_fence)
+    return _validated(cache, key, yaml_str, validate)
+
+def call_llm_json(
+    prompt: Prompt,
+    tools: Optional[List[Dict[str, Any]]] = None,
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    timeout: Optional[float] = None,
+    use_cache: bool = True,
+    validate: Optional[Callable[[str], Any]] = None
+) -> Any:
+    """Asks for structured output and returns it as JSON text.
+
+    Without tools, the completion is requested in JSON mode and its content
+    is returned. With tools (OpenAI function definitions), the model must
+    call one of them, and the call is returned as
+    {"name": ..., "arguments": "<JSON arguments>"}.
+
+    Args:
+        validate: Parses or checks the JSON text and returns what
+            call_llm_json should return; answers it raises on are not cached
+    """
+    model = model or LLM_MODEL
+    cache = get_llm_cache() if use_cache else None
+    key = cache_key(model, prompt, {"extract": "json", "tools": tools}, base_url=base_url or LLM_BASE_URL) if cache is not None else ""
+    if cache is not None:
+        cached = _cache_get(cache, key, validate)
+        if cached is not _MISS:
+            return cached
+
+    options: Dict[str, Any] = {"tools": tools, "tool_choice": "required"} if tools else {"response_format": {"type": "json_object"}}
+    client = get_client(base_url, api_key, timeout)
+    with _call_slots:
+        r = client.chat.completions.create(
+            model=model,
+            messages=_messages(prompt),
+            **options
+        )
+    message = r.choices[0].message
+    if tools:
+        if not message.tool_calls:
+            raise ValueError("LLM response contains no tool call")
+        call = message.tool_calls[0].function
+        text = json.dumps({"name": call.name, "arguments": call.arguments})
+    else:
+        text = message.content or ""
+    if r.usage is not None:
+        record_llm_call(r.usage.prompt_tokens, r.usage.completion_tokens)
+    else:
+        record_llm_call(_estimate_tokens(_prompt_text(prompt)), _estimate_tokens(text), estimated=True)
+
+    return _validated(cache, key, text, validate)
+
+def _benchmark(calls: int = 200) -> None:
+    """Measures per-call client overhead against a local stub server."""
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    body = json.dumps({
+        "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": "pong"}}],
+    }).encode("utf-8")
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Allow keep-alive
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    try:
+        # Before: a brand-new client (and connection) per call
+        start = time.perf_counter()
+        for _ in range(calls):
+            client = OpenAI(base_url=base_url, api_key="stub")
+            client.chat.completions.create(model="stub", messages=[{"role": "user", "content": "ping"}])
+            client.close()
+        fresh = (time.perf_counter() - start) / calls
+
+        # After: the pooled client
+        call_llm("ping", base_url=base_url, api_key="stub", use_cache=False)  # Warm up
+        start = time.perf_counter()
+        for _ in range(calls):
+            call_llm("ping", base_url=base_url, api_key="stub", use_cache=False)
+        pooled = (time.perf_counter() - start) / calls
+    finally:
+        server.shutdown()
+        close_clients()
+
+    print(f"fresh client per call: {fresh * 1000:.2f} ms/call")
+    print(f"pooled client:         {pooled * 1000:.2f} ms/call")
+
 if __name__ == "__main__":
-    prompt = "What is the meaning of life?"
-    print(call_llm(prompt))
+    import sys
+
+    if "--benchmark" in sys.argv:
+        _benchmark()
+    else:
+        prompt = "What is the meaning of life?"
+        print(call_llm(prompt))
@@ -0,0 +1,309 @@
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.logging_utils import get_logger
+
+logger = get_logger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+def node_ids(start: Any, flow: Any = None) -> Dict[str, Any]:
+    """Names every node reachable from a start node, in a stable order.
+
+    Nodes are visited breadth-first, following actions in sorted order, and
+    named "<position>:<class name>". Building the same graph again yields the
+    same names, which is what lets a checkpoint point at a node.
+
+    Args:
+        start: The flow's start node
+        flow: The flow, whose own transitions are followed as well
+
+    Returns:
+        dict: Name -> node
+    """
+    transitions = getattr(flow, "transitions", {})
+    ids: Dict[str, Any] = {}
+    seen = set()
+    queue = [start]
+    while queue:
+        node = queue.pop(0)
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        ids[f"{len(ids)}:{node.__class__.__name__}"] = node
+        successors = dict(node.successors)
+        successors.update({action: to for (source, action), to in transitions.items() if source is node})
+        queue.extend(successors[action] for action in sorted(successors))
+    return ids
+
+def _encode(value: Any) -> Any:
+    # Records such as utils.history.HistoryEntry provide to_dict()
+    to_dict = getattr(value, "to_dict", None)
+    return to_dict() if to_dict is not None else str(value)
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, default=_encode, ensure_ascii=False, separators=(",", ":"))
+
+# A written list item: the item, its top-level values if it is a dict (or
+# its revision if it is a record that counts its changes), and the hash of
+# its JSON text. Holding the references keeps their ids unique.
+Seen = Tuple[Any, Any, int]
+
+def _seen(item: Any) -> Seen:
+    if isinstance(item, dict):
+        fields = tuple(item.items())
+    else:
+        fields = getattr(item, "revision", None)
+    return item, fields, hash(_dump(item))
+
+def _unchanged(seen: Seen, item: Any) -> bool:
+    """Tells, without serializing it, whether an item is as written.
+
+    That is the case when it is the same dict holding the same objects
+    under the same keys, or the same record at the same revision.
+    """
+    old, fields, _ = seen
+    if old is not item or fields is None:
+        return False
+    if not isinstance(item, dict):
+        return fields == item.revision
+    if len(fields) != len(item):
+        return False
+    return all(k == k2 and v is v2 for (k, v), (k2, v2) in zip(fields, item.items()))
+
+class CheckpointLog:
+    """Append-only JSON Lines log of a flow's shared store.
+
+    The first line is a header naming the flow's nodes. Every transition
+    then appends one line with the node to run next and what changed in the
+    shared store since the previous line:
+
+    - "set": top-level keys whose value changed, with the new value
+    - "del": top-level keys that were removed
+    - "lists": for list values, the new length and only the items that
+      were added or changed, so a growing history costs one entry per step
+
+    Changes are found by comparing a hash of each value's (or list item's)
+    JSON text with the one last written, so nothing is rewritten. A dict
+    item that is the same object holding the same top-level values is not
+    even serialized again; like HistoryWindow, this relies on nodes
+    assigning new values (e.g. a history entry's "result") instead of
+    changing nested ones in place. Records with a ``revision`` counter and
+    ``to_dict()`` (the entries of utils.history.History) are compared by
+    revision and written as dicts. Other values that are not JSON
+    serializable are stored as their str().
+
+    Replaying the lines rebuilds the store and the node at which the run
+    stopped. A torn last line from a crash is ignored, and cut off when the
+    log is continued.
+    """
+
+    def __init__(self, path: str, fsync: bool = False):
+        """Initialize a checkpoint log.
+
+        Args:
+            path: JSONL file to write to (and resume from)
+            fsync: Whether to fsync after every line, for durability across
+                machine crashes rather than only process crashes
+        """
+        self.path = path
+        self.fsync = fsync
+        self.bytes_written = 0
+        self._file = None
+        self._complete_size = 0  # Bytes up to the last complete line, set by load()
+        self._values: Dict[str, int] = {}  # key -> hash of its JSON text
+        self._items: Dict[str, List[Seen]] = {}  # list key -> what was written of its items
+        self._lock = threading.Lock()
+
+    def load(self) -> Optional[Tuple[Dict[str, Any], Optional[str], Optional[str], List[str]]]:
+        """Replays the log.
+
+        Returns:
+            tuple or None: (shared store, name of the node to run next or None
+            if the flow finished, last action, node names of the header), or
+            None if there is no usable checkpoint
+        """
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._complete_size = data.rfind(b"\n") + 1
+        lines = data.decode("utf-8", errors="replace").splitlines()
+        if not lines:
+            return None
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None
+        if header.get("checkpoint") != CHECKPOINT_VERSION:
+            return None
+
+        shared: Dict[str, Any] = {}
+        node, action, replayed = None, None, 0
+        for number, line in enumerate(lines[1:], 2):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                if number == len(lines):
+                    logger.warning("Ignoring torn last line of checkpoint %s", self.path)
+                    break
+                raise ValueError(f"Corrupt checkpoint {self.path} at line {number}")
+            shared.update(record.get("set", {}))
+            for key in record.get("del", []):
+                shared.pop(key, None)
+            for key, change in record.get("lists", {}).items():
+                items = shared.get(key)
+                if not isinstance(items, list):
+                    items = shared[key] = []
+                del items[change["len"]:]
+                items.extend([None] * (change["len"] - len(items)))
+                for index, item in change["items"].items():
+                    items[int(index)] = item
+            node, action = record.get("node"), record.get("action")
+            replayed += 1
+        if not replayed:
+            return None
+
+        with self._lock:
+            self._remember(shared)
+        return shared, node, action, header.get("nodes", [])
+
+    def has_session(self) -> bool:
+        """Returns True if the log holds a session that load() can resume."""
+        try:
+            with open(self.path, "rb") as f:
+                header, first = f.readline(), f.readline()
+            if json.loads(header).get("checkpoint") != CHECKPOINT_VERSION:
+                return False
+            json.loads(first)
+        except (OSError, ValueError, AttributeError):
+            return False
+        return True
+
+    def _remember(self, shared: Dict[str, Any]) -> None:
+        """Takes the store as written, so the next record only holds changes."""
+        self._values.clear()
+        self._items.clear()
+        for key, value in shared.items():
+            if isinstance(value, list):
+                self._items[key] = [_seen(item) for item in value]
+            else:
+                self._values[key] = hash(_dump(value))
+
+    def open(self, nodes: List[str], append: bool = False) -> None:
+        """Opens the log for writing.
+
+        Args:
+            nodes: Names of the flow's nodes (see node_ids()), for the header
+            append: Continue a loaded log instead of starting a new one
+        """
+        with self._lock:
+            if append:
+                self._file = open(self.path, "a", encoding="utf-8")
+                self._file.truncate(self._complete_size)
+                return
+            self._values.clear()
+            self._items.clear()
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._write({"checkpoint": CHECKPOINT_VERSION, "nodes": nodes})
+
+    def record(self, shared: Dict[str, Any], node: Optional[str], action: Optional[str]) -> None:
+        """Appends the changes of the shared store and the node to run next.
+
+        Args:
+            shared: The shared store
+            node: Name of the node that runs next, None when the flow ended
+            action: The action that led there
+        """
+        record: Dict[str, Any] = {"node": node, "action": action}
+        with self._lock:
+            changed: Dict[str, Any] = {}
+            lists: Dict[str, Any] = {}
+            for key, value in shared.items():
+                if isinstance(value, list):
+                    old = self._items.get(key)
+                    if old is None:
+                        self._values.pop(key, None)
+                        old = self._items[key] = []
+                    items = {}
+                    for index, item in enumerate(value):
+                        if index < len(old) and _unchanged(old[index], item):
+                            continue
+                        seen = _seen(item)
+                        if index >= len(old):
+                            old.append(seen)
+                        elif old[index][2] == seen[2]:
+                            old[index] = seen
+                            continue
+                        else:
+                            old[index] = seen
+                        items[str(index)] = item
+                    if items or len(value) != len(old):
+                        del old[len(value):]
+                        lists[key] = {"len": len(value), "items": items}
+                else:
+                    text = _dump(value)
+                    self._items.pop(key, None)
+                    if self._values.get(key) != hash(text):
+                        self._values[key] = hash(text)
+                        changed[key] = value
+            removed = [key for key in list(self._values) + list(self._items) if key not in shared]
+            for key in removed:
+                self._values.pop(key, None)
+                self._items.pop(key, None)
+            if changed:
+                record["set"] = changed
+            if removed:
+                record["del"] = removed
+            if lists:
+                record["lists"] = lists
+            self._write(record)
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        line = _dump(record) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.bytes_written += len(line.encode("utf-8"))
+
+    def close(self) -> None:
+        """Closes the log file."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def _benchmark(steps: int = 100) -> None:
+    """Compares checkpoint bytes written against rewriting the store every step."""
+    import tempfile
+    import time
+
+    path = os.path.join(tempfile.mkdtemp(), "session.jsonl")
+    log = CheckpointLog(path)
+    log.open(["0:Agent"])
+    shared = {"user_query": "refactor the parser", "working_dir": "/src", "history": []}
+    full_bytes = 0
+    start = time.perf_counter()
+    for step in range(steps):
+        shared["history"].append({"tool": "read_file", "reason": "inspect", "params": {"target_file": f"m{step}.py"}})
+        log.record(shared, "1:ReadFileNode", "read_file")
+        shared["history"][-1]["result"] = {"success": True, "content": "line of code\n" * 500}
+        log.record(shared, "0:Agent", "decide_next")
+        full_bytes += 2 * len(_dump(shared))
+    elapsed = time.perf_counter() - start
+    log.close()
+
+    restored, node, _, _ = CheckpointLog(path).load()
+    assert restored == shared and node == "0:Agent"
+    print(f"{steps} steps: {log.bytes_written / 1024:.0f} KB appended vs {full_bytes / 1024:.0f} KB for full rewrites")
+    print(f"checkpoint cost: {elapsed / (2 * steps) * 1000:.2f} ms per transition")
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        _benchmark()
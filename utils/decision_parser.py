@@ -0,0 +1,375 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import yaml
+
+# JSON schemas of the agent's tools. They validate decisions and are sent as
+# function definitions when the LLM is asked for a tool call.
+TOOL_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "read_file": {
+        "description": "Read a file, or a range of its lines",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "target_file": {"type": "string"},
+                "start_line": {"type": "integer"},
+                "end_line": {"type": "integer"},
+                "explanation": {"type": "string"}
+            },
+            "required": ["target_file"]
+        }
+    },
+    "edit_file": {
+        "description": "Edit a file",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "target_file": {"type": "string"},
+                "instructions": {"type": "string"},
+                "code_edit": {"type": "string"}
+            },
+            "required": ["target_file", "instructions", "code_edit"]
+        }
+    },
+    "delete_file": {
+        "description": "Delete a file",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "target_file": {"type": "string"},
+                "explanation": {"type": "string"}
+            },
+            "required": ["target_file"]
+        }
+    },
+    "grep_search": {
+        "description": "Search files for a regex",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string"},
+                "case_sensitive": {"type": "boolean"},
+                "include_pattern": {"type": "string"},
+                "exclude_pattern": {"type": "string"},
+                "explanation": {"type": "string"}
+            },
+            "required": ["query"]
+        }
+    },
+    "find_symbol": {
+        "description": "Find where a class, function, method or variable is defined and used",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "name": {"type": "string"},
+                "kind": {"type": "string", "enum": ["class", "function", "method", "variable", "type", "macro"]},
+                "include_references": {"type": "boolean"},
+                "explanation": {"type": "string"}
+            },
+            "required": ["name"]
+        }
+    },
+    "list_dir": {
+        "description": "List a directory as a tree",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "relative_workspace_path": {"type": "string"},
+                "max_depth": {"type": "integer"},
+                "max_entries": {"type": "integer"},
+                "exclude": {"type": "array", "items": {"type": "string"}},
+                "explanation": {"type": "string"}
+            },
+            "required": ["relative_workspace_path"]
+        }
+    },
+    "batch": {
+        "description": "Run independent read-only tool calls (read_file, grep_search, find_symbol, list_dir) in parallel",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "calls": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {"tool": {"type": "string"}, "params": {"type": "object"}},
+                        "required": ["tool", "params"]
+                    }
+                }
+            },
+            "required": ["calls"]
+        }
+    },
+    "finish": {
+        "description": "Return the final response to the user",
+        "parameters": {"type": "object", "properties": {}}
+    }
+}
+
+_FENCE = re.compile(r"```[ \t]*([A-Za-z]*)[ \t]*\n(.*?)(?:```|\Z)", re.DOTALL)
+_TOP_LEVEL_LINE = re.compile(r"^(thinking|tool|reason|params)[ \t]*:[ \t]?(.*)$")
+_KEY_VALUE_LINE = re.compile(r"^([ \t-]*)([A-Za-z_][\w-]*)[ \t]*:[ \t]+(.+)$")
+
+class DecisionError(ValueError):
+    """The LLM's answer could not be turned into a valid decision."""
+
+def tool_definitions(tools: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Returns OpenAI-style function definitions for the agent's tools.
+
+    Each function takes the tool's params plus a required "reason".
+    """
+    definitions = []
+    for name in tools or list(TOOL_SCHEMAS):
+        schema = TOOL_SCHEMAS[name]
+        parameters = json.loads(json.dumps(schema["parameters"]))
+        parameters["properties"]["reason"] = {"type": "string", "description": "One-line explanation"}
+        parameters["required"] = ["reason"] + parameters.get("required", [])
+        definitions.append({
+            "type": "function",
+            "function": {"name": name, "description": schema["description"], "parameters": parameters}
+        })
+    return definitions
+
+def _coerce(value: Any, schema: Dict[str, Any], path: str) -> Any:
+    """Checks a value against a (small subset of) JSON schema, fixing near misses.
+
+    Numbers and booleans given as strings are converted, and a single string
+    is accepted where a list of strings is expected.
+    """
+    expected = schema.get("type")
+    if expected == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        if not isinstance(value, str):
+            raise DecisionError(f"{path} must be a string")
+    elif expected == "integer":
+        if isinstance(value, str) and re.fullmatch(r"\s*-?\d+\s*", value):
+            return int(value)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise DecisionError(f"{path} must be an integer")
+    elif expected == "boolean":
+        if isinstance(value, str) and value.strip().lower() in ("true", "false", "yes", "no"):
+            return value.strip().lower() in ("true", "yes")
+        if not isinstance(value, bool):
+            raise DecisionError(f"{path} must be a boolean")
+    elif expected == "array":
+        if isinstance(value, str) and schema.get("items", {}).get("type") == "string":
+            value = [value]
+        if not isinstance(value, list):
+            raise DecisionError(f"{path} must be a list")
+        return [_coerce(item, schema.get("items", {}), f"{path}[{i}]") for i, item in enumerate(value)]
+    elif expected == "object":
+        if not isinstance(value, dict):
+            raise DecisionError(f"{path} must be a mapping")
+        value = dict(value)
+        for key in schema.get("required", []):
+            if value.get(key) is None:
+                raise DecisionError(f"{path} is missing {key!r}")
+        for key, prop in schema.get("properties", {}).items():
+            if value.get(key) is not None:
+                value[key] = _coerce(value[key], prop, f"{path}.{key}")
+    return value
+
+def validate_decision(decision: Any, batchable: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """Validates a decision and normalizes its params against the tool schemas.
+
+    Args:
+        decision: Parsed decision, expected to be a mapping with tool,
+            reason and params
+        batchable: Tools allowed inside a batch (any tool when omitted)
+
+    Returns:
+        dict: The decision with coerced params (reason defaults to "")
+
+    Raises:
+        DecisionError: If the decision does not fit the schemas
+    """
+    if not isinstance(decision, dict):
+        raise DecisionError("Decision must be a mapping")
+    tool = decision.get("tool")
+    if not tool:
+        raise DecisionError("Tool name missing")
+    tool = str(tool).strip()
+    if tool not in TOOL_SCHEMAS:
+        raise DecisionError(f"Invalid tool: {tool}")
+    params = decision.get("params")
+    if params is None:
+        params = {}
+    params = _coerce(params, TOOL_SCHEMAS[tool]["parameters"], "params")
+
+    if tool == "batch":
+        if not params["calls"]:
+            raise DecisionError("Batch calls must be a non-empty list")
+        calls = []
+        for i, call in enumerate(params["calls"]):
+            name = call["tool"]
+            if name not in TOOL_SCHEMAS or (batchable is not None and name not in batchable):
+                raise DecisionError(f"Tool cannot be batched: {name}")
+            calls.append({"tool": name,
+                          "params": _coerce(call["params"], TOOL_SCHEMAS[name]["parameters"], f"params.calls[{i}].params")})
+        params["calls"] = calls
+
+    result = dict(decision)
+    result.update(tool=tool, reason=str(decision.get("reason") or "").strip(), params=params)
+    return result
+
+def _strip_fence(text: str) -> Tuple[str, str]:
+    """Returns (language, body) of the first fenced block, or ("", text) if there is none."""
+    match = _FENCE.search(text)
+    if match is None:
+        return "", text.strip()
+    return match.group(1).lower(), match.group(2).strip()
+
+def _json_object(text: str) -> Optional[Any]:
+    """Parses text as JSON if it looks like an object, else returns None."""
+    start = text.find("{")
+    if start < 0 or text[:start].strip():
+        return None
+    try:
+        return json.loads(text[start:text.rindex("}") + 1])
+    except ValueError:
+        return None
+
+def _quote_values(block: str) -> str:
+    """Quotes the plain "key: value" scalars of a YAML block.
+
+    YAML misreads plain values containing ": " or " #" (or starting with
+    "#"); quoting them keeps the text as written. Numbers, booleans, flow
+    collections and the contents of block scalars (| and >) are left alone.
+    """
+    lines = []
+    scalar_indent = None  # Indentation of the key that opened a block scalar
+    for line in block.splitlines():
+        indent = len(line) - len(line.lstrip())
+        if scalar_indent is not None:
+            if not line.strip() or indent > scalar_indent:
+                lines.append(line)
+                continue
+            scalar_indent = None
+        match = _KEY_VALUE_LINE.match(line)
+        if match is None:
+            lines.append(line)
+            continue
+        prefix, key, value = match.groups()
+        value = value.rstrip()
+        if value[0] in "|>":
+            scalar_indent = indent
+            lines.append(line)
+        elif value[0] in "\"'[{" or value in ("true", "false", "null") or re.fullmatch(r"-?\d+(\.\d+)?", value):
+            lines.append(line)
+        else:
+            lines.append(f"{prefix}{key}: {json.dumps(value)}")
+    return "\n".join(lines)
+
+def repair_yaml(text: str) -> Dict[str, Any]:
+    """Tolerant parser for near-miss YAML decisions.
+
+    Handles the usual mistakes: tabs for indentation, a thinking section
+    without a block scalar, unquoted values containing ": " or "#", and
+    stray text around the keys. The top-level keys are found by line, so
+    only the params block has to be valid YAML once its values are quoted.
+
+    Raises:
+        DecisionError: If no tool can be found
+    """
+    sections: Dict[str, List[str]] = {}
+    current = None
+    for line in text.expandtabs(4).splitlines():
+        match = _TOP_LEVEL_LINE.match(line)
+        if match:
+            current = match.group(1)
+            sections[current] = [match.group(2)]
+        elif current is not None:
+            sections[current].append(line)
+
+    if "tool" not in sections:
+        raise DecisionError("Tool name missing")
+
+    def scalar(key):
+        lines = [line.strip() for line in sections.get(key, []) if line.strip()]
+        value = " ".join(lines)
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+            value = value[1:-1]
+        return value.lstrip("|>").strip()
+
+    decision: Dict[str, Any] = {"tool": scalar("tool"), "reason": scalar("reason")}
+    if "thinking" in sections:
+        decision["thinking"] = "\n".join(sections["thinking"]).strip().lstrip("|>").strip()
+
+    params_lines = sections.get("params", [])
+    inline = params_lines[0].strip() if params_lines else ""
+    block = "\n".join(params_lines[1:])
+    if inline and inline not in ("|", ">"):
+        block = inline
+    params = None
+    for candidate in (_quote_values(block), block):
+        try:
+            params = yaml.safe_load(candidate) if candidate.strip() else {}
+            break
+        except yaml.YAMLError:
+            continue
+    if params is None:
+        raise DecisionError("Could not parse params")
+    decision["params"] = params
+    return decision
+
+def parse_decision(text: str, batchable: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """Turns an LLM answer (JSON or YAML, fenced or not) into a validated decision.
+
+    JSON is tried first, then strict YAML, then the tolerant repair parser.
+
+    Raises:
+        DecisionError: If no valid decision can be recovered
+    """
+    language, body = _strip_fence(text)
+    decision = _json_object(body) if language in ("", "json") else None
+    if decision is not None:
+        return validate_decision(decision, batchable)
+
+    error = None
+    try:
+        decision = yaml.safe_load(body)
+    except yaml.YAMLError:
+        decision = None
+    if isinstance(decision, dict) and "tool" in decision:
+        try:
+            return validate_decision(decision, batchable)
+        except DecisionError as e:
+            error = e  # Maybe misparsed, e.g. an unquoted ": " inside a value
+
+    try:
+        return validate_decision(repair_yaml(body), batchable)
+    except DecisionError:
+        if error is not None:
+            raise error
+        raise
+
+def parse_tool_call(name: str, arguments: str, batchable: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """Turns a function call (name and JSON arguments) into a validated decision.
+
+    Raises:
+        DecisionError: If the arguments are not a JSON object or do not validate
+    """
+    try:
+        args = json.loads(arguments or "{}")
+    except ValueError:
+        raise DecisionError(f"Tool call arguments are not valid JSON: {arguments[:200]!r}")
+    if not isinstance(args, dict):
+        raise DecisionError("Tool call arguments must be a JSON object")
+    reason = args.pop("reason", "")
+    thinking = args.pop("thinking", None)
+    decision = {"tool": name, "reason": reason, "params": args}
+    if thinking is not None:
+        decision["thinking"] = thinking
+    return validate_decision(decision, batchable)
+
+if __name__ == "__main__":
+    # Example usage
+    samples = [
+        '{"tool": "read_file", "reason": "look", "params": {"target_file": "main.py", "start_line": "10"}}',
+        "```yaml\ntool: grep_search\nreason: find it\nparams:\n  query: def main\n```",
+        "```yaml\nthinking: first: look around\ntool: list_dir\nreason: Explore: the repo\nparams:\n\trelative_workspace_path: .\n\tmax_depth: 2\n```",
+        "tool: finish\nreason: done",
+    ]
+    for sample in samples:
+        print(parse_decision(sample))
@@ -1,11 +1,111 @@
 import os
-from typing import Tuple
+from typing import Iterator, List, Optional, Tuple
+from utils.gitignore import IgnoreRules, load_ignore_rules
+from utils.workspace import Workspace
 
-def list_dir(relative_workspace_path: str) -> Tuple[bool, str]:
+def _list_entries(path: str, workspace: Optional[Workspace]) -> List[Tuple[str, bool, bool]]:
+    """Returns (name, is_dir, is_symlink) for a directory's entries, sorted by name.
+    
+    Directories covered by the workspace snapshot are listed from memory.
+    
+    Raises:
+        OSError: If the directory cannot be read
+    """
+    if workspace is not None:
+        rel_dir = workspace.relpath(path)
+        children = workspace.list_children(rel_dir) if rel_dir is not None else None
+        if children is not None:
+            return [(name, info.is_dir, info.is_symlink) for name, info in children]
+    
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+                is_symlink = entry.is_symlink()
+            except OSError:
+                is_dir = is_symlink = False
+            entries.append((entry.name, is_dir, is_symlink))
+    entries.sort()
+    return entries
+
+def _iter_tree(
+    path: str,
+    prefix: str,
+    depth: int,
+    max_depth: Optional[int],
+    rules: IgnoreRules,
+    budget: List[int],
+    workspace: Optional[Workspace] = None
+) -> Iterator[str]:
+    """Lazily yields the tree lines below a directory.
+    
+    budget holds the number of entries that may still be shown. Once it runs
+    out, each directory level being listed ends with an "… N more" line and no
+    further directories are read.
+    """
+    try:
+        entries = _list_entries(path, workspace)
+    except OSError as e:
+        yield f"{prefix}└── [error: {e.strerror}]"
+        return
+    
+    # A directory's own .gitignore applies to everything below it
+    if any(name == ".gitignore" for name, _, _ in entries):
+        rules = rules.with_file(os.path.join(path, ".gitignore"))
+    
+    visible = []
+    for name, is_dir, is_symlink in entries:
+        # Skip hidden files
+        if name.startswith('.'):
+            continue
+        if rules.rules and rules.is_ignored(os.path.join(path, name), is_dir):
+            continue
+        visible.append((name, is_dir, is_symlink))
+    
+    for i, (name, is_dir, is_symlink) in enumerate(visible):
+        if budget[0] <= 0:
+            yield f"{prefix}└── … {len(visible) - i} more"
+            return
+        budget[0] -= 1
+        
+        # Is this the last entry?
+        is_last = i == len(visible) - 1
+        connector, child_prefix = ("└── ", "    ") if is_last else ("├── ", "│   ")
+        
+        if not is_dir:
+            yield f"{prefix}{connector}{name}"
+        elif max_depth is not None and depth >= max_depth:
+            yield f"{prefix}{connector}{name}/ …"
+        else:
+            yield f"{prefix}{connector}{name}"
+            # Don't follow symlinked directories (they may loop)
+            if not is_symlink:
+                yield from _iter_tree(os.path.join(path, name), prefix + child_prefix, depth + 1,
+                                      max_depth, rules, budget, workspace)
+
+def list_dir(
+    relative_workspace_path: str,
+    max_depth: Optional[int] = None,
+    max_entries: Optional[int] = None,
+    exclude: Optional[List[str]] = None,
+    respect_gitignore: bool = True,
+    workspace: Optional[Workspace] = None
+) -> Tuple[bool, str]:
     """Lists contents of a directory with a tree visualization.
     
     Args:
         relative_workspace_path (str): Path to list contents of
+        max_depth (int, optional): Deepest directory level to expand (1 lists
+            only the directory itself); deeper directories are shown as "name/ …"
+        max_entries (int, optional): Maximum number of entries to show; the
+            rest is elided with "… N more" lines and never read from disk
+        exclude (list, optional): Extra gitignore-style globs to leave out
+        respect_gitignore (bool, optional): Whether to skip paths ignored by
+            the applicable .gitignore files
+        workspace (Workspace, optional): Snapshot to list directories from
+            instead of reading them from disk (directories outside it are
+            still read from disk)
         
     Returns:
         tuple: (success status, tree visualization string)
@@ -20,44 +120,17 @@ def list_dir(relative_workspace_path: str) -> Tuple[bool, str]:
         if not os.path.isdir(abs_path):
             return False, f"Path is not a directory: {relative_workspace_path}"
         
-        # Initialize tree string
-        tree = []
-        
-        def add_to_tree(path: str, prefix: str = ""):
-            # List directory contents
-            entries = os.listdir(path)
-            entries.sort()
-            
-            # Process each entry
-            for i, entry in enumerate(entries):
-                # Skip hidden files
-                if entry.startswith('.'):
-                    continue
-                    
-                # Full path
-                full_path = os.path.join(path, entry)
-                
-                # Is this the last entry?
-                is_last = i == len(entries) - 1
-                
-                # Add to tree
-                if is_last:
-                    tree.append(f"{prefix}└── {entry}")
-                    new_prefix = prefix + "    "
-                else:
-                    tree.append(f"{prefix}├── {entry}")
-                    new_prefix = prefix + "│   "
-                
-                # Recurse into directories
-                if os.path.isdir(full_path):
-                    add_to_tree(full_path, new_prefix)
+        rules = load_ignore_rules(abs_path) if respect_gitignore else IgnoreRules()
+        if exclude:
+            rules = rules.with_patterns(abs_path, exclude)
         
         # Start with the root directory name
         root_name = os.path.basename(abs_path.rstrip('/\\'))
-        tree.append(root_name)
+        tree = [root_name]
         
         # Build the tree
-        add_to_tree(abs_path)
+        budget = [max_entries if max_entries is not None else float('inf')]
+        tree.extend(_iter_tree(abs_path, "", 1, max_depth, rules, budget, workspace))
         
         return True, '\n'.join(tree)
         
@@ -66,8 +139,8 @@ def list_dir(relative_workspace_path: str) -> Tuple[bool, str]:
 
 if __name__ == "__main__":
     # Example usage
-    success, tree = list_dir(".")
+    success, tree = list_dir(".", max_depth=2, max_entries=50)
     if success:
         print(tree)
     else:
-        print(f"Error: {tree}") 
\ No newline at end of file
+        print(f"Error: {tree}")
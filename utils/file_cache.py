@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64 MB of file contents
+
+class FileCache:
+    """Process-wide cache of text file contents.
+
+    Entries are validated against the file's (mtime, size) on every read, kept
+    in LRU order within a memory budget, and dropped explicitly by the write
+    helpers in utils/file_ops.py.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._bytes = 0
+        # abs path -> (mtime_ns, size, content)
+        self._entries: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read_text(self, path: str) -> str:
+        """Returns a file's content as UTF-8 text, from memory when unchanged.
+
+        Raises:
+            OSError: If the file cannot be read
+            UnicodeDecodeError: If the file is not valid UTF-8
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                self.bytes_saved += st.st_size
+                return entry[2]
+            self.misses += 1
+
+        return self._load(path, st)
+
+    def _load(self, path: str, st: os.stat_result) -> str:
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        with self._lock:
+            self._drop(path)
+            if st.st_size <= self.max_bytes // 4:  # Don't let one file flush the cache
+                self._entries[path] = (st.st_mtime_ns, st.st_size, content)
+                self._bytes += st.st_size
+                while self._bytes > self.max_bytes:
+                    _, (_, size, _) = self._entries.popitem(last=False)
+                    self._bytes -= size
+        return content
+
+    def prefetch(self, path: str) -> int:
+        """Loads a file ahead of use without touching the hit/miss counters.
+
+        Returns:
+            int: Bytes read, 0 if the cached copy was still valid
+
+        Raises:
+            OSError: If the file cannot be read
+            UnicodeDecodeError: If the file is not valid UTF-8
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                return 0
+        self._load(path, st)
+        return st.st_size
+
+    def _drop(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def invalidate(self, path: str) -> None:
+        """Forgets a file, e.g. after writing or deleting it."""
+        with self._lock:
+            self._drop(os.path.abspath(path))
+
+    def clear(self) -> None:
+        """Forgets every file."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters, bytes saved and current memory use."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_saved": self.bytes_saved,
+                "entries": len(self._entries),
+                "bytes_cached": self._bytes
+            }
+
+_file_cache = FileCache()
+
+def get_file_cache() -> FileCache:
+    """Returns the process-wide file cache."""
+    return _file_cache
+
+if __name__ == "__main__":
+    # Example usage
+    import tempfile
+
+    with tempfile.NamedTemporaryFile('w', suffix=".txt", delete=False) as f:
+        f.write("hello\n")
+    cache = get_file_cache()
+    cache.read_text(f.name)
+    cache.read_text(f.name)
+    print(cache.stats())
+    os.remove(f.name)
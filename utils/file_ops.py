@@ -1,18 +1,57 @@
 import os
+import tempfile
+from utils.line_index import read_lines
+from utils.file_cache import get_file_cache
+from utils.workspace import notify_path_changed
 
-def read_file(target_file):
+def _invalidate(target_file):
+    """Drops a written or deleted file from the file cache and workspace snapshots."""
+    get_file_cache().invalidate(target_file)
+    notify_path_changed(os.path.abspath(target_file))
+
+def _atomic_write_lines(target_file, lines):
+    """Writes lines to a temp file next to target_file and renames it over.
+    
+    Readers never see a partially written file, and the original file's
+    permission bits are kept.
+    """
+    directory = os.path.dirname(os.path.abspath(target_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(target_file))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        try:
+            os.chmod(tmp_path, os.stat(target_file).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_path, target_file)
+        _invalidate(target_file)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def read_file(target_file, start_line=None, end_line=None):
     """Reads content from specified files.
     
     Args:
         target_file (str): Path to the file to read
+        start_line (int, optional): First line to read (1-indexed). When a
+            range is given, only those lines are loaded, using a cached
+            mmap-built line index. Whole-file reads go through the shared
+            file cache.
+        end_line (int, optional): Last line to read (1-indexed, inclusive)
         
     Returns:
         tuple: (file content, success status)
     """
     try:
-        with open(target_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return content, True
+        if start_line is not None or end_line is not None:
+            content, _ = read_lines(target_file, start_line or 1, end_line)
+            return content, True
+        return get_file_cache().read_text(target_file), True
     except Exception as e:
         return str(e), False
 
@@ -32,6 +71,7 @@ def insert_file(target_file, content, line_number=None):
             # Append mode
             with open(target_file, 'a', encoding='utf-8') as f:
                 f.write(content)
+            _invalidate(target_file)
         else:
             # Insert at specific line
             with open(target_file, 'r', encoding='utf-8') as f:
@@ -42,6 +82,7 @@ def insert_file(target_file, content, line_number=None):
             
             with open(target_file, 'w', encoding='utf-8') as f:
                 f.writelines(lines)
+            _invalidate(target_file)
                 
         return "Content inserted successfully", True
     except Exception as e:
@@ -71,6 +112,7 @@ def remove_file(target_file, start_line=None, end_line=None):
         
         with open(target_file, 'w', encoding='utf-8') as f:
             f.writelines(lines)
+        _invalidate(target_file)
             
         return "Content removed successfully", True
     except Exception as e:
@@ -87,6 +129,7 @@ def delete_file(target_file):
     """
     try:
         os.remove(target_file)
+        _invalidate(target_file)
         return "File deleted successfully", True
     except Exception as e:
         return str(e), False
@@ -112,12 +155,102 @@ def replace_file(target_file, start_line, end_line, new_content):
         
         with open(target_file, 'w', encoding='utf-8') as f:
             f.writelines(lines)
+        _invalidate(target_file)
             
         return "Content replaced successfully", True
     except Exception as e:
         return str(e), False
 
+def apply_edits(target_file, edits):
+    """Applies several line-range replacements to a file in a single pass.
+    
+    All line numbers refer to the file as it is before any edit is applied.
+    The file is read once, edited in memory and written back atomically, so
+    either every edit is applied or none is.
+    
+    Args:
+        target_file (str): Path to the file
+        edits (list): Dicts with start_line (1-indexed), end_line (1-indexed,
+            inclusive; start_line - 1 inserts without replacing) and
+            replacement (str)
+        
+    Returns:
+        tuple: (result message, success status)
+    """
+    try:
+        with open(target_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        
+        # Validate ranges and make sure no two edits touch the same lines
+        ordered = sorted(edits, key=lambda e: (e["start_line"], e["end_line"]))
+        previous_end = 0
+        for edit in ordered:
+            start, end = edit["start_line"], edit["end_line"]
+            if start < 1 or end < start - 1 or start > len(lines) + 1:
+                return f"Invalid line range {start}-{end} for a file with {len(lines)} lines", False
+            if start <= previous_end:
+                return f"Edit at lines {start}-{end} overlaps a previous edit ending at line {previous_end}", False
+            previous_end = max(previous_end, end)
+        
+        # Splice everything in one pass over the original lines
+        new_lines = []
+        position = 0
+        for edit in ordered:
+            new_lines.extend(lines[position:edit["start_line"] - 1])
+            new_lines.append(edit["replacement"] + '\n')
+            position = max(position, edit["end_line"])
+        new_lines.extend(lines[position:])
+        
+        _atomic_write_lines(target_file, new_lines)
+        return f"Applied {len(ordered)} edits successfully", True
+    except Exception as e:
+        return str(e), False
+
+def _benchmark(total_lines=100000, edit_count=200):
+    """Compares per-edit replace_file calls with a single apply_edits call."""
+    import shutil
+    import time
+    
+    directory = tempfile.mkdtemp()
+    try:
+        original = os.path.join(directory, "original.txt")
+        with open(original, 'w', encoding='utf-8') as f:
+            f.writelines(f"line {i} of a large generated file\n" for i in range(total_lines))
+        step = total_lines // edit_count
+        edits = [
+            {"start_line": i * step + 1, "end_line": i * step + 2, "replacement": f"edited {i}"}
+            for i in range(edit_count)
+        ]
+        size_mb = os.path.getsize(original) / 1e6
+        
+        per_edit = os.path.join(directory, "per_edit.txt")
+        shutil.copy(original, per_edit)
+        start = time.perf_counter()
+        for edit in sorted(edits, key=lambda e: e["start_line"], reverse=True):
+            replace_file(per_edit, edit["start_line"], edit["end_line"], edit["replacement"])
+        per_edit_time = time.perf_counter() - start
+        
+        batched = os.path.join(directory, "batched.txt")
+        shutil.copy(original, batched)
+        start = time.perf_counter()
+        apply_edits(batched, edits)
+        batched_time = time.perf_counter() - start
+        
+        with open(per_edit, encoding='utf-8') as a, open(batched, encoding='utf-8') as b:
+            assert a.read() == b.read()
+        print(f"{edit_count} edits on a {size_mb:.1f} MB file:")
+        print(f"  replace_file per edit: {per_edit_time:.3f}s")
+        print(f"  apply_edits batched:   {batched_time:.3f}s")
+    finally:
+        shutil.rmtree(directory)
+
 if __name__ == "__main__":
+    import sys
+    
+    if "--benchmark" in sys.argv:
+        _benchmark()
+        sys.exit()
+    
     # Example usage
     test_file = "test.txt"
     
@@ -0,0 +1,137 @@
+import os
+import re
+from typing import Iterable, List, Optional, Pattern, Tuple
+
+# (base directory, compiled pattern, negated, directory-only)
+Rule = Tuple[str, Pattern, bool, bool]
+
+def _translate(pattern: str) -> str:
+    """Translates a gitignore glob into a regex body for '/'-separated paths."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+def parse_rules(base: str, lines: Iterable[str]) -> List[Rule]:
+    """Parses gitignore-style lines into rules relative to a base directory."""
+    rules = []
+    for line in lines:
+        line = line.rstrip("\n").rstrip("\r")
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.rstrip(" ")
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but at the end anchors the pattern to the base
+        anchored = "/" in line
+        line = line.lstrip("/")
+        body = _translate(line)
+        regex = f"^{body}(?:/.*)?$" if anchored else f"^(?:.*/)?{body}(?:/.*)?$"
+        try:
+            rules.append((base, re.compile(regex), negate, dir_only))
+        except re.error:
+            continue
+    return rules
+
+class IgnoreRules:
+    """An ordered set of gitignore rules; the last matching rule wins."""
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        self.rules = rules or []
+
+    def with_file(self, gitignore_path: str) -> "IgnoreRules":
+        """Returns these rules extended by a .gitignore file (if readable)."""
+        try:
+            with open(gitignore_path, "r", encoding="utf-8", errors="replace") as f:
+                extra = parse_rules(os.path.dirname(os.path.abspath(gitignore_path)), f)
+        except OSError:
+            return self
+        return IgnoreRules(self.rules + extra) if extra else self
+
+    def with_patterns(self, base: str, patterns: Iterable[str]) -> "IgnoreRules":
+        """Returns these rules extended by gitignore-style patterns."""
+        extra = parse_rules(os.path.abspath(base), patterns)
+        return IgnoreRules(self.rules + extra) if extra else self
+
+    def is_ignored(self, path: str, is_dir: bool) -> bool:
+        """Checks an absolute path against the rules."""
+        ignored = False
+        for base, regex, negate, dir_only in self.rules:
+            if not path.startswith(base + os.sep):
+                continue
+            rel = path[len(base) + 1:].replace(os.sep, "/")
+            if dir_only and not is_dir:
+                # "dir/" only ignores a file when it sits inside a matching directory
+                if "/" not in rel or not regex.match(rel.rsplit("/", 1)[0]):
+                    continue
+            if regex.match(rel):
+                ignored = not negate
+        return ignored
+
+def load_ignore_rules(path: str) -> IgnoreRules:
+    """Collects the .gitignore files that apply to a directory.
+
+    If the directory is inside a git work tree, every .gitignore from the
+    repository root down to the directory is loaded; otherwise only the
+    directory's own .gitignore is.
+    """
+    path = os.path.abspath(path)
+    chain = [path]
+    current = path
+    while not os.path.exists(os.path.join(current, ".git")):
+        parent = os.path.dirname(current)
+        if parent == current:
+            chain = [path]  # Not in a repository
+            break
+        current = parent
+        chain.append(current)
+
+    rules = IgnoreRules()
+    for directory in reversed(chain):
+        rules = rules.with_file(os.path.join(directory, ".gitignore"))
+    return rules
+
+if __name__ == "__main__":
+    # Example usage
+    rules = IgnoreRules().with_patterns("/repo", ["node_modules/", "*.log", "!keep.log", "/build", "docs/**/*.tmp"])
+    for p, d in [("/repo/node_modules", True), ("/repo/a/node_modules/x.js", False), ("/repo/x.log", False),
+                 ("/repo/keep.log", False), ("/repo/build", True), ("/repo/src/build", True), ("/repo/docs/a/b.tmp", False)]:
+        print(p, rules.is_ignored(p, d))
@@ -0,0 +1,375 @@
+import json
+import re
+import reprlib
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+LARGE_VALUE_CHARS = 256  # Result values whose JSON is longer live in the content store
+INTERNED_PARAMS = ("target_file", "relative_workspace_path")
+ENTRY_FIELDS = ("tool", "reason", "params", "timestamp")
+
+_MARKER = "\x00blob:{}\x00"
+_MARKER_RE = re.compile(r'"\\u0000blob:(\d+)\\u0000"')
+
+class ContentStore:
+    """Deduplicated store of large history values, kept as JSON text.
+
+    A value is stored once as its JSON serialization and referred to by an
+    integer id; storing an equal value again returns the same id. Keeping
+    the JSON text (rather than the object) means the serialized history can
+    be assembled from it without escaping anything again.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._texts: List[str] = []
+        self._lock = threading.Lock()
+
+    def put(self, value: Any) -> int:
+        """Stores a JSON-serializable value and returns its id."""
+        return self.put_text(json.dumps(value, ensure_ascii=False, default=str))
+
+    def put_text(self, text: str) -> int:
+        """Stores a value given as JSON text and returns its id."""
+        with self._lock:
+            blob_id = self._ids.get(text)
+            if blob_id is None:
+                blob_id = self._ids[text] = len(self._texts)
+                self._texts.append(text)
+            return blob_id
+
+    def text(self, blob_id: int) -> str:
+        """Returns the JSON text of a stored value."""
+        return self._texts[blob_id]
+
+    def get(self, blob_id: int) -> Any:
+        """Returns a fresh copy of a stored value."""
+        return json.loads(self._texts[blob_id])
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of stored values and their total JSON size."""
+        with self._lock:
+            return {"blobs": len(self._texts), "chars": sum(len(t) for t in self._texts)}
+
+class _Blob:
+    __slots__ = ("id",)
+
+    def __init__(self, blob_id: int):
+        self.id = blob_id
+
+    def __repr__(self) -> str:
+        return f"<stored value {self.id}>"
+
+class HistoryEntry:
+    """One step of the agent's history, stored compactly.
+
+    Behaves like the dict it replaces for the operations the nodes use
+    (``entry["tool"]``, ``entry.get(...)``, ``"result" in entry``,
+    ``entry["result"] = {...}``, ``items()``). Path parameters are interned,
+    and large result values are moved to the history's ContentStore;
+    reading ``entry["result"]`` rebuilds a fresh dict.
+
+    ``revision`` grows with every assignment, so caches can tell whether
+    the entry changed. Mutating a nested dict in place (e.g.
+    ``entry["params"]["x"] = ...``) is not seen; assign a new value instead.
+    """
+
+    __slots__ = ("tool", "reason", "params", "timestamp", "revision", "_result", "_extra", "_store", "_parts")
+
+    def __init__(self, store: ContentStore, data: Optional[Dict[str, Any]] = None):
+        self._store = store
+        self.tool = None
+        self.reason = None
+        self.params = None
+        self.timestamp = None
+        self.revision = 0
+        self._result: Optional[Dict[str, Any]] = None
+        self._extra: Optional[Dict[str, Any]] = None
+        self._parts: Optional[Dict[Tuple[Optional[int], int], List[Union[str, int]]]] = None
+        for key, value in (data or {}).items():
+            self[key] = value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "result":
+            self._result = None if value is None else self._pack(value)
+        elif key == "params" and isinstance(value, dict):
+            self.params = {k: sys.intern(v) if k in INTERNED_PARAMS and isinstance(v, str) else v
+                           for k, v in value.items()}
+        elif key in ENTRY_FIELDS:
+            setattr(self, key, sys.intern(value) if key == "tool" and isinstance(value, str) else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        self.revision += 1
+        self._parts = None
+
+    def _pack(self, result: Any) -> Any:
+        """Moves the large values of a result dict to the content store."""
+        if not isinstance(result, dict):
+            return result
+        packed = {}
+        for key, value in result.items():
+            packed[key] = value
+            if isinstance(value, str):
+                if len(value) > LARGE_VALUE_CHARS:
+                    packed[key] = _Blob(self._store.put(value))
+            elif isinstance(value, (list, dict)) and value:
+                text = json.dumps(value, ensure_ascii=False, default=str)
+                if len(text) > LARGE_VALUE_CHARS:
+                    packed[key] = _Blob(self._store.put_text(text))
+        return packed
+
+    def _unpack(self, result: Any) -> Any:
+        if not isinstance(result, dict):
+            return result
+        return {k: self._store.get(v.id) if isinstance(v, _Blob) else v for k, v in result.items()}
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "result":
+            if self._result is None:
+                raise KeyError(key)
+            return self._unpack(self._result)
+        if key in ENTRY_FIELDS:
+            value = getattr(self, key)
+            if value is None:
+                raise KeyError(key)
+            return value
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __contains__(self, key: str) -> bool:
+        # Answered from the record, without rebuilding the result
+        if key == "result":
+            return self._result is not None
+        if key in ENTRY_FIELDS:
+            return getattr(self, key) is not None
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def result_field(self, key: str, default: Any = None) -> Any:
+        """Returns one value of the result dict, decoding only that value."""
+        if not isinstance(self._result, dict) or key not in self._result:
+            return default
+        value = self._result[key]
+        return self._store.get(value.id) if isinstance(value, _Blob) else value
+
+    def keys(self) -> List[str]:
+        keys = [key for key in ENTRY_FIELDS if getattr(self, key) is not None]
+        keys.extend(self._extra or ())
+        if self._result is not None:
+            keys.append("result")
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return list(self.to_dict().items())
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, HistoryEntry):
+            other = other.to_dict()
+        return isinstance(other, dict) and self.to_dict() == other
+
+    __hash__ = None  # Mutable, like the dict it stands for
+
+    def __repr__(self) -> str:
+        # Stored values are shown as references, so this stays short
+        data = {key: getattr(self, key) for key in ENTRY_FIELDS if getattr(self, key) is not None}
+        data.update(self._extra or {})
+        if self._result is not None:
+            data["result"] = self._result
+        return f"HistoryEntry({data!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the entry as a plain dict, with large values resolved."""
+        return {key: self[key] for key in self.keys()}
+
+    def _skeleton(self) -> Tuple[Dict[str, Any], int]:
+        """Returns the entry with markers in place of stored values, and the marker count."""
+        data = {key: getattr(self, key) for key in ENTRY_FIELDS if getattr(self, key) is not None}
+        data.update(self._extra or {})
+        markers = 0
+        if self._result is not None:
+            result = self._result
+            if isinstance(result, dict):
+                result = {k: _MARKER.format(v.id) if isinstance(v, _Blob) else v for k, v in result.items()}
+                markers = sum(isinstance(v, _Blob) for v in self._result.values())
+            data["result"] = result
+        return data, markers
+
+    def _pieces(self, indent: Optional[int], depth: int) -> List[Union[str, int]]:
+        """Returns the memoized JSON text around the stored values (ints are blob ids)."""
+        if self._parts is None:
+            self._parts = {}
+        parts = self._parts.get((indent, depth))
+        if parts is None:
+            skeleton, markers = self._skeleton()
+            text = json.dumps(skeleton, indent=indent, default=str)
+            # Odd positions hold blob ids
+            parts = [int(p) if i % 2 else p for i, p in enumerate(_MARKER_RE.split(text))]
+            if len(parts) != 2 * markers + 1:
+                # A value of the entry itself looks like a marker: serialize
+                # the resolved entry instead of splicing
+                parts = [json.dumps(self.to_dict(), indent=indent, default=str)]
+            if indent is not None and depth:
+                parts = [p.replace("\n", "\n" + " " * (indent * depth)) if isinstance(p, str) else p
+                         for p in parts]
+            self._parts[(indent, depth)] = parts
+        return parts
+
+    def to_json(self, indent: Optional[int] = None, depth: int = 0) -> str:
+        """Returns the entry's JSON text.
+
+        The text around the stored values is memoized until the entry is
+        changed; stored values are spliced in from their JSON in the store.
+        Stored lists and dicts are always written compactly.
+
+        Args:
+            indent: As for json.dumps()
+            depth: Nesting level of the entry, for indented output
+        """
+        store = self._store
+        return "".join(store.text(p) if isinstance(p, int) else p for p in self._pieces(indent, depth))
+
+class History(list):
+    """The agent's action history, as a list of compact HistoryEntry records.
+
+    Appending a dict converts it into a record that shares this history's
+    ContentStore, so existing code that builds entries as dicts keeps
+    working. dumps() serializes the history from the memoized entry texts.
+    """
+
+    def __init__(self, entries: Iterable[Any] = (), store: Optional[ContentStore] = None):
+        super().__init__()
+        self.store = store or ContentStore()
+        self.extend(entries)
+
+    def _record(self, entry: Any) -> HistoryEntry:
+        if isinstance(entry, HistoryEntry) and entry._store is self.store:
+            return entry
+        if isinstance(entry, HistoryEntry):
+            entry = entry.to_dict()
+        return HistoryEntry(self.store, entry)
+
+    def append(self, entry: Any) -> None:
+        super().append(self._record(entry))
+
+    def extend(self, entries: Iterable[Any]) -> None:
+        super().extend(self._record(e) for e in entries)
+
+    def insert(self, index: int, entry: Any) -> None:
+        super().insert(index, self._record(entry))
+
+    def __iadd__(self, entries: Iterable[Any]) -> "History":
+        self.extend(entries)
+        return self
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            super().__setitem__(index, [self._record(e) for e in value])
+        else:
+            super().__setitem__(index, self._record(value))
+
+    def dumps(self, indent: Optional[int] = None) -> str:
+        """Returns JSON equal to json.dumps(history, indent=indent) once parsed.
+
+        Only entries changed since the last call are serialized again. The
+        stored lists and dicts (e.g. match lists) are written compactly.
+        """
+        if not self:
+            return "[]"
+        if indent is None:
+            return "[" + ", ".join(entry.to_json() for entry in self) + "]"
+        pad = "\n" + " " * indent
+        return "[" + pad + ("," + pad).join(entry.to_json(indent, 1) for entry in self) + "\n]"
+
+    def __repr__(self) -> str:
+        return f"History({reprlib.repr(list(self))})"
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Returns the history as plain dicts."""
+        return [entry.to_dict() for entry in self]
+
+def ensure_history(shared: Dict[str, Any]) -> History:
+    """Returns shared["history"] as a History, converting a plain list in place.
+
+    Lists come from callers that predate History and from checkpoints.
+    """
+    history = shared.get("history")
+    if not isinstance(history, History):
+        history = shared["history"] = History(history or [])
+    return history
+
+def _simulated_session(steps: int) -> List[Dict[str, Any]]:
+    """Builds a session of plain dicts in which files are read repeatedly."""
+    entries = []
+    for step in range(steps):
+        path = f"src/pkg_{step % 5}/module_{step % 23}.py"
+        entry = {"tool": "read_file", "reason": "inspect the module", "params": {"target_file": path},
+                 "timestamp": f"2026-01-01T00:{step // 60:02d}:{step % 60:02d}"}
+        if step % 4 == 0:
+            entry.update(tool="grep_search", params={"query": f"def handler_{step % 11}"})
+            entry["result"] = {"success": True, "match_count": 40, "matches": [
+                {"file_path": f"./src/pkg_{n % 5}/module_{n}.py", "line_number": n * 7,
+                 "content": f"def handler_{step % 11}(request, context):"} for n in range(40)]}
+        else:
+            # A new string for every read, as read_file returns
+            content = "".join(f"line {n} of {path}\n" for n in range(400))
+            entry["result"] = {"success": True, "content": content, "error": None}
+        entries.append(entry)
+    return entries
+
+def _benchmark(steps: int = 500) -> None:
+    """Compares memory and dump time of plain dicts and History for a session."""
+    import gc
+    import time
+    import tracemalloc
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        value = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return value, size
+
+    plain, plain_bytes = measure(lambda: _simulated_session(steps))
+    history, history_bytes = measure(lambda: History(_simulated_session(steps)))
+    assert json.loads(history.dumps()) == plain
+
+    def timed(dump, repeat=5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            dump()
+        return (time.perf_counter() - start) / repeat * 1000
+
+    plain_ms = timed(lambda: json.dumps(plain, indent=2))
+    first_ms = timed(lambda: History(plain).dumps(indent=2), repeat=1)
+    history.dumps(indent=2)
+    memo_ms = timed(lambda: history.dumps(indent=2))
+    print(f"{steps} steps")
+    print(f"  memory: dicts {plain_bytes / 1e6:.1f} MB, History {history_bytes / 1e6:.1f} MB ({history.store.stats()['blobs']} stored values)")
+    print(f"  dump:   json.dumps {plain_ms:.1f} ms, History first {first_ms:.1f} ms, memoized {memo_ms:.1f} ms")
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        _benchmark()
+    else:
+        # Example usage
+        history = History()
+        history.append({"tool": "read_file", "reason": "look", "params": {"target_file": "a.py"}})
+        history[-1]["result"] = {"success": True, "content": "print('hi')\n" * 40}
+        print(history[-1]["result"]["content"][:24])
+        print(history.dumps(indent=2)[:200])
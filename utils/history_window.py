@@ -0,0 +1,323 @@
+import hashlib
+import json
+import math
+from collections import Counter
+from typing import Any, Dict, List, Set, Tuple
+
+CHARS_PER_TOKEN = 4  # Rough estimate that is good enough for budgeting
+DEFAULT_KEEP_LAST = 5
+DEFAULT_MAX_TOKENS = 32000
+COMPACT_STRING_CHARS = 200  # Longest string kept in a compacted entry
+COMPACT_MATCHES = 3  # grep matches (and find_symbol references) kept in a compacted entry
+COMPACT_TREE_LINES = 20  # list_dir lines kept in a compacted entry
+FOLD_STEPS = 10  # Oldest steps are folded into the summary this many at a time
+
+def estimate_tokens(obj: Any) -> int:
+    """Estimates how many tokens the JSON dump of an object takes."""
+    return len(json.dumps(obj, default=str)) // CHARS_PER_TOKEN + 1
+
+def _result_field(entry: Dict[str, Any], key: str) -> Any:
+    # A HistoryEntry returns one field without decoding the file content
+    result_field = getattr(entry, "result_field", None)
+    if result_field is not None:
+        return result_field(key)
+    result = entry.get("result")
+    return result.get(key) if isinstance(result, dict) else None
+
+def _line_range(entry: Dict[str, Any]) -> Tuple[float, float]:
+    """Returns the lines of its file a read or edit step covers.
+
+    A read covers the lines it returned: ReadFileNode pages large files and
+    long ranges, and reports the page in the result. The requested range is
+    only used when the result has no page, and a failed read covers nothing.
+    """
+    if entry.get("tool") != "read_file":
+        return 1, math.inf
+    if _result_field(entry, "success") is False:
+        return 1, 0
+    end_line = _result_field(entry, "end_line")
+    if end_line is not None:
+        return _result_field(entry, "start_line") or 1, end_line
+    params = entry.get("params", {})
+    return params.get("start_line") or 1, params.get("end_line") or math.inf
+
+def _superseded_reads(history: List[Dict[str, Any]]) -> Set[int]:
+    """Returns the indexes of reads whose content is stale or shown again later.
+
+    A read is superseded by a later edit of the file, or by a later read of
+    the same or a wider range; a later read of another part of the file
+    leaves it in place.
+    """
+    superseded = set()
+    later: Dict[Any, List[Tuple[float, float]]] = {}
+    for i in range(len(history) - 1, -1, -1):
+        entry = history[i]
+        if entry.get("tool") not in ("read_file", "edit_file"):
+            continue
+        path = entry.get("params", {}).get("target_file")
+        start, end = _line_range(entry)
+        if entry.get("tool") == "read_file" and any(s <= start and end <= e for s, e in later.get(path, ())):
+            superseded.add(i)
+        later.setdefault(path, []).append((start, end))
+    return superseded
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... [{len(text) - max_chars} more characters omitted]"
+
+def _cap_strings(value: Any, max_chars: int) -> Any:
+    """Returns a copy of a JSON-like value with every string truncated."""
+    if isinstance(value, str):
+        return _truncate(value, max_chars)
+    if isinstance(value, dict):
+        return {k: _cap_strings(v, max_chars) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_cap_strings(v, max_chars) for v in value]
+    return value
+
+def _content_reference(content: str, superseded: bool) -> str:
+    """Returns a short, stable stand-in for a file body."""
+    digest = hashlib.sha1(content.encode("utf-8", "replace")).hexdigest()[:12]
+    note = "superseded by a later read or edit" if superseded else "read the file again if needed"
+    return f"[{len(content.splitlines())} lines, sha1:{digest} omitted; {note}]"
+
+def _compact_entry(entry: Dict[str, Any], superseded: bool = False) -> Dict[str, Any]:
+    """Returns a small copy of a history entry without large payloads."""
+    compact = {k: v for k, v in entry.items() if k != "result"}
+    result = entry.get("result")
+    if isinstance(result, dict):
+        result = dict(result)
+        if isinstance(result.get("content"), str):
+            result["content"] = _content_reference(result["content"], superseded)
+        for key in ("matches", "references"):
+            if isinstance(result.get(key), list):
+                result[key] = result[key][:COMPACT_MATCHES]
+        for key in ("tree", "tree_visualization"):
+            if isinstance(result.get(key), str):
+                lines = result[key].splitlines()
+                if len(lines) > COMPACT_TREE_LINES:
+                    result[key] = "\n".join(lines[:COMPACT_TREE_LINES] + [f"... {len(lines) - COMPACT_TREE_LINES} more lines"])
+        compact["result"] = result
+    elif result is not None:
+        compact["result"] = result
+    return _cap_strings(compact, COMPACT_STRING_CHARS)
+
+def _fit_entry(entry: Dict[str, Any], max_tokens: int) -> Dict[str, Any]:
+    """Returns a copy of a history entry shrunk to roughly max_tokens.
+    
+    Long strings are cut (halving the cap until the entry fits) and long match
+    and reference lists are shortened; if that is not enough the entry is compacted.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    while max_chars > COMPACT_STRING_CHARS:
+        fitted = _cap_strings(entry, max_chars)
+        result = fitted.get("result")
+        for key in ("matches", "references"):
+            if isinstance(result, dict) and isinstance(result.get(key), list):
+                while estimate_tokens(fitted) > max_tokens and len(result[key]) > COMPACT_MATCHES:
+                    result[key] = result[key][:len(result[key]) // 2]
+        if estimate_tokens(fitted) <= max_tokens:
+            return fitted
+        max_chars //= 2
+    return _compact_entry(entry)
+
+Rendered = Tuple[Dict[str, Any], str, int]  # Compacted entry, its prompt text, its JSON length
+
+def _render(entry: Dict[str, Any], form: Any) -> Rendered:
+    """Compacts a history entry into one of its prompt forms and serializes it.
+
+    ``form`` is "compact", "superseded" or the token budget of a verbatim entry.
+    """
+    if not isinstance(entry, dict):
+        entry = entry.to_dict()  # A HistoryEntry
+    if form == "compact":
+        compact = _compact_entry(entry)
+    elif form == "superseded":
+        compact = _compact_entry(entry, superseded=True)
+    else:
+        compact = _fit_entry(entry, form)
+    return compact, json.dumps(compact, indent=2, default=str), len(json.dumps(compact, default=str))
+
+def _list_tokens(chars: List[int]) -> int:
+    """Equals estimate_tokens() of a list whose items dump to these lengths."""
+    return (sum(chars) + 2 * max(1, len(chars))) // CHARS_PER_TOKEN + 1
+
+class HistoryWindow:
+    """Compacts and serializes the history for the prompt, one turn after another.
+
+    Between two turns the history only grows at the end, and most entries
+    keep the form they had (an older step stays compacted, a recent one
+    stays verbatim). Each position remembers the entry it rendered, that
+    entry's result and the form it used, and reuses its compacted copy and
+    JSON text while those are unchanged. A turn therefore only compacts and
+    serializes the new step and the one that left the verbatim window, and
+    the texts of the other steps stay byte-identical, which keeps the prompt
+    prefix cacheable.
+
+    Tool nodes must assign a new ``result`` dict rather than change one in
+    place for the change to be seen. Entries may be dicts or the records of
+    a utils.history.History.
+    """
+
+    def __init__(self, keep_last: int = DEFAULT_KEEP_LAST, max_tokens: int = DEFAULT_MAX_TOKENS):
+        self.keep_last = keep_last
+        self.max_tokens = max_tokens
+        self._memo: Dict[int, Tuple[Dict[str, Any], Any, Any, Rendered]] = {}
+
+    def _get(self, i: int, entry: Dict[str, Any], form: Any) -> Rendered:
+        # A HistoryEntry counts its changes; a dict is checked by its result's identity
+        revision = getattr(entry, "revision", None)
+        result = entry.get("result") if revision is None else revision
+        memo = self._memo.get(i)
+        if (memo is not None and memo[0] is entry and memo[2] == form
+                and (memo[1] is result if revision is None else memo[1] == result)):
+            return memo[3]
+        rendered = _render(entry, form)
+        self._memo[i] = (entry, result, form, rendered)
+        return rendered
+
+    def window(self, history: List[Dict[str, Any]]) -> List[Rendered]:
+        """Returns the rendered entries of compact_history(history)."""
+        keep_last = self.keep_last
+        max_tokens = self.max_tokens
+        split = max(0, len(history) - keep_last)
+        for i in [i for i in self._memo if i >= len(history)]:
+            del self._memo[i]
+
+        superseded = _superseded_reads(history)
+
+        # The latest step gets half of the recent budget, the others share the rest
+        recent_budget = max_tokens // 2
+        recent = []
+        for i in range(split, len(history)):
+            entry = history[i]
+            if i in superseded:
+                recent.append(self._get(i, entry, "superseded"))
+            elif i == len(history) - 1:
+                recent.append(self._get(i, entry, recent_budget // 2))
+            else:
+                recent.append(self._get(i, entry, recent_budget // 2 // max(1, keep_last - 1)))
+
+        budget = max_tokens - _list_tokens([r[2] for r in recent])
+        kept = []
+        for i in range(split - 1, -1, -1):
+            rendered = self._get(i, history[i], "superseded" if i in superseded else "compact")
+            cost = rendered[2] // CHARS_PER_TOKEN + 1
+            if cost > budget:
+                break
+            kept.append(rendered)
+            budget -= cost
+        kept.reverse()
+
+        # Fold in whole groups so that the summary, which starts the history
+        # part of the prompt, stays the same for several turns
+        folded = split - len(kept)
+        if folded:
+            folded = min(split, -(-folded // FOLD_STEPS) * FOLD_STEPS)
+            kept = kept[len(kept) - (split - folded):] if folded < split else []
+        dropped = history[:folded]
+        if not dropped:
+            return kept + recent
+        summary = {
+            "tool": "summary",
+            "reason": f"{len(dropped)} earlier steps omitted to fit the context window",
+            "params": {},
+            "result": {"tool_counts": dict(Counter(e.get("tool") for e in dropped))}
+        }
+        return [(summary, json.dumps(summary, indent=2), len(json.dumps(summary)))] + kept + recent
+
+    def render(self, history: List[Dict[str, Any]]) -> List[str]:
+        """Returns the JSON text of each entry of the compacted history."""
+        return [text for _, text, _ in self.window(history)]
+
+def compact_history(
+    history: List[Dict[str, Any]],
+    keep_last: int = DEFAULT_KEEP_LAST,
+    max_tokens: int = DEFAULT_MAX_TOKENS
+) -> List[Dict[str, Any]]:
+    """Returns a view of the action history that fits a token budget.
+
+    - The last ``keep_last`` steps are kept verbatim, shrunk only as much as
+      needed for them to use at most half of the budget together (the latest
+      step alone may use a quarter).
+    - Older steps keep their tool, reason and params, but file bodies are
+      replaced by a line count and digest, and match lists and trees are cut.
+    - A read of a file that was edited later, or read again over the same or
+      a wider range, is always replaced by a reference, since its content is
+      stale or repeated.
+    - If the older steps still don't fit, the oldest ones are folded into a
+      single summary entry, FOLD_STEPS at a time.
+
+    The input list and its entries are not modified. Use a HistoryWindow to
+    reuse the work of earlier turns.
+
+    Args:
+        history (list): shared["history"]
+        keep_last (int, optional): Number of recent steps kept verbatim
+        max_tokens (int, optional): Token budget for the whole history
+
+    Returns:
+        list: History entries to put in the prompt
+    """
+    return [entry for entry, _, _ in HistoryWindow(keep_last, max_tokens).window(history)]
+
+def _simulated_history(steps: int) -> List[Dict[str, Any]]:
+    """Builds a session with large reads and searches."""
+    history = []
+    for step in range(steps):
+        path = f"src/module_{step % 7}.py"
+        if step % 3 == 0:
+            history.append({
+                "tool": "grep_search", "reason": "find usages", "params": {"query": "def "},
+                "result": {"success": True, "matches": [
+                    {"file_path": path, "line_number": n, "content": "def f(): " + "x" * 80}
+                    for n in range(50)
+                ], "match_count": 50}
+            })
+        else:
+            history.append({
+                "tool": "read_file", "reason": "inspect", "params": {"target_file": path},
+                "result": {"success": True, "content": f"# step {step}\n" + "line of code\n" * 2000, "error": None}
+            })
+    return history
+
+def _benchmark(steps: int = 100) -> None:
+    """Compares re-dumping the history every turn with a HistoryWindow."""
+    import os
+    import time
+
+    history = _simulated_history(steps)
+
+    start = time.perf_counter()
+    for turn in range(1, steps + 1):
+        json.dumps(compact_history(history[:turn]), indent=2)
+    full = time.perf_counter() - start
+
+    window = HistoryWindow()
+    previous: List[str] = []
+    reused = total = 0
+    start = time.perf_counter()
+    for turn in range(1, steps + 1):
+        texts = window.render(history[:turn])
+        shared = os.path.commonprefix(["".join(previous), "".join(texts)])
+        reused += len(shared)
+        total += sum(len(t) for t in texts)
+        previous = texts
+    incremental = time.perf_counter() - start
+
+    print(f"{steps} turns, re-dumped every turn: {full * 1000:.1f} ms")
+    print(f"{steps} turns, HistoryWindow:        {incremental * 1000:.1f} ms")
+    print(f"history text shared with the previous turn's prompt: {reused / total:.0%}")
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        _benchmark()
+    else:
+        # Simulate a 100-step session with large reads and searches
+        history = _simulated_history(100)
+        sizes = [estimate_tokens(compact_history(history[:turn])) for turn in range(1, 101)]
+        full = estimate_tokens(history)
+        print(f"full history: {full} tokens, compacted: max {max(sizes)} tokens")
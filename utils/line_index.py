@@ -0,0 +1,91 @@
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+MAX_CACHED_INDEXES = 64
+
+# abs path -> (mtime_ns, size, line start offsets)
+_indexes: "OrderedDict[str, Tuple[int, int, array]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def _build_line_starts(path: str, size: int) -> array:
+    """Scans a file through mmap and returns the byte offset of every line start."""
+    starts = array('Q')
+    if size == 0:
+        return starts
+    starts.append(0)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = mm.find(b'\n')
+        while pos != -1 and pos + 1 < size:
+            starts.append(pos + 1)
+            pos = mm.find(b'\n', pos + 1)
+    return starts
+
+def get_line_starts(path: str) -> Tuple[array, int]:
+    """Returns the line start offsets and size of a file.
+
+    Offsets are cached per (path, mtime, size), so repeated ranged reads of an
+    unchanged file only pay for the scan once.
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        tuple: (array of line start byte offsets, file size in bytes)
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    with _indexes_lock:
+        cached = _indexes.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            _indexes.move_to_end(path)
+            return cached[2], st.st_size
+
+    starts = _build_line_starts(path, st.st_size)
+    with _indexes_lock:
+        _indexes[path] = (st.st_mtime_ns, st.st_size, starts)
+        _indexes.move_to_end(path)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return starts, st.st_size
+
+def count_lines(path: str) -> int:
+    """Returns the number of lines in a file."""
+    return len(get_line_starts(path)[0])
+
+def read_lines(path: str, start_line: int = 1, end_line: Optional[int] = None) -> Tuple[str, int]:
+    """Reads a range of lines without loading the rest of the file.
+
+    Args:
+        path (str): Path to the file
+        start_line (int, optional): First line to read (1-indexed)
+        end_line (int, optional): Last line to read (1-indexed, inclusive);
+            defaults to the end of the file
+
+    Returns:
+        tuple: (text of the lines, total number of lines in the file)
+    """
+    starts, size = get_line_starts(path)
+    total = len(starts)
+    start_line = max(1, start_line)
+    end_line = total if end_line is None else min(end_line, total)
+    if start_line > end_line:
+        return "", total
+
+    begin = starts[start_line - 1]
+    end = starts[end_line] if end_line < total else size
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return mm[begin:end].decode('utf-8'), total
+
+if __name__ == "__main__":
+    # Example usage
+    import tempfile
+
+    with tempfile.NamedTemporaryFile('w', suffix=".log", delete=False) as f:
+        f.writelines(f"log line {i}\n" for i in range(1, 100001))
+    print(count_lines(f.name))
+    print(read_lines(f.name, 50000, 50002))
+    os.remove(f.name)
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from utils.cache_dir import get_cache_dir
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024  # 256 MB of cached responses
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # One week
+
+def cache_key(model: str, prompt: Any, params: Optional[Dict[str, Any]] = None, base_url: str = "") -> str:
+    """Returns the content address of a completion request.
+
+    The endpoint is part of the key, since the same model name can be served
+    by different providers or local servers.
+    """
+    payload = json.dumps(
+        {"base_url": base_url, "model": model, "prompt": prompt, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """SQLite-backed cache of LLM completions with LRU eviction.
+
+    Entries older than ``max_age`` seconds are never returned, and once the
+    stored responses exceed ``max_bytes`` the least recently used ones are
+    dropped.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: float = DEFAULT_MAX_AGE
+    ):
+        self.path = path or os.path.join(get_cache_dir(), "llm_cache.sqlite3")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_last_access ON completions (last_access)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, validate: Optional[Callable[[str], Any]] = None) -> Optional[str]:
+        """Returns the cached response for a key, or None on a miss.
+
+        Args:
+            key: Key from cache_key()
+            validate: Called with the response before it counts as a hit; if
+                it raises, the entry is dropped and the lookup is a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+        if validate is not None:
+            try:
+                validate(row[0])
+            except Exception:
+                with self._lock:
+                    # Unless a fresh response replaced it in the meantime
+                    self._conn.execute("DELETE FROM completions WHERE key = ? AND created = ?", (key, row[1]))
+                    self._conn.commit()
+                    self.misses += 1
+                return None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE completions SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str) -> None:
+        """Stores a response and evicts expired or least recently used entries."""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, size, created, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM completions WHERE created < ?", (now - self.max_age,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM completions ORDER BY last_access ASC"
+        ).fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM completions WHERE key = ?", stale)
+
+    def delete(self, key: str) -> None:
+        """Drops the cached response for a key."""
+        with self._lock:
+            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+    def clear(self) -> None:
+        """Removes every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def enable_llm_cache(
+    path: Optional[str] = None,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    max_age: float = DEFAULT_MAX_AGE
+) -> LLMCache:
+    """Turns on the process-wide LLM response cache used by call_llm.
+
+    Args:
+        path (str, optional): SQLite file (defaults to the agent cache directory)
+        max_bytes (int, optional): Size budget for stored responses
+        max_age (float, optional): Maximum entry age in seconds
+
+    Returns:
+        LLMCache: The active cache
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = LLMCache(path, max_bytes=max_bytes, max_age=max_age)
+        return _cache
+
+def disable_llm_cache() -> None:
+    """Turns off the process-wide LLM response cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is not None:
+            _cache.close()
+        _cache = None
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Returns the active LLM response cache, or None if caching is off."""
+    return _cache
+
+if __name__ == "__main__":
+    # Example usage
+    import tempfile
+
+    cache = LLMCache(os.path.join(tempfile.mkdtemp(), "cache.sqlite3"), max_bytes=20)
+    key = cache_key("model", "What is the meaning of life?")
+    print(cache.get(key))
+    cache.put(key, "42")
+    print(cache.get(key))
+    cache.put(cache_key("model", "Another prompt"), "A much longer answer")
+    print(cache.get(key), cache.stats())
@@ -1,6 +1,17 @@
 import logging
+import reprlib
 import sys
-from typing import Optional
+from typing import Any, Optional
+
+MAX_REPR_CHARS = 1000  # Longest repr a log argument may produce
+
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxdict = 20
+_repr.maxlist = 20
+_repr.maxtuple = 20
+_repr.maxstring = 200
+_repr.maxother = 200
 
 def setup_logging(level: int = logging.INFO, log_file: Optional[str] = None):
     """Setup logging configuration.
@@ -36,4 +47,30 @@ def setup_logging(level: int = logging.INFO, log_file: Optional[str] = None):
     
 def get_logger(name: str) -> logging.Logger:
     """Get a logger with the given name."""
-    return logging.getLogger(name) 
\ No newline at end of file
+    return logging.getLogger(name) 
+
+class CappedRepr:
+    """Log argument that is only rendered if the record is emitted.
+
+    Use it for payloads that may be large (shared store, file contents,
+    LLM responses) with %-style logging::
+
+        logger.debug("prep() returned: %s", CappedRepr(prep_res))
+
+    The repr is built with reprlib, so nested containers and long strings
+    are abbreviated before anything is copied, and the result is cut to
+    ``limit`` characters.
+    """
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj: Any, limit: int = MAX_REPR_CHARS):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = _repr.repr(self.obj)
+        if len(text) > self.limit:
+            text = f"{text[:self.limit]}... [{len(text) - self.limit} more chars]"
+        return text
+
+    __repr__ = __str__
@@ -0,0 +1,227 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from utils.file_cache import get_file_cache
+from utils.line_index import count_lines
+from utils.logging_utils import get_logger
+from utils.search_ops import warm_search
+from utils.symbol_index import warm_symbols
+from utils.workspace import get_workspace
+
+logger = get_logger(__name__)
+
+DEFAULT_MAX_FILES = 8  # Files read ahead per decision
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024  # Bytes read ahead per decision
+MAX_PREFETCH_FILE_SIZE = 1024 * 1024  # Larger files are paged anyway
+
+def predict_reads(history: List[Dict[str, Any]], working_dir: str, limit: int = DEFAULT_MAX_FILES) -> List[str]:
+    """Guesses which files the agent will read next.
+
+    Looks at the results of the latest step (all calls of a batch):
+    - files with grep matches, most matches first
+    - files defining a symbol found with find_symbol, then files using it
+    - files directly inside a listed directory, in listing order
+
+    Files already read in the session are skipped, since they are cached.
+
+    Args:
+        history (list): shared["history"]
+        working_dir (str): Directory the tool paths are relative to
+        limit (int, optional): Maximum number of paths to return
+
+    Returns:
+        list: Absolute paths, most likely first
+    """
+    # The latest step: the trailing entries that share its timestamp
+    latest = []
+    for entry in reversed(history):
+        if latest and entry.get("timestamp") != latest[0].get("timestamp"):
+            break
+        latest.append(entry)
+    latest.reverse()
+
+    already_read = {
+        os.path.normpath(os.path.join(working_dir, e["params"]["target_file"]))
+        for e in history if e.get("tool") == "read_file" and "target_file" in e.get("params", {})
+    }
+
+    candidates: List[str] = []
+    for entry in latest:
+        result = entry.get("result")
+        if not isinstance(result, dict) or not result.get("success"):
+            continue
+        if entry.get("tool") == "grep_search":
+            counts = Counter(m["file_path"] for m in result.get("matches", []) if "file_path" in m)
+            candidates.extend(os.path.join(working_dir, p) for p, _ in counts.most_common())
+        elif entry.get("tool") == "find_symbol":
+            for key in ("definitions", "references"):
+                candidates.extend(os.path.join(working_dir, m["file_path"])
+                                  for m in result.get(key, []) if "file_path" in m)
+        elif entry.get("tool") == "list_dir":
+            workspace = get_workspace(working_dir)
+            dir_path = os.path.join(working_dir, entry.get("params", {}).get("relative_workspace_path", ""))
+            rel_dir = workspace.relpath(dir_path)
+            children = workspace.list_children(rel_dir) if rel_dir is not None else None
+            for name, info in children or ():
+                if not info.is_dir and not name.startswith('.'):
+                    candidates.append(os.path.join(dir_path, name))
+
+    paths: List[str] = []
+    seen = set()
+    for path in candidates:
+        path = os.path.normpath(path)
+        if path in seen or path in already_read:
+            continue
+        seen.add(path)
+        paths.append(path)
+        if len(paths) >= limit:
+            break
+    return paths
+
+class Prefetcher:
+    """Warms the caches for the agent's likely next step while it is deciding.
+
+    ``start()`` is called before the decision LLM call. On a background
+    thread, it brings the workspace snapshot and search index up to date,
+    then reads the predicted files into the file cache and the line index,
+    within a budget of files and bytes, and finally brings the symbol index
+    up to date. The indexes are only refreshed once a search or lookup has
+    built them, and a refresh stops when the run is cancelled, so it never
+    holds an index lock long after the decision. ``finish()`` is called
+    with the decision: it cancels what is left and counts how many of the
+    files the agent chose to read were already prefetched.
+
+    Each Prefetcher owns one worker thread; a new ``start()`` cancels the
+    previous run first.
+    """
+
+    def __init__(self, max_files: int = DEFAULT_MAX_FILES, max_bytes: int = DEFAULT_MAX_BYTES):
+        """Initialize a prefetcher.
+
+        Args:
+            max_files: Maximum number of files read ahead per decision
+            max_bytes: Maximum number of bytes read ahead per decision
+        """
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.runs = 0
+        self.cancelled = 0
+        self.files_prefetched = 0
+        self.bytes_prefetched = 0
+        self.hits = 0
+        self.misses = 0
+        self._prefetched: set = set()
+        self._cancel = threading.Event()
+        self._future: Optional[Future] = None
+        self._lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+
+    def start(self, history: List[Dict[str, Any]], working_dir: str) -> None:
+        """Starts warming the caches for the step after ``history``."""
+        self.cancel()
+        paths = predict_reads(history, working_dir, self.max_files)
+        cancel = threading.Event()
+        with self._lock:
+            self._cancel = cancel
+            self._prefetched = set()
+            self.runs += 1
+            self._future = self.executor.submit(self._run, paths, working_dir, cancel)
+
+    def _run(self, paths: List[str], working_dir: str, cancel: threading.Event) -> None:
+        try:
+            warm_search(working_dir, cancel)
+        except Exception:
+            logger.debug("Warming the search index failed", exc_info=True)
+
+        cache = get_file_cache()
+        budget = self.max_bytes
+        for path in paths:
+            if cancel.is_set():
+                return
+            try:
+                size = os.path.getsize(path)
+                if size > min(budget, MAX_PREFETCH_FILE_SIZE):
+                    continue
+                count_lines(path)
+                read = cache.prefetch(path)
+            except (OSError, UnicodeDecodeError):
+                continue
+            budget -= read
+            with self._lock:
+                if cancel.is_set():
+                    return
+                self._prefetched.add(path)
+                self.files_prefetched += 1
+                self.bytes_prefetched += read
+
+        if not cancel.is_set():
+            try:
+                warm_symbols(working_dir, cancel)
+            except Exception:
+                logger.debug("Warming the symbol index failed", exc_info=True)
+
+    def cancel(self) -> None:
+        """Stops the running prefetch after the file it is reading."""
+        with self._lock:
+            if self._future is not None and not self._future.done():
+                self.cancelled += 1
+            self._cancel.set()
+
+    def finish(self, decision: Dict[str, Any], working_dir: str) -> None:
+        """Cancels the running prefetch and scores it against the decision.
+
+        Args:
+            decision: The decision dict returned by MainDecisionAgent.exec()
+            working_dir: Directory the tool paths are relative to
+        """
+        self.cancel()
+        calls = decision["params"].get("calls", []) if decision.get("tool") == "batch" else [decision]
+        reads = [
+            os.path.normpath(os.path.join(working_dir, call["params"]["target_file"]))
+            for call in calls if call.get("tool") == "read_file" and "target_file" in call.get("params", {})
+        ]
+        with self._lock:
+            for path in reads:
+                if path in self._prefetched:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns run, cancellation, volume and hit-rate counters."""
+        with self._lock:
+            reads = self.hits + self.misses
+            return {
+                "runs": self.runs,
+                "cancelled": self.cancelled,
+                "files_prefetched": self.files_prefetched,
+                "bytes_prefetched": self.bytes_prefetched,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / reads if reads else 0.0
+            }
+
+    def close(self) -> None:
+        """Cancels the running prefetch and stops the worker thread."""
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+if __name__ == "__main__":
+    # Example usage: predict and warm the files a grep in this repo points at
+    import time
+    from utils.search_ops import grep_search
+
+    working_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    matches, _ = grep_search("def grep_search", working_dir=working_dir)
+    history = [{"tool": "grep_search", "reason": "find it", "params": {"query": "def grep_search"},
+                "result": {"success": True, "matches": matches}, "timestamp": "t0"}]
+    prefetcher = Prefetcher()
+    prefetcher.start(history, working_dir)
+    time.sleep(0.5)  # The decision LLM call would run here
+    prefetcher.finish({"tool": "read_file", "reason": "", "params": {"target_file": "utils/search_ops.py"}}, working_dir)
+    print(predict_reads(history, working_dir))
+    print(prefetcher.stats())
+    prefetcher.close()
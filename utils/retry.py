@@ -0,0 +1,135 @@
+import email.utils
+import random
+import time
+from typing import Callable, Optional
+
+def _always(exc: Exception) -> bool:
+    return True
+
+def retry_after_seconds(exc: Exception) -> Optional[float]:
+    """Returns how long the server asked us to wait, if the error carries a hint.
+
+    Looks at a ``retry_after`` attribute, then at the ``retry-after-ms`` and
+    ``Retry-After`` headers of an attached HTTP response (as on openai's
+    APIStatusError). Retry-After may be a number of seconds or an HTTP date.
+    """
+    value = getattr(exc, "retry_after", None)
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers is None:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms is not None:
+            return max(0.0, float(ms) / 1000)
+    except (TypeError, ValueError):
+        pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+class RetryPolicy:
+    """How Node.run() retries a failing exec().
+
+    The n-th retry (0-based) waits ``base_delay * multiplier ** n`` seconds,
+    capped at ``max_delay``. With ``jitter`` j, a random part of up to j of
+    that delay is dropped, so many clients do not retry in lockstep (j=1 is
+    "full jitter"). A Retry-After hint on the error is always honored, even
+    when it is longer than ``max_delay``.
+
+    No retry is made when the attempts are used up, when ``retry_if``
+    rejects the error, or when the wait would end more than ``max_elapsed``
+    seconds after the first attempt started. Errors that ``wait_if``
+    rejects are retried immediately (e.g. a malformed LLM answer, for
+    which waiting buys nothing).
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 1,
+        base_delay: float = 0.0,
+        multiplier: float = 2.0,
+        max_delay: float = 30.0,
+        jitter: float = 0.5,
+        max_elapsed: Optional[float] = None,
+        retry_if: Callable[[Exception], bool] = _always,
+        wait_if: Callable[[Exception], bool] = _always
+    ):
+        """Initialize a retry policy.
+
+        Args:
+            max_retries: Total number of exec() attempts (1 means no retry)
+            base_delay: Delay before the first retry, in seconds
+            multiplier: Factor applied to the delay after every retry
+            max_delay: Upper bound of the backoff delay, in seconds
+            jitter: Fraction of each delay that is randomized, from 0 to 1
+            max_elapsed: Give up once this many seconds would have passed
+            retry_if: Predicate telling whether an error is worth retrying
+            wait_if: Predicate telling whether to back off before retrying
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.multiplier = multiplier
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_elapsed = max_elapsed
+        self.retry_if = retry_if
+        self.wait_if = wait_if
+
+    @classmethod
+    def fixed(cls, max_retries: int = 1, wait: float = 0) -> "RetryPolicy":
+        """Retries every error after the same fixed wait (the Node default)."""
+        return cls(max_retries=max_retries, base_delay=wait, multiplier=1.0, max_delay=wait, jitter=0.0)
+
+    def backoff(self, retry: int) -> float:
+        """Returns the jittered backoff delay before the given retry (0-based)."""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** retry)
+        return delay * (1 - self.jitter * random.random())
+
+    def next_delay(self, retry: int, exc: Exception, elapsed: float) -> Optional[float]:
+        """Decides whether to retry after a failed attempt.
+
+        Args:
+            retry: Index of the retry about to be made (0 for the first)
+            exc: The error raised by the failed attempt
+            elapsed: Seconds since the first attempt started
+
+        Returns:
+            float or None: Seconds to wait before retrying, or None to give up
+        """
+        if retry + 1 >= self.max_retries or not self.retry_if(exc):
+            return None
+        delay = 0.0
+        if self.wait_if(exc):
+            delay = self.backoff(retry)
+            hint = retry_after_seconds(exc)
+            if hint is not None:
+                delay = max(delay, hint)
+        if self.max_elapsed is not None and elapsed + delay > self.max_elapsed:
+            return None
+        return delay
+
+if __name__ == "__main__":
+    # Example usage
+    policy = RetryPolicy(max_retries=6, base_delay=0.5, max_delay=8, max_elapsed=20)
+    elapsed = 0.0
+    for retry in range(6):
+        delay = policy.next_delay(retry, RuntimeError("busy"), elapsed)
+        print(f"retry {retry}: {'give up' if delay is None else f'wait {delay:.2f}s'}")
+        if delay is None:
+            break
+        elapsed += delay
@@ -0,0 +1,286 @@
+import hashlib
+import os
+import pickle
+import threading
+from typing import Dict, FrozenSet, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from utils.cache_dir import get_cache_dir
+from utils.workspace import FileInfo
+
+INDEX_VERSION = 1
+MAX_INDEXED_FILE_SIZE = 8 * 1024 * 1024  # Larger files are always scanned
+
+def extract_trigrams(text: str) -> FrozenSet[str]:
+    """Returns the set of lowercase trigrams contained in a piece of text."""
+    text = text.lower()
+    return frozenset(text[i:i + 3] for i in range(len(text) - 2))
+
+def required_literals(query: str, case_sensitive: bool = False) -> Optional[List[str]]:
+    """Extracts literal substrings that every match of a regex must contain.
+
+    Only literal runs that are mandatory (not inside alternations or optional
+    repeats) are returned, and only those long enough to yield a trigram.
+
+    Args:
+        query (str): Regex pattern
+        case_sensitive (bool, optional): Whether the pattern is case-sensitive
+
+    Returns:
+        list or None: Required literals, or None if the regex cannot be
+        narrowed down by trigrams and a full scan is needed
+    """
+    flags = 0 if case_sensitive else sre_constants.SRE_FLAG_IGNORECASE
+    try:
+        parsed = sre_parse.parse(query, flags)
+    except Exception:
+        return None
+
+    literals = []
+
+    def collect(items):
+        run = []
+        for op, av in items:
+            if op is sre_constants.LITERAL:
+                run.append(chr(av))
+                continue
+            literals.append("".join(run))
+            run = []
+            if op is sre_constants.SUBPATTERN:
+                # Group contents are mandatory: (group, add_flags, del_flags, pattern)
+                collect(av[-1])
+        literals.append("".join(run))
+
+    collect(parsed)
+    literals = [literal for literal in literals if len(literal) >= 3]
+    return literals or None
+
+def index_path(root: str) -> str:
+    """Returns the on-disk location of the trigram index for a directory."""
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_cache_dir("search_index"), f"{digest}.pkl")
+
+class TrigramIndex:
+    """Trigram index over the text files below a root directory.
+
+    Each file is stored with the (mtime, size) it had when it was indexed, so
+    ``refresh()`` only re-reads files that changed since the last query.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.path = index_path(self.root)
+        # rel_path -> (mtime_ns, size, trigrams or None if unindexed)
+        self.files: Dict[str, Tuple[int, int, Optional[FrozenSet[str]]]] = {}
+        # trigram -> files; the None key holds the files too large to index
+        self._postings: Optional[Dict[Optional[str], Set[str]]] = None
+        self.dirty = False  # Changed since it was last saved
+        self.synced_version: Optional[Hashable] = None  # Workspace version last refreshed against
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Loads the index from disk. Returns True if a usable index was found."""
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return False
+        self.files = data["files"]
+        self._postings = None
+        return True
+
+    def save(self) -> None:
+        """Writes the index to disk atomically."""
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"version": INDEX_VERSION, "root": self.root, "files": self.files},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, self.path)
+
+    def _index_file(self, rel_path: str, mtime_ns: int, size: int) -> None:
+        trigrams = None
+        if size <= MAX_INDEXED_FILE_SIZE:
+            try:
+                with open(os.path.join(self.root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+                    trigrams = extract_trigrams(f.read())
+            except OSError:
+                trigrams = None
+        self._unpost(rel_path)
+        self.files[rel_path] = (mtime_ns, size, trigrams)
+        if self._postings is not None:
+            for trigram in (None,) if trigrams is None else trigrams:
+                self._postings.setdefault(trigram, set()).add(rel_path)
+
+    def _unpost(self, rel_path: str) -> None:
+        old = self.files.get(rel_path)
+        if self._postings is None or old is None:
+            return
+        for trigram in (None,) if old[2] is None else old[2]:
+            posting = self._postings.get(trigram)
+            if posting is not None:
+                posting.discard(rel_path)
+
+    def refresh(
+        self,
+        rel_paths: Iterable[str],
+        stats: Optional[Mapping[str, FileInfo]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> bool:
+        """Brings the index in sync with the given list of files.
+
+        Args:
+            rel_paths: Every searchable file below the root, relative to it
+            stats: Known (mtime, size) of the files, e.g. from a workspace
+                snapshot; files are stat'ed on disk when omitted
+            cancel: Stops the refresh between two files once set; files not
+                reached yet (and deleted ones) are left for the next refresh
+
+        Returns:
+            bool: True if anything was added, re-indexed or removed
+        """
+        changed = False
+        seen = set()
+        for rel_path in rel_paths:
+            if cancel is not None and cancel.is_set():
+                return changed
+            seen.add(rel_path)
+            if stats is not None:
+                info = stats.get(rel_path)
+                if info is None:
+                    continue
+                mtime_ns, size = info.mtime_ns, info.size
+            else:
+                try:
+                    st = os.stat(os.path.join(self.root, rel_path))
+                except OSError:
+                    continue
+                mtime_ns, size = st.st_mtime_ns, st.st_size
+            entry = self.files.get(rel_path)
+            if entry is None or entry[0] != mtime_ns or entry[1] != size:
+                self._index_file(rel_path, mtime_ns, size)
+                changed = True
+        for rel_path in [p for p in self.files if p not in seen]:
+            self._unpost(rel_path)
+            del self.files[rel_path]
+            changed = True
+        return changed
+
+    def _build_postings(self) -> Dict[Optional[str], Set[str]]:
+        postings: Dict[Optional[str], Set[str]] = {}
+        for rel_path, (_, _, trigrams) in self.files.items():
+            for trigram in (None,) if trigrams is None else trigrams:
+                postings.setdefault(trigram, set()).add(rel_path)
+        return postings
+
+    def candidates(self, literals: List[str]) -> Set[str]:
+        """Returns the files that may contain all of the given literals."""
+        if self._postings is None:
+            self._postings = self._build_postings()
+        result = None
+        for trigram in sorted({t for literal in literals for t in extract_trigrams(literal)}):
+            posting = self._postings.get(trigram, set())
+            result = set(posting) if result is None else result & posting
+            if not result:
+                break
+        result = result or set()
+        # Files that were too large to index can never be ruled out
+        result.update(self._postings.get(None, ()))
+        return result
+
+_indexes: Dict[str, TrigramIndex] = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root: str) -> TrigramIndex:
+    """Returns the process-wide index for a root, loading it from disk once."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = TrigramIndex(root)
+            index.load()
+            _indexes[root] = index
+        return index
+
+def peek_index(root: str) -> Optional[TrigramIndex]:
+    """Returns the process-wide index for a root if it was loaded, else None."""
+    with _indexes_lock:
+        return _indexes.get(os.path.abspath(root))
+
+def sync_index(
+    root: str,
+    rel_paths: List[str],
+    stats: Optional[Mapping[str, FileInfo]] = None,
+    version: Optional[Hashable] = None,
+    cancel: Optional[threading.Event] = None
+) -> TrigramIndex:
+    """Brings the index for ``root`` up to date with a file list and returns it.
+
+    See candidate_files() for the arguments. The index is persisted if it
+    changed; nothing is done when ``version`` is the one last synced. A sync
+    stopped by ``cancel`` is finished by the next one.
+    """
+    index = get_index(root)
+    with index._lock:
+        if version is None or index.synced_version != version:
+            index.dirty |= index.refresh(rel_paths, stats, cancel)
+            if cancel is not None and cancel.is_set():
+                return index
+            if index.dirty:
+                try:
+                    index.save()
+                    index.dirty = False
+                except OSError:
+                    pass  # An unwritable cache only costs us the next cold start
+            index.synced_version = version
+    return index
+
+def candidate_files(
+    root: str,
+    rel_paths: List[str],
+    query: str,
+    case_sensitive: bool = False,
+    stats: Optional[Mapping[str, FileInfo]] = None,
+    version: Optional[Hashable] = None
+) -> Optional[List[str]]:
+    """Narrows a list of files down to those that can match a regex.
+
+    The index for ``root`` is refreshed against ``rel_paths`` (and persisted if
+    it changed) before being queried. When the file list comes from a
+    workspace snapshot, passing its ``version`` skips the refresh entirely
+    while the snapshot has not changed.
+
+    Args:
+        root (str): Directory the paths are relative to
+        rel_paths (list): Every searchable file below root, in scan order
+        query (str): Regex pattern
+        case_sensitive (bool, optional): Whether the pattern is case-sensitive
+        stats (mapping, optional): Snapshot metadata for the files
+        version (hashable, optional): Snapshot version rel_paths/stats belong to
+
+    Returns:
+        list or None: Candidate files in the original order, or None if the
+        regex cannot be decomposed into trigrams
+    """
+    literals = required_literals(query, case_sensitive)
+    if literals is None:
+        return None
+    index = sync_index(root, rel_paths, stats, version)
+    with index._lock:
+        matched = index.candidates(literals)
+    return [p for p in rel_paths if p in matched]
+
+if __name__ == "__main__":
+    # Example usage
+    print(required_literals(r"def\s+grep_search"))
+    print(required_literals(r"foo|bar"))
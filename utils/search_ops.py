@@ -1,13 +1,194 @@
+import itertools
+import multiprocessing
 import os
 import re
-from typing import List, Tuple, Optional
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple, Optional
+from utils.search_index import candidate_files, peek_index, sync_index
+from utils.file_cache import get_file_cache
+from utils.workspace import Workspace, get_workspace
+
+SKIPPED_EXTENSIONS = ('.pyc', '.jpg', '.png', '.gif')
+DEFAULT_MAX_MATCHES = 50  # Cap results at 50 matches
+PARALLEL_MIN_FILES = 256  # Below this, process start-up costs more than it saves
+PARALLEL_CHUNK_SIZE = 64  # Files per worker task
+STOP_SLOTS = 256  # Parallel searches that can be told to stop at the same time
+
+# workers -> (pool, stop flags shared with its worker processes)
+_pools: Dict[int, Tuple[ProcessPoolExecutor, Any]] = {}
+_pools_lock = threading.Lock()
+_search_ids = itertools.count(1)
+
+# In a worker process: the pool's stop flags. Search n has stopped once
+# slot n % STOP_SLOTS holds n; a slot reused by a later search just holds
+# another id, so it never stops the wrong search.
+_stop_flags: Optional[Any] = None
+
+# root -> (workspace version, searchable files)
+_searchable: Dict[str, Tuple[int, List[str]]] = {}
+
+def _is_searchable(name: str) -> bool:
+    # Skip hidden and binary files
+    return not (name.startswith('.') or name.endswith(SKIPPED_EXTENSIONS))
+
+def _snapshot_searchable_files(workspace: Workspace) -> Tuple[List[str], int]:
+    """Returns the searchable files of a workspace snapshot and its version."""
+    files, version = workspace.snapshot()
+    cached = _searchable.get(workspace.root)
+    if cached is None or cached[0] != version:
+        cached = _searchable[workspace.root] = (version, [p for p in files if _is_searchable(os.path.basename(p))])
+    return cached[1], version
+
+def _iter_searchable_files(root: str) -> Iterator[str]:
+    """Yields the paths of all searchable files below root, relative to it.
+    
+    Files of a directory come before its sub-directories, both sorted by name,
+    so the order is stable across runs and platforms.
+    """
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+                is_symlink = entry.is_symlink()
+            except OSError:
+                continue
+            if is_dir:
+                # Like os.walk, don't descend into symlinked directories
+                if not is_symlink:
+                    subdirs.append(os.path.join(rel_dir, entry.name))
+            elif _is_searchable(entry.name):
+                yield os.path.join(rel_dir, entry.name)
+        pending.extend(reversed(subdirs))
+
+def _init_worker(stop_flags: Any) -> None:
+    global _stop_flags
+    _stop_flags = stop_flags
+
+def _scan_files(
+    root: str,
+    rel_paths: List[str],
+    query: str,
+    flags: int,
+    max_matches: int,
+    search_id: int = 0
+) -> List[dict]:
+    """Scans files in order and returns up to max_matches matching lines.
+    
+    This is also the worker function of the parallel scan, so it only takes
+    picklable arguments and compiles the pattern itself. Files are read
+    through the (per-process) file cache. In a worker, the scan stops between
+    files once the search ``search_id`` has collected enough matches.
+    """
+    pattern = re.compile(query, flags)
+    cache = get_file_cache()
+    matches = []
+    for rel_path in rel_paths:
+        if search_id and _stop_flags is not None and _stop_flags[search_id % STOP_SLOTS] == search_id:
+            break
+        try:
+            text = cache.read_text(os.path.join(root, rel_path))
+        except (UnicodeDecodeError, OSError):
+            # Skip files that can't be read as text
+            continue
+        
+        lines = text.split('\n')
+        if text.endswith('\n'):
+            lines.pop()
+        for i, line in enumerate(lines, 1):
+            if pattern.search(line):
+                matches.append({
+                    'file_path': os.path.join('.', rel_path),
+                    'line_number': i,
+                    'content': line.strip()
+                })
+                
+                if len(matches) >= max_matches:
+                    return matches
+    return matches
+
+def _get_pool(workers: int) -> Tuple[ProcessPoolExecutor, Any]:
+    """Returns a process pool of the given size and its stop flags, reused across searches.
+
+    Workers are started with forkserver (or spawn where it is missing) rather
+    than fork, so they never inherit the agent's threads or locks.
+    """
+    with _pools_lock:
+        entry = _pools.get(workers)
+        if entry is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            stop_flags = context.Array('q', STOP_SLOTS, lock=False)
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                       initializer=_init_worker, initargs=(stop_flags,))
+            entry = _pools[workers] = (pool, stop_flags)
+        return entry
+
+def _parallel_scan(root: str, rel_paths: List[str], query: str, flags: int, max_matches: int, workers: int) -> List[dict]:
+    """Scans files across a process pool, keeping the serial result order.
+    
+    The file list is split into contiguous chunks. Chunk results are consumed
+    in file order, and as soon as the matches collected so far reach the cap,
+    chunks that have not started yet are cancelled and running ones are told
+    to stop through the pool's shared stop flags.
+    """
+    pool, stop_flags = _get_pool(workers)
+    search_id = next(_search_ids)
+    futures = [
+        pool.submit(_scan_files, root, rel_paths[i:i + PARALLEL_CHUNK_SIZE], query, flags, max_matches, search_id)
+        for i in range(0, len(rel_paths), PARALLEL_CHUNK_SIZE)
+    ]
+    matches = []
+    try:
+        for future in futures:
+            matches.extend(future.result())
+            if len(matches) >= max_matches:
+                break
+    finally:
+        stop_flags[search_id % STOP_SLOTS] = search_id
+        for future in futures:
+            future.cancel()
+    return matches[:max_matches]
+
+def warm_search(working_dir: Optional[str] = None, cancel: Optional[threading.Event] = None) -> None:
+    """Brings the workspace snapshot and trigram index of a root up to date.
+
+    This is the work a grep_search() call does before it scans, so running it
+    ahead of time (e.g. from the prefetcher) keeps it off the next search.
+    Only a root already searched in this process is warmed: a cold build is
+    left to the first search, which needs it anyway.
+
+    Args:
+        working_dir (str, optional): Root to warm (defaults to the current directory)
+        cancel (threading.Event, optional): Stops the index refresh once set
+    """
+    root = os.path.abspath(working_dir or '.')
+    index = peek_index(root)
+    if index is None or index.synced_version is None:
+        return
+    workspace = get_workspace(root)
+    rel_paths, version = _snapshot_searchable_files(workspace)
+    sync_index(root, rel_paths, workspace.entries, version, cancel)
 
 def grep_search(
     query: str,
     case_sensitive: bool = False,
     include_pattern: Optional[str] = None,
     exclude_pattern: Optional[str] = None,
-    working_dir: Optional[str] = None
+    working_dir: Optional[str] = None,
+    use_index: bool = True,
+    max_matches: int = DEFAULT_MAX_MATCHES,
+    workers: int = 1,
+    use_workspace: bool = True
 ) -> Tuple[List[dict], bool]:
     """Searches through files for specific patterns using ripgrep-like functionality.
     
@@ -16,56 +197,53 @@ def grep_search(
         case_sensitive (bool, optional): Whether to do case-sensitive search
         include_pattern (str, optional): Glob pattern for files to include
         exclude_pattern (str, optional): Glob pattern for files to exclude
-        working_dir (str, optional): Directory to search in
+        working_dir (str, optional): Directory to search in (defaults to the
+            current directory). Matched paths are reported relative to it.
+        use_index (bool, optional): Whether to narrow the files to scan with the
+            persistent trigram index (falls back to a full scan for regexes
+            without literal trigrams)
+        max_matches (int, optional): Maximum number of matches to return
+        workers (int, optional): Number of worker processes to scan with;
+            values above 1 enable the parallel scan for large file sets
+            (opt-in: the default scans in the calling thread)
+        use_workspace (bool, optional): Whether to take the file list from the
+            incrementally refreshed workspace snapshot instead of walking the
+            directory tree
         
     Returns:
         tuple: (list of matches, success status)
         Each match is a dict with keys: file_path, line_number, content
     """
     try:
-        # Set working directory
-        if working_dir:
-            os.chdir(working_dir)
+        # Resolve the search root explicitly; the process cwd is never changed
+        root = os.path.abspath(working_dir or '.')
         
-        # Compile regex pattern
+        # Compile regex pattern up front so invalid queries fail fast
         flags = 0 if case_sensitive else re.IGNORECASE
-        pattern = re.compile(query, flags)
+        re.compile(query, flags)
         
-        matches = []
-        max_matches = 50  # Cap results at 50 matches
+        # Collect searchable files, then narrow them down with the trigram index
+        stats, version = None, None
+        if use_workspace:
+            workspace = get_workspace(root)
+            rel_paths, version = _snapshot_searchable_files(workspace)
+            stats = workspace.entries
+        else:
+            rel_paths = list(_iter_searchable_files(root))
+        if use_index:
+            candidates = candidate_files(root, rel_paths, query, case_sensitive, stats, version)
+            if candidates is not None:
+                rel_paths = candidates
         
-        # Walk through directory
-        for root, _, files in os.walk('.'):
-            for file in files:
-                # Skip binary and excluded files
-                if file.startswith('.') or any(file.endswith(ext) for ext in ['.pyc', '.jpg', '.png', '.gif']):
-                    continue
-                    
-                # Check include/exclude patterns
-                if include_pattern and not re.match(include_pattern, file):
-                    continue
-                if exclude_pattern and re.match(exclude_pattern, file):
-                    continue
-                
-                file_path = os.path.join(root, file)
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        for i, line in enumerate(f, 1):
-                            if pattern.search(line):
-                                matches.append({
-                                    'file_path': file_path,
-                                    'line_number': i,
-                                    'content': line.strip()
-                                })
-                                
-                                if len(matches) >= max_matches:
-                                    return matches, True
-                except UnicodeDecodeError:
-                    # Skip files that can't be read as text
-                    continue
-                    
-        return matches, True
+        # Check include/exclude patterns
+        if include_pattern:
+            rel_paths = [p for p in rel_paths if re.match(include_pattern, os.path.basename(p))]
+        if exclude_pattern:
+            rel_paths = [p for p in rel_paths if not re.match(exclude_pattern, os.path.basename(p))]
+        
+        if workers > 1 and len(rel_paths) >= PARALLEL_MIN_FILES:
+            return _parallel_scan(root, rel_paths, query, flags, max_matches, workers), True
+        return _scan_files(root, rel_paths, query, flags, max_matches), True
     except Exception as e:
         return [], False
 
@@ -0,0 +1,518 @@
+import ast
+import difflib
+import hashlib
+import os
+import pickle
+import re
+import threading
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+from utils.cache_dir import get_cache_dir
+from utils.file_cache import get_file_cache
+from utils.workspace import FileInfo, Workspace, get_workspace
+
+INDEX_VERSION = 1
+MAX_INDEXED_FILE_SIZE = 2 * 1024 * 1024  # Larger source files are skipped
+DEFAULT_MAX_RESULTS = 30
+MAX_DEFINITION_TEXT = 200  # Characters of a definition's line that are stored
+
+PYTHON_EXTENSIONS = ('.py', '.pyi')
+SOURCE_EXTENSIONS = PYTHON_EXTENSIONS + (
+    '.js', '.jsx', '.mjs', '.cjs', '.ts', '.tsx', '.go', '.rs', '.java', '.kt', '.kts', '.scala',
+    '.c', '.h', '.cc', '.cpp', '.cxx', '.hh', '.hpp', '.hxx', '.cs', '.swift', '.m', '.mm',
+    '.rb', '.php', '.lua', '.pl', '.pm', '.sh', '.bash', '.zsh', '.ex', '.exs', '.erl', '.hs',
+    '.ml', '.dart', '.r', '.jl', '.vue', '.svelte'
+)
+
+class Definition(NamedTuple):
+    name: str
+    kind: str  # class, function, method, variable, type or macro
+    line: int  # 1-indexed
+    container: str  # Qualified name of the enclosing class/function, "" at top level
+    text: str  # The definition's line, stripped
+
+    @property
+    def qualified_name(self) -> str:
+        return f"{self.container}.{self.name}" if self.container else self.name
+
+# rel_path -> (mtime_ns, size, definitions, identifier -> lines it is used on)
+FileSymbols = Tuple[int, int, Tuple[Definition, ...], Dict[str, Tuple[int, ...]]]
+
+# ctags-style patterns for languages without a parser here, tried per line
+_KEYWORDS = frozenset((
+    "if", "else", "for", "while", "switch", "case", "return", "do", "catch", "try", "new",
+    "delete", "sizeof", "throw", "typeof", "await", "yield", "elif", "match", "in", "not"
+))
+_GENERIC_PATTERNS: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("class", re.compile(
+        r'^\s*(?:export\s+)?(?:default\s+)?(?:(?:public|private|protected|internal|abstract|final'
+        r'|sealed|static|data|pub(?:\([^)]*\))?)\s+)*'
+        r'(?:class|interface|trait|enum|struct|union|protocol|module|object)\s+([A-Za-z_]\w*)')),
+    ("function", re.compile(
+        r'^\s*(?:export\s+)?(?:default\s+)?(?:(?:pub(?:\([^)]*\))?|async|unsafe|static|local|inline)\s+)*'
+        r'(?:function\*?|func|fn|def|defp|sub|proc|fun)\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)')),
+    ("type", re.compile(r'^\s*(?:export\s+)?(?:pub\s+)?(?:type|typedef)\s+([A-Za-z_]\w*)')),
+    ("macro", re.compile(r'^\s*#\s*define\s+([A-Za-z_]\w*)')),
+    # JS functions and members assigned a function, e.g. "  name = async (x) =>"
+    ("function", re.compile(r'^\s*(?:export\s+)?(?:const|let|var)?\s*([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>)')),
+    # Top-level constants and variables, e.g. "const x =", "export let y: T ="
+    ("variable", re.compile(r'^(?:export\s+)?(?:pub\s+)?(?:const|let|var|static)\s+(?:mut\s+)?([A-Za-z_]\w*)\s*[:=]')),
+    # Methods with a modifier, e.g. "    public static void main(String[] args) {"
+    ("method", re.compile(
+        r'^\s+(?:(?:public|private|protected|static|final|abstract|synchronized|override|virtual'
+        r'|async|internal)\s+)+[\w<>\[\],.?\s]*?\b([A-Za-z_]\w*)\s*\(')),
+    # C-style definitions starting in column 0, e.g. "static int parse(char *s)"
+    ("function", re.compile(r'^[A-Za-z_][\w\s\*&:<>,]*?[\s\*&]([A-Za-z_]\w*)\s*\([^;]*$')),
+]
+_IDENTIFIER = re.compile(r'[A-Za-z_]\w*')
+
+def _line_text(lines: List[str], number: int) -> str:
+    return lines[number - 1].strip()[:MAX_DEFINITION_TEXT] if 0 < number <= len(lines) else ""
+
+def _python_symbols(text: str) -> Tuple[List[Definition], Dict[str, Set[int]]]:
+    """Extracts definitions and identifier uses from Python source with ast.
+
+    Raises:
+        SyntaxError: If the source does not parse
+    """
+    tree = ast.parse(text)
+    lines = text.splitlines()
+    definitions: List[Definition] = []
+
+    def visit(body: List[ast.stmt], container: str, in_class: bool) -> None:
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                definitions.append(Definition(node.name, "class", node.lineno, container, _line_text(lines, node.lineno)))
+                visit(node.body, f"{container}.{node.name}" if container else node.name, True)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "method" if in_class else "function"
+                definitions.append(Definition(node.name, kind, node.lineno, container, _line_text(lines, node.lineno)))
+                visit(node.body, f"{container}.{node.name}" if container else node.name, False)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)) and (in_class or not container):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    for name in ast.walk(target):
+                        if isinstance(name, ast.Name):
+                            definitions.append(Definition(name.id, "variable", name.lineno, container,
+                                                          _line_text(lines, name.lineno)))
+            elif isinstance(node, (ast.If, ast.Try, ast.With, ast.AsyncWith, ast.For, ast.While)):
+                # Conditional definitions, e.g. "try: import x except ImportError: def x()"
+                for field in ("body", "orelse", "finalbody"):
+                    visit(getattr(node, field, []), container, in_class)
+                for handler in getattr(node, "handlers", []):
+                    visit(handler.body, container, in_class)
+
+    visit(tree.body, "", False)
+
+    uses: Dict[str, Set[int]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            uses.setdefault(node.id, set()).add(node.lineno)
+        elif isinstance(node, ast.Attribute):
+            # The attribute name sits at the end of the expression
+            uses.setdefault(node.attr, set()).add(node.end_lineno or node.lineno)
+        elif isinstance(node, ast.alias):
+            name = node.name.split(".")[-1] if node.asname is None else node.asname
+            uses.setdefault(name, set()).add(getattr(node, "lineno", 0) or 0)
+        elif isinstance(node, ast.keyword) and node.arg:
+            uses.setdefault(node.arg, set()).add(node.value.lineno)
+    for lines_used in uses.values():
+        lines_used.discard(0)
+    return definitions, uses
+
+def _generic_symbols(text: str) -> Tuple[List[Definition], Dict[str, Set[int]]]:
+    """Extracts definitions with ctags-style line patterns and every identifier."""
+    definitions: List[Definition] = []
+    uses: Dict[str, Set[int]] = {}
+    for number, line in enumerate(text.splitlines(), 1):
+        for kind, pattern in _GENERIC_PATTERNS:
+            match = pattern.match(line)
+            if match and match.group(1) not in _KEYWORDS:
+                definitions.append(Definition(match.group(1), kind, number, "", line.strip()[:MAX_DEFINITION_TEXT]))
+                break
+        for name in _IDENTIFIER.findall(line):
+            uses.setdefault(name, set()).add(number)
+    return definitions, uses
+
+def extract_symbols(rel_path: str, text: str) -> Tuple[Tuple[Definition, ...], Dict[str, Tuple[int, ...]]]:
+    """Extracts the definitions and identifier uses of a source file.
+
+    Python files are parsed with ast (falling back to the generic patterns
+    if they do not parse); other languages use ctags-style heuristics.
+
+    Args:
+        rel_path (str): Path of the file, to pick the language
+        text (str): File content
+
+    Returns:
+        tuple: (definitions, identifier -> sorted line numbers it appears on)
+    """
+    definitions, uses = None, None
+    if rel_path.endswith(PYTHON_EXTENSIONS):
+        try:
+            definitions, uses = _python_symbols(text)
+        except (SyntaxError, ValueError, RecursionError):
+            pass
+    if definitions is None:
+        definitions, uses = _generic_symbols(text)
+    return tuple(definitions), {name: tuple(sorted(lines)) for name, lines in uses.items()}
+
+def index_path(root: str) -> str:
+    """Returns the on-disk location of the symbol index for a directory."""
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(get_cache_dir("symbol_index"), f"{digest}.pkl")
+
+def is_source_file(rel_path: str) -> bool:
+    """Tells whether a path is a source file outside hidden directories."""
+    if not rel_path.lower().endswith(SOURCE_EXTENSIONS):
+        return False
+    return not any(part.startswith('.') for part in rel_path.split(os.sep))
+
+class SymbolIndex:
+    """Definitions and identifier uses of the source files below a root.
+
+    Like TrigramIndex, each file is stored with the (mtime, size) it had
+    when it was indexed, so ``refresh()`` only re-parses files that changed,
+    and the index is persisted to survive restarts. Per-name lookups go
+    through postings (name -> files) that are built on first use and then
+    kept up to date file by file.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.path = index_path(self.root)
+        self.files: Dict[str, FileSymbols] = {}
+        self._definitions: Optional[Dict[str, Set[str]]] = None  # name -> files defining it
+        self._uses: Optional[Dict[str, Set[str]]] = None  # name -> files using it
+        self.dirty = False  # Changed since it was last saved
+        self.synced_version: Optional[int] = None  # Workspace version last refreshed against
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Loads the index from disk. Returns True if a usable index was found."""
+        try:
+            with open(self.path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, ValueError, ImportError):
+            return False
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return False
+        self.files = data["files"]
+        self._definitions = self._uses = None
+        return True
+
+    def save(self) -> None:
+        """Writes the index to disk atomically."""
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {"version": INDEX_VERSION, "root": self.root, "files": self.files},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, self.path)
+
+    def _post(self, rel_path: str, add: bool) -> None:
+        entry = self.files.get(rel_path)
+        if self._definitions is None or entry is None:
+            return
+        for postings, names in ((self._definitions, {d.name for d in entry[2]}), (self._uses, entry[3])):
+            for name in names:
+                if add:
+                    postings.setdefault(name, set()).add(rel_path)
+                else:
+                    posting = postings.get(name)
+                    if posting is not None:
+                        posting.discard(rel_path)
+
+    def _index_file(self, rel_path: str, mtime_ns: int, size: int) -> None:
+        definitions, uses = (), {}
+        if size <= MAX_INDEXED_FILE_SIZE:
+            try:
+                # Read directly: indexing a tree should not evict the file cache
+                with open(os.path.join(self.root, rel_path), "r", encoding="utf-8", errors="replace") as f:
+                    definitions, uses = extract_symbols(rel_path, f.read())
+            except OSError:
+                pass
+        self._post(rel_path, add=False)
+        self.files[rel_path] = (mtime_ns, size, definitions, uses)
+        self._post(rel_path, add=True)
+
+    def refresh(
+        self,
+        rel_paths: Iterable[str],
+        stats: Optional[Mapping[str, FileInfo]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> bool:
+        """Brings the index in sync with the given list of source files.
+
+        Args:
+            rel_paths: Every source file below the root, relative to it
+            stats: Known (mtime, size) of the files, e.g. from a workspace
+                snapshot; files are stat'ed on disk when omitted
+            cancel: Stops the refresh between two files once set; files not
+                reached yet (and deleted ones) are left for the next refresh
+
+        Returns:
+            bool: True if anything was added, re-indexed or removed
+        """
+        changed = False
+        seen = set()
+        for rel_path in rel_paths:
+            if cancel is not None and cancel.is_set():
+                return changed
+            seen.add(rel_path)
+            if stats is not None:
+                info = stats.get(rel_path)
+                if info is None:
+                    continue
+                mtime_ns, size = info.mtime_ns, info.size
+            else:
+                try:
+                    st = os.stat(os.path.join(self.root, rel_path))
+                except OSError:
+                    continue
+                mtime_ns, size = st.st_mtime_ns, st.st_size
+            entry = self.files.get(rel_path)
+            if entry is None or entry[0] != mtime_ns or entry[1] != size:
+                self._index_file(rel_path, mtime_ns, size)
+                changed = True
+        for rel_path in [p for p in self.files if p not in seen]:
+            self._post(rel_path, add=False)
+            del self.files[rel_path]
+            changed = True
+        return changed
+
+    def _build_postings(self) -> None:
+        self._definitions, self._uses = {}, {}
+        for rel_path in self.files:
+            self._post(rel_path, add=True)
+
+    def definitions(self, name: str, kind: Optional[str] = None) -> List[Tuple[str, Definition]]:
+        """Returns (rel_path, definition) for a name, sorted by path and line.
+
+        ``name`` may be qualified ("Class.method"), in which case the
+        definition's container must end with the qualifier.
+        """
+        if self._definitions is None:
+            self._build_postings()
+        qualifier, _, base = name.rpartition(".")
+        found = []
+        for rel_path in sorted(self._definitions.get(base, ())):
+            for definition in self.files[rel_path][2]:
+                if definition.name != base or (kind and definition.kind != kind):
+                    continue
+                if qualifier and not (definition.container == qualifier
+                                      or definition.container.endswith("." + qualifier)):
+                    continue
+                found.append((rel_path, definition))
+        return found
+
+    def references(self, name: str) -> List[Tuple[str, int]]:
+        """Returns (rel_path, line) for every line that uses a name, sorted."""
+        if self._uses is None:
+            self._build_postings()
+        base = name.rpartition(".")[2]
+        found = []
+        for rel_path in sorted(self._uses.get(base, ())):
+            found.extend((rel_path, line) for line in self.files[rel_path][3].get(base, ()))
+        return found
+
+    def names(self) -> Set[str]:
+        """Returns every defined name."""
+        if self._definitions is None:
+            self._build_postings()
+        return {name for name, files in self._definitions.items() if files}
+
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+# root -> (workspace version, source files)
+_sources: Dict[str, Tuple[int, List[str]]] = {}
+
+def get_index(root: str) -> SymbolIndex:
+    """Returns the process-wide index for a root, loading it from disk once."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = SymbolIndex(root)
+            index.load()
+            _indexes[root] = index
+        return index
+
+def _snapshot_source_files(workspace: Workspace) -> Tuple[List[str], int]:
+    """Returns the source files of a workspace snapshot and its version."""
+    files, version = workspace.snapshot()
+    cached = _sources.get(workspace.root)
+    if cached is None or cached[0] != version:
+        cached = _sources[workspace.root] = (version, [p for p in files if is_source_file(p)])
+    return cached[1], version
+
+def peek_index(root: str) -> Optional[SymbolIndex]:
+    """Returns the process-wide index for a root if it was loaded, else None."""
+    with _indexes_lock:
+        return _indexes.get(os.path.abspath(root))
+
+def sync_symbols(working_dir: Optional[str] = None, cancel: Optional[threading.Event] = None) -> SymbolIndex:
+    """Brings the symbol index of a root up to date and returns it.
+
+    The file list comes from the workspace snapshot; nothing is re-checked
+    while its version is the one last synced. The index is persisted if it
+    changed. A sync stopped by ``cancel`` is finished by the next one.
+    """
+    root = os.path.abspath(working_dir or '.')
+    workspace = get_workspace(root)
+    rel_paths, version = _snapshot_source_files(workspace)
+    index = get_index(root)
+    with index._lock:
+        if index.synced_version != version:
+            index.dirty |= index.refresh(rel_paths, workspace.entries, cancel)
+            if cancel is not None and cancel.is_set():
+                return index
+            if index.dirty:
+                try:
+                    index.save()
+                    index.dirty = False
+                except OSError:
+                    pass  # An unwritable cache only costs us the next cold start
+            index.synced_version = version
+    return index
+
+def warm_symbols(working_dir: Optional[str] = None, cancel: Optional[threading.Event] = None) -> None:
+    """Brings the symbol index of a root up to date ahead of the next lookup.
+
+    Only a root already looked up in this process is warmed: a cold build is
+    left to the first find_symbol(), which needs it anyway.
+
+    Args:
+        working_dir (str, optional): Root to warm (defaults to the current directory)
+        cancel (threading.Event, optional): Stops the index refresh once set
+    """
+    index = peek_index(os.path.abspath(working_dir or '.'))
+    if index is not None and index.synced_version is not None:
+        sync_symbols(working_dir, cancel)
+
+def _reference_lines(root: str, refs: List[Tuple[str, int]]) -> List[dict]:
+    """Turns (rel_path, line) pairs into matches with the line's content."""
+    cache = get_file_cache()
+    matches = []
+    lines: List[str] = []
+    current = None
+    for rel_path, number in refs:
+        if rel_path != current:
+            current = rel_path
+            try:
+                lines = cache.read_text(os.path.join(root, rel_path)).splitlines()
+            except (OSError, UnicodeDecodeError):
+                lines = []
+        matches.append({
+            'file_path': os.path.join('.', rel_path),
+            'line_number': number,
+            'content': _line_text(lines, number)
+        })
+    return matches
+
+def find_symbol(
+    name: str,
+    kind: Optional[str] = None,
+    include_references: bool = True,
+    working_dir: Optional[str] = None,
+    max_results: int = DEFAULT_MAX_RESULTS
+):
+    """Looks up where a symbol is defined and used.
+
+    Args:
+        name (str): Identifier, optionally qualified (e.g. "Flow.run")
+        kind (str, optional): Only definitions of this kind (class, function,
+            method, variable, type, macro)
+        include_references (bool, optional): Whether to list the lines that
+            use the name (other than its definitions)
+        working_dir (str, optional): Directory to search in (defaults to the
+            current directory). Paths are reported relative to it.
+        max_results (int, optional): Maximum number of definitions and of
+            references to return
+
+    Returns:
+        tuple: (result, success status). The result is a dict with
+        "definitions" (file_path, line_number, kind, name, content),
+        "references" (file_path, line_number, content) and
+        "reference_count", plus "similar" names when nothing is defined
+        under the name; or an error message.
+    """
+    try:
+        name = name.strip()
+        if not _IDENTIFIER.fullmatch(name.rpartition(".")[2]):
+            return f"Not an identifier: {name}", False
+        root = os.path.abspath(working_dir or '.')
+        index = sync_symbols(root)
+        with index._lock:
+            definitions = index.definitions(name, kind)
+            # Lines defining this exact (possibly qualified) name, of any kind
+            own = definitions if kind is None else index.definitions(name)
+            refs = index.references(name) if include_references else []
+            names = index.names() if not definitions else set()
+
+        similar = difflib.get_close_matches(name.rpartition(".")[2], names, n=5) if names else []
+        defined_at = {(rel_path, d.line) for rel_path, d in own}
+        refs = [ref for ref in refs if ref not in defined_at]
+        result = {
+            "definitions": [
+                {
+                    'file_path': os.path.join('.', rel_path),
+                    'line_number': d.line,
+                    'kind': d.kind,
+                    'name': d.qualified_name,
+                    'content': d.text
+                }
+                for rel_path, d in definitions[:max_results]
+            ],
+            "references": _reference_lines(root, refs[:max_results]),
+            "reference_count": len(refs)
+        }
+        if similar:
+            result["similar"] = similar
+        return result, True
+    except Exception as e:
+        return str(e), False
+
+def _benchmark(query: str = "get_workspace") -> None:
+    """Compares a symbol lookup in this repo with the equivalent grep_search."""
+    import time
+    from utils.search_ops import grep_search
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    get_index(root).files.clear()
+    get_index(root).synced_version = None
+    start = time.perf_counter()
+    find_symbol(query, working_dir=root)
+    print(f"cold index build: {(time.perf_counter() - start) * 1000:.1f} ms ({len(get_index(root).files)} files)")
+
+    def timed(label, fn, repeat=20):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        print(f"  {label}: {(time.perf_counter() - start) / repeat * 1000:.2f} ms")
+        return result
+
+    result, _ = timed("find_symbol", lambda: find_symbol(query, working_dir=root))
+    matches, _ = timed("grep_search", lambda: grep_search(rf"\b{query}\b", working_dir=root))
+    print(f"  find_symbol: {len(result['definitions'])} definition(s), {result['reference_count']} reference(s), "
+          f"{len(str(result))} chars")
+    print(f"  grep_search: {len(matches)} match(es), {len(str(matches))} chars")
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        _benchmark()
+        sys.exit(0)
+
+    # Example usage
+    result, success = find_symbol("grep_search", working_dir=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if success:
+        for d in result["definitions"]:
+            print(f"{d['file_path']}:{d['line_number']}: {d['kind']} {d['name']}")
+        print(f"{result['reference_count']} reference(s)")
+    else:
+        print(result)
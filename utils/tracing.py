@@ -0,0 +1,231 @@
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+class Span:
+    """Timing and token counts of one Node.run() or Flow.run() call.
+
+    Durations are in seconds. LLM usage recorded while a span is current is
+    added to it and, when it finishes, to its enclosing span, so a flow span
+    holds the totals of the nodes it ran.
+    """
+    __slots__ = ("kind", "name", "session_id", "parent", "start", "clock", "duration", "phases",
+                 "retries", "action", "error", "llm_calls", "cached_llm_calls",
+                 "prompt_tokens", "completion_tokens", "estimated_tokens")
+
+    def __init__(self, kind: str, name: str, session_id: Optional[str], parent: Optional["Span"]):
+        self.kind = kind
+        self.name = name
+        self.session_id = session_id
+        self.parent = parent
+        self.start = time.time()
+        self.clock = time.perf_counter()
+        self.duration = 0.0
+        self.phases: Dict[str, float] = {}
+        self.retries = 0
+        self.action: Optional[str] = None
+        self.error: Optional[str] = None
+        self.llm_calls = 0
+        self.cached_llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_tokens = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "name": self.name,
+            "session_id": self.session_id,
+            "parent": self.parent.name if self.parent is not None else None,
+            "start": self.start,
+            "duration": self.duration,
+            "phases": self.phases,
+            "retries": self.retries,
+            "action": self.action,
+            "error": self.error,
+            "llm_calls": self.llm_calls,
+            "cached_llm_calls": self.cached_llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "estimated_tokens": self.estimated_tokens
+        }
+
+class SpanSink:
+    """Receives finished spans. Subclasses override emit()."""
+    def emit(self, span: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class MemorySpanSink(SpanSink):
+    """Keeps finished spans in a list, e.g. for a per-session breakdown."""
+    def __init__(self):
+        self.spans: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def emit(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def for_session(self, session_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [span for span in self.spans if span["session_id"] == session_id]
+
+class JsonlSpanSink(SpanSink):
+    """Appends finished spans to a JSON Lines file, one span per line."""
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def emit(self, span: Dict[str, Any]) -> None:
+        line = json.dumps(span, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+_sinks: List[SpanSink] = []
+_sinks_lock = threading.Lock()
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_session_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_session_id", default=None)
+
+def add_sink(sink: SpanSink) -> SpanSink:
+    """Starts sending finished spans to a sink."""
+    global _sinks
+    with _sinks_lock:
+        _sinks = _sinks + [sink]
+    return sink
+
+def remove_sink(sink: SpanSink) -> None:
+    """Stops sending spans to a sink (it is not closed)."""
+    global _sinks
+    with _sinks_lock:
+        _sinks = [s for s in _sinks if s is not sink]
+
+@contextmanager
+def trace_session(session_id: str) -> Iterator[None]:
+    """Tags the spans started inside the block with a session id."""
+    token = _session_id.set(session_id)
+    try:
+        yield
+    finally:
+        _session_id.reset(token)
+
+@contextmanager
+def traced(kind: str, name: str) -> Iterator[Span]:
+    """Runs a block as the current span and emits the span when it ends.
+
+    Usage is rolled up into the enclosing span, so a flow span holds the
+    totals of everything it ran. Spans are built even without sinks; they
+    only cost a few microseconds.
+    """
+    span = Span(kind, name, _session_id.get(), _current_span.get())
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        span.duration = time.perf_counter() - span.clock
+        parent = span.parent
+        if parent is not None:
+            parent.llm_calls += span.llm_calls
+            parent.cached_llm_calls += span.cached_llm_calls
+            parent.prompt_tokens += span.prompt_tokens
+            parent.completion_tokens += span.completion_tokens
+            parent.estimated_tokens |= span.estimated_tokens
+        sinks = _sinks
+        if sinks:
+            record = span.to_dict()
+            for sink in sinks:
+                sink.emit(record)
+
+def record_llm_call(prompt_tokens: int = 0, completion_tokens: int = 0,
+                    estimated: bool = False, cached: bool = False) -> None:
+    """Adds one LLM call's token usage to the current span, if any."""
+    span = _current_span.get()
+    if span is None:
+        return
+    span.llm_calls += 1
+    if cached:
+        span.cached_llm_calls += 1
+    span.prompt_tokens += prompt_tokens
+    span.completion_tokens += completion_tokens
+    span.estimated_tokens |= estimated
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregates node spans per node name, plus a session total.
+
+    The total sums every node run; its wall time and token counts come from
+    the outermost spans (which include everything they ran) when present.
+
+    Returns:
+        dict: {"total": {...}, "nodes": {name: {...}}} where each entry has
+        calls, seconds, prep/exec/post seconds, retries, llm_calls,
+        cached_llm_calls, prompt_tokens and completion_tokens
+    """
+    def empty():
+        return {"calls": 0, "seconds": 0.0, "prep": 0.0, "exec": 0.0, "post": 0.0, "retries": 0,
+                "llm_calls": 0, "cached_llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def add(row, span):
+        row["calls"] += 1
+        row["seconds"] += span["duration"]
+        for phase, seconds in span["phases"].items():
+            row[phase] += seconds
+        for field in ("retries", "llm_calls", "cached_llm_calls", "prompt_tokens", "completion_tokens"):
+            row[field] += span[field]
+
+    total = empty()
+    roots = empty()
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for span in spans:
+        if span["kind"] == "node":
+            add(nodes.setdefault(span["name"], empty()), span)
+            add(total, span)
+        if span["parent"] is None:
+            add(roots, span)
+    if roots["calls"]:
+        for field in ("seconds", "llm_calls", "cached_llm_calls", "prompt_tokens", "completion_tokens"):
+            total[field] = roots[field]
+    total["estimated_tokens"] = any(span["estimated_tokens"] for span in spans)
+    return {"total": total, "nodes": nodes}
+
+def format_breakdown(spans: List[Dict[str, Any]]) -> str:
+    """Renders a latency and token table for a session's spans."""
+    summary = summarize_spans(spans)
+    total = summary["total"]
+    lines = [f"{'node':<24}{'calls':>6}{'total s':>10}{'prep s':>9}{'exec s':>9}{'post s':>9}"
+             f"{'retries':>8}{'llm':>5}{'prompt tok':>12}{'compl tok':>11}"]
+    rows = sorted(summary["nodes"].items(), key=lambda item: item[1]["seconds"], reverse=True)
+    for name, row in rows + [("TOTAL", total)]:
+        lines.append(f"{name:<24}{row['calls']:>6}{row['seconds']:>10.3f}{row['prep']:>9.3f}{row['exec']:>9.3f}"
+                     f"{row['post']:>9.3f}{row['retries']:>8}{row['llm_calls']:>5}"
+                     f"{row['prompt_tokens']:>12}{row['completion_tokens']:>11}")
+    if total["cached_llm_calls"]:
+        lines.append(f"{total['cached_llm_calls']} LLM call(s) answered from the cache")
+    if total["estimated_tokens"]:
+        lines.append("Some token counts are estimates (the API did not report usage, e.g. for cancelled streams)")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    # Example usage
+    sink = add_sink(MemorySpanSink())
+    with trace_session("demo"):
+        with traced("flow", "Flow"):
+            for _ in range(3):
+                with traced("node", "Worker") as span:
+                    span.phases = {"prep": 0.001, "exec": 0.01, "post": 0.0}
+                    record_llm_call(prompt_tokens=1200, completion_tokens=80)
+                    time.sleep(0.01)
+    print(format_breakdown(sink.for_session("demo")))
@@ -0,0 +1,505 @@
+import bisect
+import ctypes
+import ctypes.util
+import itertools
+import os
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+FULL_RESCAN_INTERVAL = 30.0  # Seconds between full rescans when polling
+RECENT_SECONDS = 300.0  # Files modified this recently are re-stat'ed on every polling refresh
+MAX_WORKSPACES = 16  # Snapshots kept by get_workspace(); the least recently used is closed
+
+# Snapshot versions are unique across workspaces, so an index synced against
+# a closed workspace never mistakes a new one of the same root for it
+_versions = itertools.count(1)
+
+class FileInfo(NamedTuple):
+    size: int
+    mtime_ns: int
+    is_dir: bool
+    is_symlink: bool
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify."""
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x01000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_ONLYDIR)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.wd_to_dir: Dict[int, str] = {}
+
+    def watch(self, abs_dir: str, rel_dir: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(abs_dir), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {abs_dir}")
+        self.wd_to_dir[wd] = rel_dir
+
+    def read_events(self) -> Optional[List[str]]:
+        """Returns the relative paths touched since the last call, or None on overflow."""
+        paths = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return paths
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    return None
+                if mask & self.IN_IGNORED:
+                    self.wd_to_dir.pop(wd, None)
+                    continue
+                rel_dir = self.wd_to_dir.get(wd)
+                if rel_dir is not None and name:
+                    paths.append(os.path.join(rel_dir, name))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+def _make_inotify() -> Optional[_Inotify]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return _Inotify()
+    except (OSError, AttributeError, TypeError):
+        return None
+
+class Workspace:
+    """In-memory snapshot of a directory tree: paths, sizes, mtimes and types.
+
+    The tree is scanned once. refresh() then applies only what changed:
+    inotify events where available, otherwise a rescan of the directories
+    whose mtime moved (which catches added, removed and renamed entries)
+    and a stat of the recently modified files (which catches in-place edits
+    made outside the agent to the files being worked on), with a full
+    rescan every ``full_rescan_interval`` seconds for the rest. Edits made through utils/file_ops.py are reported via
+    notify_path_changed() in both modes.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        use_inotify: bool = True,
+        full_rescan_interval: float = FULL_RESCAN_INTERVAL,
+        scan: bool = True
+    ):
+        """Initialize a snapshot.
+
+        Args:
+            root: Directory to snapshot
+            use_inotify: Whether to follow changes with inotify where available
+            full_rescan_interval: Seconds between full rescans when polling
+            scan: Whether to scan now; otherwise the first refresh() does
+        """
+        self.root = os.path.abspath(root)
+        self.full_rescan_interval = full_rescan_interval
+        self.entries: Dict[str, FileInfo] = {}  # rel path -> info
+        self.children: Dict[str, List[str]] = {}  # rel dir -> sorted child names
+        self.dir_mtimes: Dict[str, int] = {}
+        self.version = 0  # 0 until the first scan
+        self._files: Optional[Tuple[int, List[str]]] = None
+        self._dirty: Set[str] = set()
+        self._recent: Dict[str, float] = {}  # rel path -> monotonic time it stops being re-stat'ed
+        self._lock = threading.RLock()
+        self._inotify = _make_inotify() if use_inotify else None
+        if scan:
+            with self._lock:
+                self._full_scan()
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._inotify is not None
+
+    def _abs(self, rel_path: str) -> str:
+        return os.path.join(self.root, rel_path) if rel_path else self.root
+
+    def _stat(self, rel_path: str) -> Optional[FileInfo]:
+        abs_path = self._abs(rel_path)
+        try:
+            is_symlink = os.path.islink(abs_path)
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                st = os.lstat(abs_path)  # Broken symlink
+        except OSError:
+            return None
+        is_dir = os.path.isdir(abs_path)
+        return FileInfo(0 if is_dir else st.st_size, st.st_mtime_ns, is_dir, is_symlink)
+
+    @staticmethod
+    def _entry_info(entry: os.DirEntry) -> Optional[FileInfo]:
+        """Returns the info of a scandir entry, using its cached type bits."""
+        try:
+            is_symlink = entry.is_symlink()
+            try:
+                st = entry.stat()
+            except OSError:
+                st = entry.stat(follow_symlinks=False)  # Broken symlink
+            is_dir = entry.is_dir()
+        except OSError:
+            return None
+        return FileInfo(0 if is_dir else st.st_size, st.st_mtime_ns, is_dir, is_symlink)
+
+    def _watch(self, rel_dir: str) -> None:
+        if self._inotify is None:
+            return
+        try:
+            self._inotify.watch(self._abs(rel_dir), rel_dir)
+        except OSError:
+            # Out of watches (or similar): fall back to polling for good
+            self._inotify.close()
+            self._inotify = None
+
+    def _scan_dir(self, rel_dir: str) -> None:
+        """Scans a directory and everything below it into the snapshot."""
+        pending = [rel_dir]
+        polling = self._inotify is None
+        recent_ns = time.time_ns() - int(RECENT_SECONDS * 1e9)
+        while pending:
+            current = pending.pop()
+            self._watch(current)
+            try:
+                self.dir_mtimes[current] = os.stat(self._abs(current)).st_mtime_ns
+                with os.scandir(self._abs(current)) as it:
+                    found = sorted(((entry.name, self._entry_info(entry)) for entry in it), key=lambda item: item[0])
+            except OSError:
+                found = []
+            self.children[current] = [name for name, _ in found]
+            for name, info in found:
+                if info is None:
+                    continue
+                rel_path = os.path.join(current, name)
+                self.entries[rel_path] = info
+                if info.is_dir and not info.is_symlink:
+                    pending.append(rel_path)
+                elif polling and info.mtime_ns >= recent_ns:
+                    self._touch(rel_path)
+
+    def _full_scan(self) -> None:
+        self.entries.clear()
+        self.children.clear()
+        self.dir_mtimes.clear()
+        self._recent.clear()
+        if self._inotify is not None:
+            self._inotify.wd_to_dir.clear()
+        self._scan_dir("")
+        self._last_full_scan = time.monotonic()
+        self.version = next(_versions)
+
+    def _touch(self, rel_path: str) -> None:
+        """Polling mode: re-stat a file on every refresh for the next RECENT_SECONDS."""
+        self._recent[rel_path] = time.monotonic() + RECENT_SECONDS
+
+    def _remove_subtree(self, rel_path: str) -> None:
+        self.entries.pop(rel_path, None)
+        self._recent.pop(rel_path, None)
+        if rel_path in self.children:
+            for name in self.children.pop(rel_path):
+                self._remove_subtree(os.path.join(rel_path, name))
+            self.dir_mtimes.pop(rel_path, None)
+
+    def _update_path(self, rel_path: str) -> bool:
+        """Re-stats one path and updates the snapshot. Returns True if anything changed."""
+        parent, name = os.path.split(rel_path)
+        if parent not in self.children:
+            return False  # Outside the scanned tree (e.g. below a symlinked dir)
+        old = self.entries.get(rel_path)
+        info = self._stat(rel_path)
+        if info == old and not (info and info.is_dir and not info.is_symlink and rel_path not in self.children):
+            return False
+
+        siblings = self.children[parent]
+        if info is None:
+            self._remove_subtree(rel_path)
+            i = bisect.bisect_left(siblings, name)
+            if i < len(siblings) and siblings[i] == name:
+                siblings.pop(i)
+            return True
+
+        if old is None:
+            bisect.insort(siblings, name)
+        elif old.is_dir and not info.is_dir:
+            self._remove_subtree(rel_path)
+        self.entries[rel_path] = info
+        if self._inotify is None and not info.is_dir:
+            self._touch(rel_path)
+        if info.is_dir and not info.is_symlink and (old is None or not old.is_dir or rel_path not in self.children):
+            self._scan_dir(rel_path)
+        return True
+
+    def _rescan_changed_dirs(self) -> bool:
+        """Polling mode: re-list the directories whose mtime changed."""
+        changed = False
+        for rel_dir, mtime in list(self.dir_mtimes.items()):
+            if rel_dir not in self.dir_mtimes:
+                continue  # Removed while handling an earlier directory
+            try:
+                current = os.stat(self._abs(rel_dir)).st_mtime_ns
+            except OSError:
+                current = None
+            if current == mtime:
+                continue
+            if current is None:
+                changed |= self._update_path(rel_dir) if rel_dir else False
+                continue
+            self.dir_mtimes[rel_dir] = current
+            try:
+                with os.scandir(self._abs(rel_dir)) as it:
+                    names = set(entry.name for entry in it)
+            except OSError:
+                continue
+            for name in names.union(self.children.get(rel_dir, [])):
+                changed |= self._update_path(os.path.join(rel_dir, name))
+        return changed
+
+    def _restat_files(self) -> bool:
+        """Polling mode: re-stat the recently modified files to catch in-place edits.
+
+        Files written or changed within RECENT_SECONDS are the ones an
+        outside editor is likely to touch again; an edit to any other file
+        in place (which leaves its directory's mtime alone) shows up at the
+        next full rescan.
+        """
+        changed = False
+        now = time.monotonic()
+        for rel_path, until in list(self._recent.items()):
+            info = self.entries.get(rel_path)
+            if until < now or info is None or info.is_dir:
+                self._recent.pop(rel_path, None)
+                continue
+            try:
+                st = os.stat(self._abs(rel_path))
+            except OSError:
+                st = None
+            if st is None or st.st_mtime_ns != info.mtime_ns or st.st_size != info.size:
+                changed |= self._update_path(rel_path)
+        return changed
+
+    def mark_changed(self, rel_path: str) -> None:
+        """Queues a path to be re-stated on the next refresh()."""
+        with self._lock:
+            self._dirty.add(rel_path)
+
+    def refresh(self) -> None:
+        """Brings the snapshot up to date with the disk."""
+        with self._lock:
+            changed = False
+            if self.version == 0:
+                self._full_scan()
+            elif self._inotify is not None:
+                paths = self._inotify.read_events()
+                if paths is None:
+                    self._full_scan()
+                    paths = []
+                for rel_path in dict.fromkeys(paths):
+                    changed |= self._update_path(rel_path)
+            elif time.monotonic() - self._last_full_scan >= self.full_rescan_interval:
+                self._full_scan()
+            else:
+                changed |= self._rescan_changed_dirs()
+                changed |= self._restat_files()
+
+            dirty, self._dirty = self._dirty, set()
+            for rel_path in dirty:
+                changed |= self._update_path(rel_path)
+            if changed:
+                self.version = next(_versions)
+
+    def files(self) -> List[str]:
+        """Returns every non-directory path, in the same order as a top-down walk.
+
+        A directory's files come before its sub-directories, both sorted by
+        name. The list is cached until the snapshot changes.
+        """
+        with self._lock:
+            if self._files is not None and self._files[0] == self.version:
+                return self._files[1]
+            result = []
+            pending = [""]
+            while pending:
+                rel_dir = pending.pop()
+                prefix = rel_dir + os.sep if rel_dir else ""
+                subdirs = []
+                for name in self.children.get(rel_dir, []):
+                    rel_path = prefix + name
+                    info = self.entries.get(rel_path)
+                    if info is None:
+                        continue
+                    if info.is_dir:
+                        if not info.is_symlink:
+                            subdirs.append(rel_path)
+                    else:
+                        result.append(rel_path)
+                pending.extend(reversed(subdirs))
+            self._files = (self.version, result)
+            return result
+
+    def snapshot(self) -> Tuple[List[str], int]:
+        """Returns files() together with the version it belongs to."""
+        with self._lock:
+            return self.files(), self.version
+
+    def stat_map(self) -> Dict[str, Tuple[int, int]]:
+        """Returns rel path -> (mtime_ns, size) for every file."""
+        with self._lock:
+            return {p: (info.mtime_ns, info.size) for p, info in self.entries.items() if not info.is_dir}
+
+    def list_children(self, rel_dir: str) -> Optional[List[Tuple[str, FileInfo]]]:
+        """Returns (name, info) for the entries of a directory, or None if unknown."""
+        with self._lock:
+            names = self.children.get(rel_dir)
+            if names is None:
+                return None
+            prefix = rel_dir + os.sep if rel_dir else ""
+            entries = self.entries
+            return [(name, entries[prefix + name]) for name in names if prefix + name in entries]
+
+    def relpath(self, abs_path: str) -> Optional[str]:
+        """Returns a path relative to the root, or None if it lies outside."""
+        abs_path = os.path.abspath(abs_path)
+        if abs_path == self.root:
+            return ""
+        if abs_path.startswith(self.root + os.sep):
+            return abs_path[len(self.root) + 1:]
+        return None
+
+    def close(self) -> None:
+        """Stops following changes with inotify; later refreshes poll."""
+        with self._lock:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+
+_workspaces: "OrderedDict[str, Workspace]" = OrderedDict()  # least recently used first
+_workspaces_lock = threading.Lock()
+
+def get_workspace(root: str) -> Workspace:
+    """Returns the process-wide snapshot of a directory, refreshed.
+
+    The first call for a root scans the whole tree; later calls only apply
+    what changed since. The scan holds only that workspace's lock, so other
+    roots are not blocked by it. At most MAX_WORKSPACES snapshots are kept;
+    the least recently used one is closed.
+    """
+    root = os.path.abspath(root)
+    evicted = []
+    with _workspaces_lock:
+        workspace = _workspaces.get(root)
+        if workspace is None:
+            workspace = _workspaces[root] = Workspace(root, scan=False)
+            while len(_workspaces) > MAX_WORKSPACES:
+                evicted.append(_workspaces.popitem(last=False)[1])
+        else:
+            _workspaces.move_to_end(root)
+    for old in evicted:
+        old.close()
+    workspace.refresh()
+    return workspace
+
+def close_workspace(root: str) -> bool:
+    """Drops the process-wide snapshot of a directory and closes it.
+
+    Returns:
+        bool: True if there was a snapshot for the root
+    """
+    with _workspaces_lock:
+        workspace = _workspaces.pop(os.path.abspath(root), None)
+    if workspace is None:
+        return False
+    workspace.close()
+    return True
+
+def close_workspaces() -> None:
+    """Drops and closes every process-wide snapshot."""
+    with _workspaces_lock:
+        workspaces = list(_workspaces.values())
+        _workspaces.clear()
+    for workspace in workspaces:
+        workspace.close()
+
+def notify_path_changed(path: str) -> None:
+    """Tells every snapshot containing path that it was written or deleted."""
+    with _workspaces_lock:
+        workspaces = list(_workspaces.values())
+    for workspace in workspaces:
+        rel_path = workspace.relpath(path)
+        if rel_path:
+            workspace.mark_changed(rel_path)
+
+def _benchmark(dirs: int = 1000, files_per_dir: int = 100) -> None:
+    """Compares cold walks with warm snapshot turns on a generated tree."""
+    import shutil
+    import tempfile
+    from utils.dir_ops import list_dir
+    from utils.search_ops import grep_search
+
+    root = tempfile.mkdtemp()
+    try:
+        for d in range(dirs):
+            directory = os.path.join(root, f"pkg{d // 100:02d}", f"mod{d:04d}")
+            os.makedirs(directory)
+            for i in range(files_per_dir):
+                with open(os.path.join(directory, f"file{i:03d}.py"), "w") as f:
+                    f.write(f"def function_{d}_{i}():\n    return {i}\n")
+                # An existing checkout: nothing was modified recently
+                os.utime(os.path.join(directory, f"file{i:03d}.py"), (time.time() - 3600,) * 2)
+        print(f"Tree: {dirs * files_per_dir} files in {dirs} directories")
+
+        def timed(label, fn, repeat=3):
+            fn()  # Warm-up turn
+            start = time.perf_counter()
+            for _ in range(repeat):
+                fn()
+            print(f"  {label}: {(time.perf_counter() - start) / repeat * 1000:.1f} ms/turn")
+
+        start = time.perf_counter()
+        workspace = get_workspace(root)
+        print(f"  initial snapshot: {(time.perf_counter() - start) * 1000:.1f} ms "
+              f"({'inotify' if workspace.uses_inotify else 'polling'})")
+        grep_search("function_999_99", working_dir=root)  # Build the trigram index once
+
+        timed("list_dir full tree, disk walk", lambda: list_dir(root))
+        timed("list_dir full tree, snapshot", lambda: list_dir(root, workspace=get_workspace(root)))
+        timed("list_dir 400 entries, disk walk", lambda: list_dir(root, max_depth=4, max_entries=400))
+        timed("list_dir 400 entries, snapshot",
+              lambda: list_dir(root, max_depth=4, max_entries=400, workspace=get_workspace(root)))
+        timed("grep_search, disk walk", lambda: grep_search("function_999_99", working_dir=root, use_workspace=False))
+        timed("grep_search, snapshot", lambda: grep_search("function_999_99", working_dir=root))
+
+        polling = Workspace(root, use_inotify=False)
+        timed("refresh, inotify", workspace.refresh)
+        timed("refresh, polling (directory mtimes and recent file stats)", polling.refresh)
+        polling.close()
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        _benchmark()
+    else:
+        # Example usage
+        workspace = get_workspace(".")
+        print(f"{len(workspace.files())} files, inotify={workspace.uses_inotify}")
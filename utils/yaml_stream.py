@@ -0,0 +1,93 @@
+from typing import Iterable, Optional
+
+YAML_FENCE_OPEN = "```yaml"
+YAML_FENCE_CLOSE = "```"
+
+class YamlBlockExtractor:
+    """Incrementally finds the first ```yaml fenced block in streamed text.
+
+    Text is fed chunk by chunk. Each call only scans the newly arrived text
+    (plus a fence-length overlap), so the total cost stays linear in the
+    length of the response.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._start: Optional[int] = None  # Offset right after the opening fence
+        self._scan_from = 0
+        self.block: Optional[str] = None
+
+    def feed(self, text: str) -> Optional[str]:
+        """Adds a chunk of text.
+
+        Returns:
+            str or None: The stripped block contents once its closing fence has
+            arrived, otherwise None
+        """
+        if self.block is not None:
+            return self.block
+        self._buffer += text
+
+        if self._start is None:
+            i = self._buffer.find(YAML_FENCE_OPEN, max(0, self._scan_from - len(YAML_FENCE_OPEN) + 1))
+            if i < 0:
+                self._scan_from = len(self._buffer)
+                return None
+            self._start = i + len(YAML_FENCE_OPEN)
+            self._scan_from = self._start
+
+        j = self._buffer.find(YAML_FENCE_CLOSE, max(self._start, self._scan_from - len(YAML_FENCE_CLOSE) + 1))
+        if j < 0:
+            self._scan_from = len(self._buffer)
+            return None
+        self.block = self._buffer[self._start:j].strip()
+        return self.block
+
+    def finish(self, require_fence: bool = True) -> str:
+        """Returns the block after the stream ended.
+
+        An unterminated block is returned up to the end of the text.
+
+        Args:
+            require_fence: If False, the whole text is returned when it
+                contains no ```yaml block
+
+        Raises:
+            ValueError: If the text contained no ```yaml block at all and
+                require_fence is True
+        """
+        if self.block is not None:
+            return self.block
+        if self._start is None:
+            if not require_fence:
+                return self._buffer.strip()
+            raise ValueError("No ```yaml block found in LLM response")
+        self.block = self._buffer[self._start:].strip()
+        return self.block
+
+def extract_yaml_block(chunks: Iterable[str], require_fence: bool = True) -> str:
+    """Consumes chunks only until the first ```yaml block is complete.
+
+    Iteration stops as soon as the closing fence arrives, and generator
+    inputs are closed, which cancels a streaming LLM response early. See
+    YamlBlockExtractor.finish() for require_fence.
+    """
+    extractor = YamlBlockExtractor()
+    try:
+        for chunk in chunks:
+            if extractor.feed(chunk) is not None:
+                break
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return extractor.finish(require_fence)
+
+if __name__ == "__main__":
+    # Example usage
+    def fake_stream():
+        for chunk in ["Sure!\n``", "`yaml\ntool: read", "_file\n``", "`\nTrailing text ", "never read"]:
+            print(f"<- {chunk!r}")
+            yield chunk
+
+    print(extract_yaml_block(fake_stream()))